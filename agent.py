@@ -15,6 +15,7 @@ from keyboard_mouse_CTRL import (
     press_hotkey_tool, control_volume_tool
 )
 from memory_loop import MemoryExtractor
+from memory_store import ConversationMemory
 from image import (
     generate_image_tool, 
     show_latest_image_tool, 
@@ -34,22 +35,26 @@ from web_automation import (
     start_browser, close_browser, go_to, wait_for_selector, click, type_text, press_key, scroll_by,
     search_and_click, extract_page_text, youtube_search_play, amazon_search_summary
 )
+from memory_search import recall_memory
 from analytics_engine import (
-    get_performance_dashboard, optimize_performance, analyze_user_behavior, start_performance_monitoring
+    get_performance_dashboard, optimize_performance, analyze_user_behavior, start_performance_monitoring,
+    monitor_tools
 )
+from db_retention import start_retention_jobs
 
 load_dotenv()
 
 
 class Assistant(Agent):
-    def __init__(self, chat_ctx) -> None:
-        from user_profile import UserProfile
-        profile = UserProfile("Protik_22")
+    def __init__(self, chat_ctx, memory=None) -> None:
+        self.memory = memory
+        from user_profile import get_user_profile
+        profile = get_user_profile("Protik_22")
         personalization = profile.get_context_string()
         super().__init__(chat_ctx = chat_ctx,
                         instructions=instructions_prompt + personalization,
                         llm=google.beta.realtime.RealtimeModel(voice="Aoede"),
-                        tools=[
+                        tools=monitor_tools([
                                 google_search,
                                 get_current_datetime,
                                 get_weather,
@@ -85,9 +90,33 @@ class Assistant(Agent):
                                 whatsapp_security_check,
                                 start_browser, close_browser, go_to, wait_for_selector, click, type_text, press_key, scroll_by,
                                 search_and_click, extract_page_text, youtube_search_play, amazon_search_summary,
-                                get_performance_dashboard, optimize_performance, analyze_user_behavior]
+                                get_performance_dashboard, optimize_performance, analyze_user_behavior,
+                                recall_memory])
                                 )
 
+    async def on_user_turn_completed(self, turn_ctx: ChatContext, new_message: ChatMessage) -> None:
+        """Inject only the few most relevant past turns instead of a flat history window."""
+        if self.memory is None:
+            return
+        import asyncio
+        try:
+            query = new_message.text_content or ""
+            relevant = await asyncio.to_thread(self.memory.get_relevant_context, query, 3)
+        except Exception:
+            return
+        # The new message may already be indexed; don't echo it back
+        relevant = [r for r in relevant if r.get("id") != new_message.id]
+        if relevant:
+            lines = [f"- {r['role']}: {r['text'][:300]}" for r in relevant]
+            # A system note, not an assistant turn: the model must not take
+            # these lines as something it just said
+            turn_ctx.add_message(
+                role="system",
+                content="[Retrieved memory] Excerpts from earlier conversations that may be relevant "
+                        "to the user's message. Use them as background only; they are not part of "
+                        "the current turn.\n" + "\n".join(lines)
+            )
+
 async def _proactive_reengagement_loop(session: AgentSession, check_interval_s: int = 5, idle_s: int = 30):
     """After 30s of no new messages, proactively talk about the last user topic."""
     import asyncio
@@ -97,9 +126,10 @@ async def _proactive_reengagement_loop(session: AgentSession, check_interval_s:
     pref_lang = "bangla"
     formality = None
     idle_override = None
+    _prof = None
     try:
-        from user_profile import UserProfile as _UP
-        _prof = _UP("Protik_22")
+        from user_profile import get_user_profile
+        _prof = get_user_profile("Protik_22")
         pref_lang = (_prof.data or {}).get("preferred_language") or pref_lang
         formality = (_prof.data or {}).get("greeting_style")
         idle_override = (_prof.data or {}).get("proactive_idle_seconds")
@@ -107,63 +137,80 @@ async def _proactive_reengagement_loop(session: AgentSession, check_interval_s:
         pass
     if isinstance(idle_override, int) and 5 <= idle_override <= 600:
         idle_s = idle_override
-    while True:
-        await asyncio.sleep(check_interval_s)
-        try:
-            items = session.history.items
-            if len(items) != last_len:
-                last_len = len(items)
-                last_change = asyncio.get_event_loop().time()
-                continue
-            idle_for = asyncio.get_event_loop().time() - last_change
-            if idle_for >= idle_s:
-                # Find last user message content to continue the topic
-                last_user_msg = None
-                for msg in reversed(items):
-                    role = getattr(msg, "role", None)
-                    content = getattr(msg, "content", None)
-                    if str(role).lower() in ["user", "client"] and isinstance(content, str) and content.strip():
-                        last_user_msg = content.strip()
-                        break
-                topic_hint = (last_user_msg or "our last topic").split("\n")[0][:200]
-                # Style tuning via profile (formal/informal + language)
-                if (pref_lang or "").lower() == "hinglish":
-                    if formality == "formal":
-                        prompt_text = (
-                            f"{idle_s} seconds ho gaye bina baat ke, main respectfully follow-up kar raha/rahi hoon. "
-                            f"Jo hum baat kar rahe the — \"{topic_hint}\" — wahi se continue karein? "
-                            "Chahein to main short next steps suggest kar doon. Ek line me batayiye."
-                        )
-                    else:
-                        prompt_text = (
-                            f"Arey, {idle_s}s se sab quiet! Main hi ping kar deta/deti hoon \n"
-                            f"Wahin se continue karein — \"{topic_hint}\"?\n"
-                            "- Bolo: 'continue' — main aage badhta/badhti hoon\n"
-                            "- Ya main chhota next steps bana doon?\n"
-                            "Ek line me bolo, kya karu?"
-                        )
-                else:
-                    if formality == "formal":
-                        prompt_text = (
-                            "গত কিছুক্ষণ কোনো বার্তা পাইনি, তাই ভদ্রভাবে খোঁজ নিচ্ছি। "
-                            "আমরা যে বিষয়টি নিয়ে আলোচনা করছিলাম — \"" + topic_hint + "\" — সেখান থেকেই কি এগোবো? "
-                            "ইচ্ছা করলে আমি সংক্ষিপ্ত পরবর্তী ধাপ প্রস্তাব করতে পারি। এক লাইনে জানালেই শুরু করছি।"
-                        )
+
+    def _on_profile_change(key, old, new):
+        # Pick up preference changes made mid-session without re-reading the profile
+        nonlocal pref_lang, formality, idle_s
+        if key == "preferred_language" and new:
+            pref_lang = new
+        elif key == "greeting_style":
+            formality = new
+        elif key == "proactive_idle_seconds" and isinstance(new, int) and 5 <= new <= 600:
+            idle_s = new
+
+    if _prof is not None:
+        _prof.subscribe(_on_profile_change)
+    try:
+        while True:
+            await asyncio.sleep(check_interval_s)
+            try:
+                items = session.history.items
+                if len(items) != last_len:
+                    last_len = len(items)
+                    last_change = asyncio.get_event_loop().time()
+                    continue
+                idle_for = asyncio.get_event_loop().time() - last_change
+                if idle_for >= idle_s:
+                    # Find last user message content to continue the topic
+                    last_user_msg = None
+                    for msg in reversed(items):
+                        role = getattr(msg, "role", None)
+                        content = getattr(msg, "content", None)
+                        if str(role).lower() in ["user", "client"] and isinstance(content, str) and content.strip():
+                            last_user_msg = content.strip()
+                            break
+                    topic_hint = (last_user_msg or "our last topic").split("\n")[0][:200]
+                    # Style tuning via profile (formal/informal + language)
+                    if (pref_lang or "").lower() == "hinglish":
+                        if formality == "formal":
+                            prompt_text = (
+                                f"{idle_s} seconds ho gaye bina baat ke, main respectfully follow-up kar raha/rahi hoon. "
+                                f"Jo hum baat kar rahe the — \"{topic_hint}\" — wahi se continue karein? "
+                                "Chahein to main short next steps suggest kar doon. Ek line me batayiye."
+                            )
+                        else:
+                            prompt_text = (
+                                f"Arey, {idle_s}s se sab quiet! Main hi ping kar deta/deti hoon \n"
+                                f"Wahin se continue karein — \"{topic_hint}\"?\n"
+                                "- Bolo: 'continue' — main aage badhta/badhti hoon\n"
+                                "- Ya main chhota next steps bana doon?\n"
+                                "Ek line me bolo, kya karu?"
+                            )
                     else:
-                        prompt_text = (
-                            f"এই যে, {idle_s} সেকেন্ড ধরে চুপচাপ! তাই আমি নিজেই ঢুঁ মারলাম \n"
-                            "আমরা যেটা নিয়ে কথা বলছিলাম — \"" + topic_hint + "\" — সেখান থেকেই চালিয়ে দেব?\n"
-                            "- বলো: ‘চালিয়ে যাও’ — আমি এগিয়ে নিই\n"
-                            "- না হলে ছোট্ট এক্টা next steps সাজিয়ে দিই?\n"
-                            "এক লাইনে বলো, কী করব?"
-                        )
-                await session.generate_reply(
-                    instructions=prompt_text
-                )
-                last_change = asyncio.get_event_loop().time()
-        except Exception:
-            # Keep loop resilient
-            continue
+                        if formality == "formal":
+                            prompt_text = (
+                                "গত কিছুক্ষণ কোনো বার্তা পাইনি, তাই ভদ্রভাবে খোঁজ নিচ্ছি। "
+                                "আমরা যে বিষয়টি নিয়ে আলোচনা করছিলাম — \"" + topic_hint + "\" — সেখান থেকেই কি এগোবো? "
+                                "ইচ্ছা করলে আমি সংক্ষিপ্ত পরবর্তী ধাপ প্রস্তাব করতে পারি। এক লাইনে জানালেই শুরু করছি।"
+                            )
+                        else:
+                            prompt_text = (
+                                f"এই যে, {idle_s} সেকেন্ড ধরে চুপচাপ! তাই আমি নিজেই ঢুঁ মারলাম \n"
+                                "আমরা যেটা নিয়ে কথা বলছিলাম — \"" + topic_hint + "\" — সেখান থেকেই চালিয়ে দেব?\n"
+                                "- বলো: ‘চালিয়ে যাও’ — আমি এগিয়ে নিই\n"
+                                "- না হলে ছোট্ট এক্টা next steps সাজিয়ে দিই?\n"
+                                "এক লাইনে বলো, কী করব?"
+                            )
+                    await session.generate_reply(
+                        instructions=prompt_text
+                    )
+                    last_change = asyncio.get_event_loop().time()
+            except Exception:
+                # Keep loop resilient
+                continue
+    finally:
+        if _prof is not None:
+            _prof.unsubscribe(_on_profile_change)
 
 async def entrypoint(ctx: agents.JobContext):
     session = AgentSession(
@@ -173,26 +220,31 @@ async def entrypoint(ctx: agents.JobContext):
     #getting the current memory chat
     current_ctx = session.history.items
     
+    import asyncio as _asyncio
+    memory = await _asyncio.to_thread(ConversationMemory, "Protik_22")
+
 
     await session.start(
         room=ctx.room,
-        agent=Assistant(chat_ctx=current_ctx), #sending currenet chat to llm in realtime
+        agent=Assistant(chat_ctx=current_ctx, memory=memory), #sending currenet chat to llm in realtime
         room_input_options=RoomInputOptions(
             noise_cancellation=noise_cancellation.BVC()
         ),
     )
     # Start proactive re-engagement watcher
-    import asyncio as _asyncio
     _asyncio.create_task(_proactive_reengagement_loop(session))
     
     # Start performance monitoring
     _asyncio.create_task(start_performance_monitoring())
 
+    # Roll up and prune old telemetry rows (hourly)
+    _asyncio.create_task(start_retention_jobs())
+
     await session.generate_reply(
         instructions=Reply_prompts
     )
-    conv_ctx = MemoryExtractor()
-    await conv_ctx.run(current_ctx)
+    conv_ctx = MemoryExtractor(memory)
+    await conv_ctx.run(session)
     
 
 
@@ -2,75 +2,102 @@ import psutil
 import time
 import json
 import asyncio
+import atexit
+import functools
+import threading
 from datetime import datetime, timedelta
 from typing import Dict, List, Any
 from livekit.agents import function_tool
-from db import init_db, _connect, _lock
+from db import init_db, read
+import db_async
+from ring_buffer import RingBuffer
+from latency_histogram import LatencyHistogram
+from metric_sink import MetricSink
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Rolling windows: last N commands, and 24h of 30-second system samples
+RESPONSE_TIME_WINDOW = 1000
+SYSTEM_SAMPLE_WINDOW = 2880
+# A tool whose p95 exceeds this stalls the spoken reply noticeably
+VOICE_LATENCY_BUDGET_MS = 2000
+
+_ANALYTICS_INSERT = "INSERT INTO analytics (metric_type, value, metadata) VALUES (?, ?, ?)"
+_PERFORMANCE_INSERT = (
+    "INSERT INTO performance_logs (cpu_percent, memory_mb, active_tools, response_time_ms) VALUES (?, ?, ?, ?)"
+)
+_LATENCY_UPSERT = (
+    "INSERT INTO tool_latency (tool_name, samples, histogram) VALUES (?, ?, ?) "
+    "ON CONFLICT(tool_name) DO UPDATE SET samples = excluded.samples, "
+    "histogram = excluded.histogram, updated_at = CURRENT_TIMESTAMP"
+)
+
 class AnalyticsEngine:
     def __init__(self):
         self.session_start = time.time()
         self.metrics = {
             'commands_count': 0,
             'errors_count': 0,
-            'response_times': [],
-            'memory_usage': [],
-            'cpu_usage': []
+            'response_times': RingBuffer(RESPONSE_TIME_WINDOW),
+            'memory_usage': RingBuffer(SYSTEM_SAMPLE_WINDOW),
+            'cpu_usage': RingBuffer(SYSTEM_SAMPLE_WINDOW)
         }
+        self.latency: Dict[str, LatencyHistogram] = {}
+        self._latency_dirty = set()
+        self.sink = MetricSink()
         self._init_analytics_db()
+        self._load_latency()
     
     def _init_analytics_db(self):
+        # analytics / performance_logs are created by db's migrations
         init_db()
-        with _lock:
-            conn = _connect()
-            try:
-                cur = conn.cursor()
-                cur.execute("""
-                    CREATE TABLE IF NOT EXISTS analytics (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                        metric_type TEXT,
-                        value REAL,
-                        metadata TEXT
-                    )
-                """)
-                cur.execute("""
-                    CREATE TABLE IF NOT EXISTS performance_logs (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                        cpu_percent REAL,
-                        memory_mb REAL,
-                        active_tools INTEGER,
-                        response_time_ms REAL
-                    )
-                """)
-                conn.commit()
-            finally:
-                conn.close()
+    
+    def _load_latency(self):
+        try:
+            with read() as conn:
+                rows = conn.execute("SELECT tool_name, histogram FROM tool_latency").fetchall()
+            for tool_name, blob in rows:
+                self.latency[tool_name] = LatencyHistogram.from_bytes(blob)
+        except Exception as e:
+            logger.warning(f"Could not load tool latency histograms: {e}")
     
     def track_command(self, tool_name: str, response_time: float, success: bool):
         self.metrics['commands_count'] += 1
         self.metrics['response_times'].append(response_time)
+        hist = self.latency.get(tool_name)
+        if hist is None:
+            hist = self.latency[tool_name] = LatencyHistogram()
+        hist.record(response_time * 1000)
+        self._latency_dirty.add(tool_name)
         if not success:
             self.metrics['errors_count'] += 1
         
-        # Log to DB
-        with _lock:
-            conn = _connect()
-            try:
-                cur = conn.cursor()
-                cur.execute(
-                    "INSERT INTO analytics (metric_type, value, metadata) VALUES (?, ?, ?)",
-                    ('command_execution', response_time, json.dumps({
-                        'tool': tool_name, 'success': success
-                    }))
-                )
-                conn.commit()
-            finally:
-                conn.close()
+        # Buffered; the sink writes batches in the background
+        self.sink.add(_ANALYTICS_INSERT, ('command_execution', response_time, json.dumps({
+            'tool': tool_name, 'success': success
+        })))
+    
+    def flush_latency(self):
+        """Queue histograms of tools used since the last flush (one small upsert per tool)"""
+        for name in self._latency_dirty:
+            hist = self.latency[name]
+            self.sink.add(_LATENCY_UPSERT, (name, hist.count, hist.to_bytes()))
+        self._latency_dirty.clear()
+    
+    def close(self):
+        """Write out buffered samples and histograms (at exit)"""
+        self.flush_latency()
+        self.sink.close()
+    
+    def latency_summary(self, limit: int = 5) -> List[Dict[str, Any]]:
+        """Slowest tools by p95, with p50/p95/p99/max in milliseconds"""
+        summary = [
+            {'tool': name, 'count': hist.count, **hist.quantiles(), 'max': round(hist.max_ms, 1)}
+            for name, hist in self.latency.items() if hist.count
+        ]
+        summary.sort(key=lambda row: row['p95'], reverse=True)
+        return summary[:limit]
     
     def track_system_performance(self):
         cpu = psutil.cpu_percent()
@@ -79,47 +106,53 @@ class AnalyticsEngine:
         self.metrics['cpu_usage'].append(cpu)
         self.metrics['memory_usage'].append(memory)
         
-        with _lock:
-            conn = _connect()
-            try:
-                cur = conn.cursor()
-                cur.execute(
-                    "INSERT INTO performance_logs (cpu_percent, memory_mb, active_tools, response_time_ms) VALUES (?, ?, ?, ?)",
-                    (cpu, memory, len(self.metrics['response_times']), 
-                     sum(self.metrics['response_times'][-10:]) / min(10, len(self.metrics['response_times'])) if self.metrics['response_times'] else 0)
-                )
-                conn.commit()
-            finally:
-                conn.close()
+        self.sink.add(_PERFORMANCE_INSERT, (
+            cpu, memory, self.metrics['commands_count'], self.metrics['response_times'].recent_mean(10)
+        ))
+        self.flush_latency()
     
     def predict_errors(self) -> Dict[str, Any]:
         """Simple error prediction based on patterns"""
         error_rate = self.metrics['errors_count'] / max(1, self.metrics['commands_count'])
-        avg_response_time = sum(self.metrics['response_times'][-20:]) / max(1, len(self.metrics['response_times'][-20:]))
+        avg_response_time = self.metrics['response_times'].recent_mean(20)
         
         predictions = {
             'high_error_risk': error_rate > 0.3,
             'slow_response_risk': avg_response_time > 5.0,
-            'memory_pressure': self.metrics['memory_usage'][-1] > 1000 if self.metrics['memory_usage'] else False
+            'memory_pressure': self.metrics['memory_usage'].last(0.0) > 1000
         }
         return predictions
     
     def get_dashboard_data(self) -> Dict[str, Any]:
         uptime = time.time() - self.session_start
-        avg_response = sum(self.metrics['response_times']) / max(1, len(self.metrics['response_times']))
+        avg_response = self.metrics['response_times'].mean()
         
         return {
             'uptime_minutes': round(uptime / 60, 1),
             'total_commands': self.metrics['commands_count'],
             'error_rate': round(self.metrics['errors_count'] / max(1, self.metrics['commands_count']) * 100, 1),
             'avg_response_time': round(avg_response, 2),
-            'current_memory_mb': self.metrics['memory_usage'][-1] if self.metrics['memory_usage'] else 0,
-            'current_cpu_percent': self.metrics['cpu_usage'][-1] if self.metrics['cpu_usage'] else 0,
-            'predictions': self.predict_errors()
+            'current_memory_mb': self.metrics['memory_usage'].last(0),
+            'current_cpu_percent': self.metrics['cpu_usage'].last(0),
+            'peak_memory_mb': self.metrics['memory_usage'].max(),
+            'avg_cpu_percent': round(self.metrics['cpu_usage'].mean(), 1),
+            'predictions': self.predict_errors(),
+            'tool_latency': self.latency_summary(),
+            'metric_sink': self.sink.get_stats()
         }
 
-# Global analytics instance
-_analytics = AnalyticsEngine()
+# Global analytics instance, built on first use so importing this module
+# doesn't open the database or start the sink thread
+_analytics = None
+_analytics_lock = threading.Lock()
+
+def get_analytics() -> AnalyticsEngine:
+    global _analytics
+    with _analytics_lock:
+        if _analytics is None:
+            _analytics = AnalyticsEngine()
+            atexit.register(_analytics.close)
+    return _analytics
 
 @function_tool()
 async def get_performance_dashboard() -> str:
@@ -129,8 +162,9 @@ async def get_performance_dashboard() -> str:
     Use when user asks: "Performance দেখাও", "System stats", "কেমন চলছে?"
     """
     try:
-        _analytics.track_system_performance()
-        data = _analytics.get_dashboard_data()
+        analytics = get_analytics()
+        analytics.track_system_performance()
+        data = analytics.get_dashboard_data()
         
         dashboard = f"""
 📊 **Jarvis Performance Dashboard**
@@ -141,8 +175,9 @@ async def get_performance_dashboard() -> str:
 ⚡ **Avg Response Time**: {data['avg_response_time']}s
 
 💻 **System Resources**:
-- CPU Usage: {data['current_cpu_percent']}%
-- Memory Usage: {data['current_memory_mb']:.1f} MB
+- CPU Usage: {data['current_cpu_percent']}% (avg {data['avg_cpu_percent']}%)
+- Memory Usage: {data['current_memory_mb']:.1f} MB (peak {data['peak_memory_mb']:.1f} MB)
+- Metric Samples: {data['metric_sink']['written']} saved, {data['metric_sink']['dropped']} dropped
 
 🔮 **Predictions**:
 - High Error Risk: {'⚠️ YES' if data['predictions']['high_error_risk'] else '✅ NO'}
@@ -150,7 +185,10 @@ async def get_performance_dashboard() -> str:
 - Memory Pressure: {'⚠️ YES' if data['predictions']['memory_pressure'] else '✅ NO'}
         """
         
-        return dashboard.strip()
+        dashboard = dashboard.strip()
+        if data['tool_latency']:
+            dashboard += "\n\n" + _format_latency(data['tool_latency'])
+        return dashboard
     except Exception as e:
         return f"❌ Analytics error: {str(e)[:100]}"
 
@@ -167,17 +205,10 @@ async def optimize_performance() -> str:
         # Memory cleanup
         gc.collect()
         
-        # Clear old metrics (keep last 100)
-        if len(_analytics.metrics['response_times']) > 100:
-            _analytics.metrics['response_times'] = _analytics.metrics['response_times'][-100:]
-        if len(_analytics.metrics['memory_usage']) > 100:
-            _analytics.metrics['memory_usage'] = _analytics.metrics['memory_usage'][-100:]
-        if len(_analytics.metrics['cpu_usage']) > 100:
-            _analytics.metrics['cpu_usage'] = _analytics.metrics['cpu_usage'][-100:]
-        
         # Get current performance
-        _analytics.track_system_performance()
-        data = _analytics.get_dashboard_data()
+        analytics = get_analytics()
+        analytics.track_system_performance()
+        data = analytics.get_dashboard_data()
         
         optimizations = []
         
@@ -198,6 +229,53 @@ async def optimize_performance() -> str:
     except Exception as e:
         return f"❌ Optimization failed: {str(e)[:100]}"
 
+def _format_latency(rows: List[Dict[str, Any]]) -> str:
+    lines = [f"⏱️ **Tool Latency (p50 / p95 / p99, budget {VOICE_LATENCY_BUDGET_MS} ms)**:"]
+    for row in rows:
+        flag = "⚠️" if row['p95'] > VOICE_LATENCY_BUDGET_MS else "✅"
+        lines.append(f"- {flag} {row['tool']}: {row['p50']:.0f} / {row['p95']:.0f} / {row['p99']:.0f} ms "
+                     f"({row['count']} calls)")
+    return "\n".join(lines)
+
+def _behavior_stats():
+    """Tool usage aggregates for the last 7 days (runs on a DB reader thread)"""
+    with read() as conn:
+        cur = conn.cursor()
+        
+        # Most used tools
+        cur.execute("""
+            SELECT tool_name, COUNT(*) as usage_count 
+            FROM tool_events 
+            WHERE created_at > datetime('now', '-7 days')
+            GROUP BY tool_name 
+            ORDER BY usage_count DESC 
+            LIMIT 5
+        """)
+        top_tools = cur.fetchall()
+        
+        # Usage by hour
+        cur.execute("""
+            SELECT strftime('%H', created_at) as hour, COUNT(*) as count
+            FROM tool_events 
+            WHERE created_at > datetime('now', '-7 days')
+            GROUP BY hour 
+            ORDER BY count DESC 
+            LIMIT 3
+        """)
+        peak_hours = cur.fetchall()
+        
+        # Error patterns
+        cur.execute("""
+            SELECT tool_name, COUNT(*) as error_count
+            FROM tool_events 
+            WHERE success = 0 AND created_at > datetime('now', '-7 days')
+            GROUP BY tool_name 
+            ORDER BY error_count DESC 
+            LIMIT 3
+        """)
+        error_tools = cur.fetchall()
+    return top_tools, peak_hours, error_tools
+
 @function_tool()
 async def analyze_user_behavior() -> str:
     """
@@ -206,46 +284,7 @@ async def analyze_user_behavior() -> str:
     Use when user asks: "আমার behavior analysis করো", "Usage pattern দেখাও"
     """
     try:
-        with _lock:
-            conn = _connect()
-            try:
-                cur = conn.cursor()
-                
-                # Most used tools
-                cur.execute("""
-                    SELECT tool_name, COUNT(*) as usage_count 
-                    FROM tool_events 
-                    WHERE created_at > datetime('now', '-7 days')
-                    GROUP BY tool_name 
-                    ORDER BY usage_count DESC 
-                    LIMIT 5
-                """)
-                top_tools = cur.fetchall()
-                
-                # Usage by hour
-                cur.execute("""
-                    SELECT strftime('%H', created_at) as hour, COUNT(*) as count
-                    FROM tool_events 
-                    WHERE created_at > datetime('now', '-7 days')
-                    GROUP BY hour 
-                    ORDER BY count DESC 
-                    LIMIT 3
-                """)
-                peak_hours = cur.fetchall()
-                
-                # Error patterns
-                cur.execute("""
-                    SELECT tool_name, COUNT(*) as error_count
-                    FROM tool_events 
-                    WHERE success = 0 AND created_at > datetime('now', '-7 days')
-                    GROUP BY tool_name 
-                    ORDER BY error_count DESC 
-                    LIMIT 3
-                """)
-                error_tools = cur.fetchall()
-                
-            finally:
-                conn.close()
+        top_tools, peak_hours, error_tools = await db_async.read(_behavior_stats)
         
         analysis = "📈 **User Behavior Analysis (Last 7 Days)**\n\n"
         
@@ -265,6 +304,13 @@ async def analyze_user_behavior() -> str:
             analysis += "⚠️ **Tools with Most Errors**:\n"
             for tool, count in error_tools:
                 analysis += f"- {tool}: {count} errors\n"
+            analysis += "\n"
+        
+        slow_tools = [row for row in get_analytics().latency_summary() if row['p95'] > VOICE_LATENCY_BUDGET_MS]
+        if slow_tools:
+            analysis += "🐢 **Tools Over the Voice Latency Budget (p95, all time)**:\n"
+            for row in slow_tools:
+                analysis += f"- {row['tool']}: p95 {row['p95']:.0f} ms, p99 {row['p99']:.0f} ms\n"
         
         return analysis
         
@@ -273,26 +319,43 @@ async def analyze_user_behavior() -> str:
 
 # Performance monitoring decorator
 def monitor_performance(func):
+    """
+    Time an async tool; failures are exceptions or "❌" replies. Wrapping an
+    already decorated @function_tool() keeps it a tool (wraps copies its info).
+    """
+    @functools.wraps(func)
     async def wrapper(*args, **kwargs):
-        start_time = time.time()
+        start_time = time.perf_counter()
         success = True
         try:
             result = await func(*args, **kwargs)
+            if isinstance(result, str) and result.lstrip().startswith("❌"):
+                success = False
             return result
         except Exception as e:
             success = False
             raise
         finally:
-            response_time = time.time() - start_time
-            _analytics.track_command(func.__name__, response_time, success)
+            response_time = time.perf_counter() - start_time
+            get_analytics().track_command(func.__name__, response_time, success)
     return wrapper
 
+def monitor_tools(tools: List[Any]) -> List[Any]:
+    """
+    Time every tool the agent registers, in one place. Tools that other tools
+    call internally (open_app under verified_open_app) stay unwrapped, so each
+    call lands in exactly one histogram.
+    """
+    return [monitor_performance(tool) for tool in tools]
+
 # Auto-monitoring task
 async def start_performance_monitoring():
     """Background task to continuously monitor system performance"""
+    # Opening the engine runs init_db; keep that off the event loop
+    await asyncio.to_thread(get_analytics)
     while True:
         try:
-            _analytics.track_system_performance()
+            get_analytics().track_system_performance()
             await asyncio.sleep(30)  # Monitor every 30 seconds
         except Exception as e:
             logger.error(f"Performance monitoring error: {e}")
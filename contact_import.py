@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Streaming contact import for phone exports (CSV and vCard)
+Usage: python contact_import.py contacts.vcf [--country-code 91] [--output report.json]
+
+    report = import_contacts("contacts.csv")
+    print(report.imported, report.rows_per_s)
+
+Files are parsed lazily, one contact at a time. Every number is normalized to
+E.164 (db.normalize_phone) and deduplicated on that form, both within the
+file and against numbers already saved. Rows go in through executemany in
+batches, all inside one write transaction, so a failed import leaves the
+contacts table as it was. The contact index is invalidated once at the end.
+
+CSV headers are matched by name (Google, Outlook and most phone exports).
+Files without a recognizable header fall back to the old fixed layout: name
+in column 0, number in column 30.
+"""
+import argparse
+import csv
+import itertools
+import json
+import logging
+import os
+import quopri
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from db import DEFAULT_COUNTRY_CODE, init_db, normalize_name, normalize_phone, write
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+LEGACY_CSV_COLUMNS = (0, 30)  # name, number in the original whatsapp.py importer
+
+_NAME_HEADERS = ("name", "display name", "full name", "fn", "nom", "নাম")
+_NAME_PART_HEADERS = (
+    ("given name", "first name"),
+    ("additional name", "middle name"),
+    ("family name", "last name", "surname"),
+)
+_PHONE_WORDS = ("phone", "mobile", "tel", "number", "cell")
+_PHONE_SKIP_WORDS = ("type", "label")
+_MULTI_VALUE_SEPARATOR = ":::"  # Google Contacts puts several numbers in one cell
+_INSERT_SQL = "INSERT INTO contacts (name, mobile_no, name_norm, mobile_e164) VALUES (?, ?, ?, ?)"
+
+
+@dataclass
+class ImportReport:
+    source: str
+    format: str
+    contacts_read: int = 0
+    numbers_seen: int = 0
+    imported: int = 0
+    duplicates: int = 0
+    invalid: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_s(self) -> float:
+        return round(self.numbers_seen / self.seconds, 1) if self.seconds else 0.0
+
+    def to_dict(self) -> Dict:
+        return {**asdict(self), "seconds": round(self.seconds, 3), "rows_per_s": self.rows_per_s}
+
+
+# ------------------------------------------------------------------- parsers
+
+def _split_numbers(cell: str) -> List[str]:
+    return [n.strip() for n in cell.split(_MULTI_VALUE_SEPARATOR) if n.strip()]
+
+
+def _csv_layout(header: List[str]) -> Optional[Tuple[List[int], List[List[int]], List[int]]]:
+    """(name columns, name-part column groups, phone columns) for a header row, or None"""
+    cols = [h.strip().lower() for h in header]
+    names = [i for i, h in enumerate(cols) if h in _NAME_HEADERS]
+    parts = [[i for i, h in enumerate(cols) if h in group] for group in _NAME_PART_HEADERS]
+    phones = [
+        i for i, h in enumerate(cols)
+        if any(w in h for w in _PHONE_WORDS) and not any(w in h for w in _PHONE_SKIP_WORDS)
+    ]
+    if not phones or not (names or any(parts)):
+        return None
+    return names, parts, phones
+
+
+def iter_csv_contacts(path: str) -> Iterator[Tuple[str, List[str]]]:
+    """(name, raw numbers) for each contact row of a CSV export"""
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        first = next(reader, None)
+        if first is None:
+            return
+        layout = _csv_layout(first)
+        if layout is None:
+            name_col, phone_col = LEGACY_CSV_COLUMNS
+            for row in itertools.chain([first], reader):
+                if len(row) > phone_col:
+                    yield row[name_col].strip(), _split_numbers(row[phone_col])
+            return
+
+        names, parts, phones = layout
+        for row in reader:
+            name = next((row[i].strip() for i in names if i < len(row) and row[i].strip()), "")
+            if not name:
+                name = " ".join(
+                    row[group[0]].strip() for group in parts
+                    if group and group[0] < len(row) and row[group[0]].strip()
+                )
+            numbers = [n for i in phones if i < len(row) for n in _split_numbers(row[i])]
+            yield name, numbers
+
+
+def _vcard_lines(f: Iterable[str]) -> Iterator[str]:
+    """Logical vCard lines: folded lines joined, quoted-printable soft breaks undone"""
+    current: Optional[str] = None
+    for raw in f:
+        line = raw.rstrip("\r\n")
+        if current is not None and line[:1] in (" ", "\t"):
+            current += line[1:]
+            continue
+        if current is not None and current.endswith("=") and "QUOTED-PRINTABLE" in current.split(":", 1)[0].upper():
+            current = current[:-1] + line
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current is not None:
+        yield current
+
+
+def _vcard_value(params: List[str], value: str) -> str:
+    upper = [p.upper() for p in params]
+    if "ENCODING=QUOTED-PRINTABLE" in upper or "QUOTED-PRINTABLE" in upper:
+        charset = next((p.split("=", 1)[1] for p in params if p.upper().startswith("CHARSET=")), "utf-8")
+        value = quopri.decodestring(value.encode("ascii", "ignore")).decode(charset, "replace")
+    return value.replace("\\,", ",").replace("\\;", ";").strip()
+
+
+def iter_vcard_contacts(path: str) -> Iterator[Tuple[str, List[str]]]:
+    """(name, raw numbers) for each BEGIN:VCARD ... END:VCARD block"""
+    with open(path, "r", encoding="utf-8-sig", errors="replace") as f:
+        full_name, parts, numbers = "", "", []
+        for line in _vcard_lines(f):
+            if ":" not in line:
+                continue
+            key, value = line.split(":", 1)
+            prop, *params = key.split(";")
+            prop = prop.rsplit(".", 1)[-1].upper()  # "item1.TEL" -> "TEL"
+            if prop == "BEGIN":
+                full_name, parts, numbers = "", "", []
+            elif prop == "FN":
+                full_name = _vcard_value(params, value)
+            elif prop == "N":
+                # N:Family;Given;Additional;Prefix;Suffix
+                fields = _vcard_value(params, value).split(";")
+                order = [fields[i] for i in (1, 2, 0) if i < len(fields)]
+                parts = " ".join(p.strip() for p in order if p.strip())
+            elif prop == "TEL":
+                numbers.append(_vcard_value(params, value))
+            elif prop == "END":
+                yield full_name or parts, numbers
+
+
+def _detect_format(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".vcf", ".vcard"):
+        return "vcard"
+    if ext == ".csv":
+        return "csv"
+    with open(path, "r", encoding="utf-8-sig", errors="replace") as f:
+        return "vcard" if f.read(64).lstrip().upper().startswith("BEGIN:VCARD") else "csv"
+
+
+# ------------------------------------------------------------------ pipeline
+
+def import_contacts(path: str, fmt: Optional[str] = None,
+                    country_code: str = DEFAULT_COUNTRY_CODE,
+                    batch_size: int = BATCH_SIZE) -> ImportReport:
+    """Import a CSV or vCard export into the contacts table in one transaction"""
+    fmt = fmt or _detect_format(path)
+    parse = iter_vcard_contacts if fmt == "vcard" else iter_csv_contacts
+    report = ImportReport(source=path, format=fmt)
+    start = time.perf_counter()
+
+    init_db()
+    with write() as conn:
+        seen = {row[0] for row in conn.execute(
+            "SELECT mobile_e164 FROM contacts WHERE mobile_e164 IS NOT NULL")}
+        batch: List[Tuple[str, str, str, str]] = []
+        for name, numbers in parse(path):
+            report.contacts_read += 1
+            for number in numbers:
+                report.numbers_seen += 1
+                e164 = normalize_phone(number, country_code)
+                if not name or e164 is None:
+                    report.invalid += 1
+                    continue
+                if e164 in seen:
+                    report.duplicates += 1
+                    continue
+                seen.add(e164)
+                batch.append((name, e164, normalize_name(name), e164))
+                if len(batch) >= batch_size:
+                    conn.executemany(_INSERT_SQL, batch)
+                    report.imported += len(batch)
+                    batch.clear()
+        if batch:
+            conn.executemany(_INSERT_SQL, batch)
+            report.imported += len(batch)
+
+    report.seconds = time.perf_counter() - start
+    if report.imported:
+        from contact_index import get_contact_index
+        get_contact_index().invalidate()
+    logger.info(
+        f"Imported {report.imported} contact number(s) from {path} "
+        f"({report.duplicates} duplicate, {report.invalid} invalid) "
+        f"in {report.seconds:.2f}s, {report.rows_per_s} rows/s"
+    )
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import a CSV or vCard contacts export")
+    parser.add_argument("path", help="contacts export (.csv or .vcf)")
+    parser.add_argument("--format", choices=("csv", "vcard"), help="override detection by extension")
+    parser.add_argument("--country-code", default=DEFAULT_COUNTRY_CODE,
+                        help="calling code for numbers saved without one")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = import_contacts(args.path, args.format, args.country_code, args.batch_size)
+    output = json.dumps(report.to_dict(), indent=2, ensure_ascii=False)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
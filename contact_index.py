@@ -0,0 +1,325 @@
+"""
+In-memory contact resolver for spoken names.
+
+Contacts are loaded from the central DB once and kept in a few small
+structures:
+
+- an exact map from normalized name to contacts
+- a sorted key list for prefix lookups (bisect)
+- a token map so "rahul" finds "Rahul Sharma", plus consonant skeletons so
+  "prateek" finds "Protik"
+- a trigram inverted index for misheard or misspelled names
+
+Exact, prefix and token hits are scored first. Only when none is confident
+does the trigram shortlist get edit-similarity scoring, with RapidFuzz WRatio
+when it is installed and difflib otherwise.
+
+Names and queries in Bangla or Devanagari script are also romanized, so
+"রাহুল" and "राहुल" reach "Rahul". `resolve()` returns ranked candidates,
+one per phone number (a contact saved twice under the same number is one
+person); `is_ambiguous()` tells callers when to ask instead of guessing.
+"""
+import bisect
+import difflib
+import logging
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+try:
+    from rapidfuzz import fuzz
+except ImportError:
+    fuzz = None
+
+from db import normalize_name, normalize_phone
+
+logger = logging.getLogger(__name__)
+
+MIN_SCORE = 0.6
+AMBIGUITY_MARGIN = 0.05
+TRIGRAM_CANDIDATES = 50
+
+# Devanagari (U+0900) and Bengali (U+0980) share one layout; map by offset
+_INDIC_BASES = (0x0900, 0x0980)
+_CONSONANTS = {
+    0x15: "k", 0x16: "kh", 0x17: "g", 0x18: "gh", 0x19: "ng",
+    0x1A: "ch", 0x1B: "chh", 0x1C: "j", 0x1D: "jh", 0x1E: "n",
+    0x1F: "t", 0x20: "th", 0x21: "d", 0x22: "dh", 0x23: "n",
+    0x24: "t", 0x25: "th", 0x26: "d", 0x27: "dh", 0x28: "n", 0x29: "n",
+    0x2A: "p", 0x2B: "ph", 0x2C: "b", 0x2D: "bh", 0x2E: "m",
+    0x2F: "y", 0x30: "r", 0x31: "r", 0x32: "l", 0x33: "l", 0x34: "l", 0x35: "v",
+    0x36: "sh", 0x37: "sh", 0x38: "s", 0x39: "h",
+    0x58: "q", 0x59: "kh", 0x5A: "gh", 0x5B: "z", 0x5C: "r", 0x5D: "rh", 0x5E: "f", 0x5F: "y",
+}
+_VOWELS = {
+    0x05: "a", 0x06: "a", 0x07: "i", 0x08: "i", 0x09: "u", 0x0A: "u", 0x0B: "ri",
+    0x0F: "e", 0x10: "ai", 0x13: "o", 0x14: "au",
+}
+_VOWEL_SIGNS = {
+    0x3E: "a", 0x3F: "i", 0x40: "i", 0x41: "u", 0x42: "u", 0x43: "ri",
+    0x47: "e", 0x48: "ai", 0x4B: "o", 0x4C: "au",
+}
+_MARKS = {0x01: "n", 0x02: "n", 0x03: "h"}
+_VIRAMA = 0x4D
+
+
+def _indic_offset(ch: str) -> Optional[int]:
+    code = ord(ch)
+    for base in _INDIC_BASES:
+        if base <= code < base + 0x80:
+            return code - base
+    return None
+
+
+def romanize(text: str) -> str:
+    """Rough Latin spelling of Bangla/Devanagari text, tuned for names (other scripts pass through)"""
+    out: List[str] = []
+    pending_a = False  # inherent vowel of the last consonant, dropped at word end
+    for ch in text:
+        offset = _indic_offset(ch)
+        if offset is None:
+            pending_a = False
+            out.append(ch)
+            continue
+        if offset in _CONSONANTS:
+            if pending_a:
+                out.append("a")
+            out.append(_CONSONANTS[offset])
+            pending_a = True
+        elif offset in _VOWEL_SIGNS:
+            out.append(_VOWEL_SIGNS[offset])
+            pending_a = False
+        elif offset == _VIRAMA:
+            pending_a = False
+        elif offset in _VOWELS:
+            if pending_a:
+                out.append("a")
+            out.append(_VOWELS[offset])
+            pending_a = False
+        elif offset in _MARKS:
+            if pending_a:
+                out.append("a")
+            out.append(_MARKS[offset])
+            pending_a = False
+    return "".join(out)
+
+
+def _skeleton(token: str) -> str:
+    """Consonant skeleton of a Latin token: "prateek", "pratik" and "protik" all give 'prtk'"""
+    if len(token) < 3 or not token.isascii() or not token.isalpha():
+        return ""
+    out = [token[0]]
+    for ch in token[1:]:
+        if ch in "aeiouyh" or ch == out[-1]:
+            continue
+        out.append(ch)
+    return "".join(out) if len(out) > 1 else ""
+
+
+def _trigrams(key: str) -> Set[str]:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass
+class ContactMatch:
+    id: int
+    name: str
+    mobile_no: str
+    score: float
+    method: str
+
+
+@dataclass
+class _Contact:
+    id: int
+    name: str
+    mobile_no: str
+    keys: Tuple[str, ...] = field(default_factory=tuple)
+    number: str = ""    # E.164 form when valid, else the raw number; duplicates share it
+
+
+class ContactIndex:
+    def __init__(self, transliterate: bool = True):
+        self.transliterate = transliterate
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._contacts: Dict[int, _Contact] = {}
+        self._tokens: Dict[str, List[int]] = {}
+        self._skeletons: Dict[str, List[int]] = {}
+        self._sorted_keys: List[str] = []
+        self._trigrams: Dict[str, Set[int]] = {}
+        self._key_trigrams: Dict[str, Set[str]] = {}
+        self._key_owner: Dict[str, List[int]] = {}  # normalized key -> contacts (exact match)
+
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return len(self._contacts)
+
+    def _keys_for(self, name: str) -> Tuple[str, ...]:
+        key = normalize_name(name)
+        keys = [key] if key else []
+        if self.transliterate and key:
+            latin = romanize(key)
+            if latin != key:
+                keys.append(latin)
+        return tuple(keys)
+
+    # ---------------------------------------------------------------- loading
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.refresh()
+
+    def refresh(self) -> None:
+        """Rebuild from the contacts table"""
+        from db import init_db, read
+        init_db()
+        with read() as conn:
+            rows = conn.execute("SELECT id, name, mobile_no FROM contacts WHERE name IS NOT NULL").fetchall()
+        with self._lock:
+            self._contacts.clear()
+            self._tokens.clear()
+            self._skeletons.clear()
+            self._trigrams.clear()
+            self._key_trigrams.clear()
+            self._key_owner.clear()
+            for row in rows:
+                self._insert(row[0], row[1], row[2])
+            self._sorted_keys = sorted(self._key_owner)
+            self._loaded = True
+        logger.info(f"Contact index loaded: {len(rows)} contact(s)")
+
+    def invalidate(self) -> None:
+        """Reload on next lookup (after bulk imports)"""
+        self._loaded = False
+
+    def add(self, contact_id: int, name: str, mobile_no: str) -> None:
+        """Index one newly added contact without a full reload"""
+        if not self._loaded:
+            return  # the next lookup loads everything, including this one
+        with self._lock:
+            new_keys = [k for k in self._keys_for(name) if k not in self._key_owner]
+            self._insert(contact_id, name, mobile_no)
+            for key in new_keys:
+                bisect.insort(self._sorted_keys, key)
+
+    def _insert(self, contact_id: int, name: str, mobile_no: str) -> None:
+        mobile_no = str(mobile_no or "")
+        contact = _Contact(contact_id, name, mobile_no, self._keys_for(name),
+                           normalize_phone(mobile_no) or mobile_no.strip())
+        self._contacts[contact_id] = contact
+        for key in contact.keys:
+            self._key_owner.setdefault(key, []).append(contact_id)
+            for token in key.split():
+                self._tokens.setdefault(token, []).append(contact_id)
+                skeleton = _skeleton(token)
+                if skeleton:
+                    self._skeletons.setdefault(skeleton, []).append(contact_id)
+            grams = self._key_trigrams.setdefault(key, _trigrams(key))
+            for gram in grams:
+                self._trigrams.setdefault(gram, set()).add(contact_id)
+
+    # ---------------------------------------------------------------- lookups
+
+    def resolve(self, query: str, limit: int = 5) -> List[ContactMatch]:
+        """Ranked contacts for a spoken/typed name, best first"""
+        self._ensure_loaded()
+        queries = self._keys_for(query)
+        if not queries:
+            return []
+        scores: Dict[int, Tuple[float, str]] = {}
+
+        def offer(contact_id: int, score: float, method: str) -> None:
+            if score > scores.get(contact_id, (0.0, ""))[0]:
+                scores[contact_id] = (score, method)
+
+        with self._lock:
+            for q in queries:
+                for contact_id in self._key_owner.get(q, ()):
+                    offer(contact_id, 1.0, "exact")
+
+                # Prefix of the whole name ("rah" -> "rahul sharma")
+                i = bisect.bisect_left(self._sorted_keys, q)
+                while i < len(self._sorted_keys) and self._sorted_keys[i].startswith(q):
+                    key = self._sorted_keys[i]
+                    for contact_id in self._key_owner[key]:
+                        offer(contact_id, 0.85 + 0.1 * len(q) / len(key), "prefix")
+                    i += 1
+
+                # Whole-word match on any part of the name ("sharma")
+                tokens = q.split()
+                for token in tokens:
+                    for contact_id in self._tokens.get(token, ()):
+                        offer(contact_id, 0.85 if token == q else 0.7, "token")
+
+                # Same consonant skeletons: spelling variants of the spoken name,
+                # weighted by how many query words agree and how close the spelling is
+                sounded: Counter = Counter()
+                for token in tokens:
+                    sounded.update(set(self._skeletons.get(_skeleton(token), ())))
+                for contact_id, hits in sounded.items():
+                    keys = self._contacts[contact_id].keys
+                    closeness = max(self._similarity(q, part) for key in keys for part in (key, *key.split()))
+                    offer(contact_id, (0.6 + 0.2 * closeness) * hits / len(tokens), "phonetic")
+
+            # Misheard names: only when nothing above is a likely hit
+            if max((score for score, _ in scores.values()), default=0.0) < 0.7:
+                for q in queries:
+                    self._fuzzy_candidates(q, offer)
+
+            matches: List[ContactMatch] = []
+            numbers: Set[str] = set()
+            for cid, (score, method) in sorted(scores.items(), key=lambda kv: (-kv[1][0], kv[0])):
+                if score < MIN_SCORE or len(matches) >= limit:
+                    break
+                contact = self._contacts[cid]
+                if contact.number and contact.number in numbers:
+                    continue  # same person saved twice; the better-scored entry stands
+                numbers.add(contact.number)
+                matches.append(ContactMatch(cid, contact.name, contact.mobile_no, round(score, 4), method))
+            return matches
+
+    def _fuzzy_candidates(self, q: str, offer) -> None:
+        """Shortlist by shared trigrams, then score by Dice overlap and edit similarity"""
+        q_grams = _trigrams(q)
+        shared: Counter = Counter()
+        for gram in q_grams:
+            shared.update(self._trigrams.get(gram, ()))
+        for contact_id, _ in shared.most_common(TRIGRAM_CANDIDATES):
+            for key in self._contacts[contact_id].keys:
+                key_grams = self._key_trigrams[key]
+                dice = 2 * len(q_grams & key_grams) / (len(q_grams) + len(key_grams))
+                offer(contact_id, 0.9 * dice, "trigram")
+                offer(contact_id, 0.9 * self._similarity(q, key), "fuzzy")
+
+    @staticmethod
+    def _similarity(a: str, b: str) -> float:
+        if fuzz is not None:
+            return fuzz.WRatio(a, b) / 100
+        return difflib.SequenceMatcher(None, a, b).ratio()
+
+    @staticmethod
+    def is_ambiguous(matches: List[ContactMatch]) -> bool:
+        """True when the top candidates are too close to pick one without asking"""
+        if len(matches) < 2:
+            return False
+        first, second = (normalize_phone(m.mobile_no) or m.mobile_no.strip() for m in matches[:2])
+        if first and first == second:
+            return False  # one person saved twice
+        if matches[0].method == "exact":
+            return matches[1].method == "exact"  # same name saved twice
+        return matches[0].score - matches[1].score < AMBIGUITY_MARGIN
+
+
+_index: Optional[ContactIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_contact_index() -> ContactIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = ContactIndex()
+        return _index
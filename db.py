@@ -0,0 +1,656 @@
+"""
+Central SQLite store (jarvis.db): profiles, conversation messages, tool events,
+contacts, analytics, WhatsApp history and web-automation logs.
+
+The schema is built by versioned migrations (PRAGMA user_version). Migration 4
+imports the older contacts.db and robot_agent.db files once. After that those
+files are no longer read or written.
+
+Connections are pooled per thread and kept open; each one runs in WAL mode
+with tuned pragmas and a large prepared-statement cache. Reads go straight to
+the calling thread's connection, so dashboards and analytics never wait
+on writers. Writes are serialized through one lock and committed (or rolled
+back) as a unit:
+
+    with read() as conn:
+        rows = conn.execute("SELECT ...").fetchall()
+
+    with write() as conn:
+        conn.execute("INSERT ...")
+
+`_connect()` / `_lock` remain for older callers. `_connect()` hands out the
+pooled connection wrapped so that `close()` only ends the transaction.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.environ.get("JARVIS_DB_PATH", "jarvis.db")
+# Country calling code assumed for numbers saved without one
+DEFAULT_COUNTRY_CODE = os.environ.get("JARVIS_COUNTRY_CODE", "91")
+# National significant number length per calling code; a number saved without
+# a country code is only accepted when it has exactly this many digits
+NATIONAL_NUMBER_LENGTHS = {"1": 10, "44": 10, "61": 9, "880": 10, "91": 10, "92": 10, "977": 10}
+
+# Above this size the one-time VACUUM for incremental auto_vacuum waits for
+# an explicit `db_retention.py --vacuum`
+AUTO_VACUUM_MAX_BYTES = 256 * 1024 * 1024
+
+# Compiled statements kept per connection (sqlite3's built-in LRU)
+STATEMENT_CACHE_SIZE = 256
+BUSY_TIMEOUT_MS = 5000
+
+_PRAGMAS = [
+    "PRAGMA synchronous=NORMAL",      # durable at checkpoints; safe with WAL
+    "PRAGMA cache_size=-16000",       # ~16 MB page cache per connection
+    "PRAGMA temp_store=MEMORY",
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+]
+
+# Versioned migrations; PRAGMA user_version records the last one applied.
+# Each entry is (version, description, steps); a step is SQL or a callable(conn).
+_BASE_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS profiles (
+        user_id TEXT PRIMARY KEY,
+        preferred_language TEXT,
+        preferred_browser TEXT,
+        greeting_style TEXT,
+        always_confirm_actions INTEGER,
+        proactive_idle_seconds INTEGER,
+        nicknames_json TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS conversations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        started_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        conversation_id INTEGER NOT NULL,
+        role TEXT,
+        content TEXT,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY(conversation_id) REFERENCES conversations(id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS tool_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT,
+        tool_name TEXT,
+        args_json TEXT,
+        success INTEGER,
+        result_snippet TEXT,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS contacts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT,
+        mobile_no TEXT,
+        email TEXT
+    )
+    """,
+]
+
+# Formerly created by analytics_engine, whatsapp (contacts.db) and web_automation (robot_agent.db)
+_CONSOLIDATED_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS analytics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        metric_type TEXT,
+        value REAL,
+        metadata TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS performance_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        cpu_percent REAL,
+        memory_mb REAL,
+        active_tools INTEGER,
+        response_time_ms REAL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS whatsapp_messages (
+        id INTEGER PRIMARY KEY,
+        contact_name VARCHAR(200),
+        message TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        message_type VARCHAR(50),
+        ai_analysis TEXT,
+        auto_reply_sent BOOLEAN DEFAULT FALSE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS whatsapp_groups (
+        id INTEGER PRIMARY KEY,
+        group_name VARCHAR(200),
+        group_id VARCHAR(255),
+        member_count INTEGER,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS whatsapp_media (
+        id INTEGER PRIMARY KEY,
+        contact_name VARCHAR(200),
+        media_type VARCHAR(50),
+        file_path TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS automation_sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        task_name TEXT,
+        status TEXT,
+        result TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS automation_errors (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        error_type TEXT,
+        message TEXT,
+        stack_trace TEXT
+    )
+    """,
+]
+
+_INDEXES = [
+    # analyze_user_behavior: 7-day window grouped by tool / hour / failures
+    "CREATE INDEX IF NOT EXISTS idx_tool_events_created ON tool_events(created_at, tool_name, success)",
+    "CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages(conversation_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_conversations_user ON conversations(user_id, started_at)",
+    "CREATE INDEX IF NOT EXISTS idx_analytics_type_time ON analytics(metric_type, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_performance_logs_time ON performance_logs(timestamp)",
+    # whatsapp_analytics / whatsapp_security_check time windows
+    "CREATE INDEX IF NOT EXISTS idx_whatsapp_messages_time ON whatsapp_messages(timestamp, contact_name, message_type)",
+    "CREATE INDEX IF NOT EXISTS idx_whatsapp_media_time ON whatsapp_media(timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_automation_sessions_time ON automation_sessions(timestamp)",
+]
+
+
+def _add_contact_name_norm(conn: sqlite3.Connection) -> None:
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(contacts)")}
+    if "name_norm" not in columns:
+        conn.execute("ALTER TABLE contacts ADD COLUMN name_norm TEXT")
+    conn.execute("UPDATE contacts SET name_norm = normalize_name(name)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_contacts_name_norm ON contacts(name_norm)")
+
+
+def _add_contact_e164(conn: sqlite3.Connection) -> None:
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(contacts)")}
+    if "mobile_e164" not in columns:
+        conn.execute("ALTER TABLE contacts ADD COLUMN mobile_e164 TEXT")
+    conn.execute("UPDATE contacts SET mobile_e164 = normalize_phone(mobile_no)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_contacts_e164 ON contacts(mobile_e164)")
+
+
+# Hourly and daily aggregates written by db_retention before raw rows are deleted.
+# period is 'hour' or 'day'; bucket is the period start ('YYYY-MM-DD HH:00' / 'YYYY-MM-DD').
+_ROLLUP_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS tool_event_rollups (
+        period TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        tool_name TEXT NOT NULL,
+        calls INTEGER NOT NULL,
+        failures INTEGER NOT NULL,
+        PRIMARY KEY (period, bucket, tool_name)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS analytics_rollups (
+        period TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        metric_type TEXT NOT NULL,
+        tool TEXT NOT NULL,
+        samples INTEGER NOT NULL,
+        total REAL,
+        min_value REAL,
+        max_value REAL,
+        failures INTEGER NOT NULL,
+        PRIMARY KEY (period, bucket, metric_type, tool)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS performance_rollups (
+        period TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        samples INTEGER NOT NULL,
+        cpu_sum REAL,
+        cpu_max REAL,
+        memory_sum REAL,
+        memory_max REAL,
+        response_time_sum REAL,
+        PRIMARY KEY (period, bucket)
+    ) WITHOUT ROWID
+    """,
+]
+
+
+# Per-tool latency histograms (latency_histogram.LatencyHistogram.to_bytes), all-time
+_LATENCY_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS tool_latency (
+        tool_name TEXT PRIMARY KEY,
+        samples INTEGER NOT NULL,
+        histogram BLOB NOT NULL,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    ) WITHOUT ROWID
+    """,
+]
+
+_EVENT_PAGING_INDEXES = [
+    # db_update's keyset pages: ORDER BY created_at DESC, id DESC from (created_at, id) < (?, ?)
+    "CREATE INDEX IF NOT EXISTS idx_tool_events_created_id ON tool_events(created_at, id)",
+]
+
+
+def _request_incremental_vacuum(conn: sqlite3.Connection) -> None:
+    """Record the mode; an existing file only switches at a full VACUUM (enable_incremental_vacuum)"""
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+
+
+def enable_incremental_vacuum(max_bytes: Optional[int] = AUTO_VACUUM_MAX_BYTES) -> bool:
+    """One-time full VACUUM that switches an existing file to incremental auto_vacuum.
+
+    It rewrites the whole file under the writer lock, so files above
+    `max_bytes` are skipped (pass None to force). Returns True once the mode is on.
+    """
+    init_db()
+    with read() as conn:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return True
+        size = conn.execute("PRAGMA page_count").fetchone()[0] * conn.execute("PRAGMA page_size").fetchone()[0]
+    if max_bytes is not None and size > max_bytes:
+        logger.warning(f"Skipping the one-time VACUUM for incremental auto_vacuum: {DB_PATH} is "
+                       f"{size / 1e6:.0f} MB; run `python db_retention.py --vacuum` when idle")
+        return False
+    logger.info(f"Rebuilding {DB_PATH} ({size / 1e6:.1f} MB) with VACUUM to enable incremental auto_vacuum")
+    start = time.perf_counter()
+    with write() as conn:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+    logger.info(f"VACUUM finished in {time.perf_counter() - start:.1f}s")
+    return True
+
+
+def _legacy_path(filename: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), filename)
+
+
+def _import_legacy_databases(conn: sqlite3.Connection) -> None:
+    """Copy rows from contacts.db and robot_agent.db; safe to re-run after a crash"""
+    copies = {
+        "contacts.db": [
+            ("contacts", """
+                INSERT INTO contacts (name, mobile_no, email, name_norm)
+                SELECT l.name, l.mobile_no, l.email, normalize_name(l.name) FROM legacy.contacts l
+                WHERE NOT EXISTS (SELECT 1 FROM contacts c
+                                  WHERE c.name IS l.name AND c.mobile_no IS l.mobile_no)
+            """),
+            ("whatsapp_messages", "INSERT OR IGNORE INTO whatsapp_messages SELECT * FROM legacy.whatsapp_messages"),
+            ("whatsapp_groups", "INSERT OR IGNORE INTO whatsapp_groups SELECT * FROM legacy.whatsapp_groups"),
+            ("whatsapp_media", "INSERT OR IGNORE INTO whatsapp_media SELECT * FROM legacy.whatsapp_media"),
+        ],
+        "robot_agent.db": [
+            ("sessions", "INSERT OR IGNORE INTO automation_sessions SELECT * FROM legacy.sessions"),
+            ("errors", "INSERT OR IGNORE INTO automation_errors SELECT * FROM legacy.errors"),
+        ],
+    }
+    for filename, statements in copies.items():
+        path = _legacy_path(filename)
+        if not os.path.exists(path) or os.path.abspath(path) == os.path.abspath(DB_PATH):
+            continue
+        conn.execute("ATTACH DATABASE ? AS legacy", (path,))
+        try:
+            tables = {row[0] for row in conn.execute("SELECT name FROM legacy.sqlite_master WHERE type='table'")}
+            copied = 0
+            for table, sql in statements:
+                if table in tables:
+                    copied += conn.execute(sql).rowcount
+            conn.commit()
+            logger.info(f"Imported {copied} row(s) from {filename} into {os.path.basename(DB_PATH)}")
+        finally:
+            conn.execute("DETACH DATABASE legacy")
+
+
+_MIGRATIONS = [
+    (1, "base tables", _BASE_TABLES),
+    (2, "analytics, whatsapp and automation tables", _CONSOLIDATED_TABLES),
+    (3, "secondary indexes and normalized contact names", _INDEXES + [_add_contact_name_norm]),
+    (4, "import contacts.db and robot_agent.db", [_import_legacy_databases]),
+    (5, "E.164 contact numbers", [_add_contact_e164]),
+    (6, "retention rollups and incremental vacuum", _ROLLUP_TABLES + [_request_incremental_vacuum]),
+    (7, "per-tool latency histograms", _LATENCY_TABLES),
+    (8, "tool_events keyset paging index", _EVENT_PAGING_INDEXES),
+]
+SCHEMA_VERSION = _MIGRATIONS[-1][0]
+
+_PROFILE_COLUMNS = (
+    "preferred_language", "preferred_browser", "greeting_style",
+    "always_confirm_actions", "proactive_idle_seconds",
+)
+
+# Single serialized writer; re-entrant so helpers can nest inside write()
+_lock = threading.RLock()
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def normalize_name(name: Optional[str]) -> str:
+    """Case/width/space-insensitive form of a contact name (stored in contacts.name_norm)"""
+    return " ".join(unicodedata.normalize("NFKC", name or "").casefold().split())
+
+
+def normalize_phone(number: Any, country_code: str = DEFAULT_COUNTRY_CODE) -> Optional[str]:
+    """E.164 form of a typed or exported number ("098765-43210" -> "+919876543210"); None if it isn't one"""
+    raw = str(number or "").strip()
+    # isdecimal() also accepts Bangla/Devanagari digits, which exports sometimes use
+    digits = "".join(str(unicodedata.decimal(ch)) for ch in raw if ch.isdecimal())
+    expected = NATIONAL_NUMBER_LENGTHS.get(country_code)
+    if raw.startswith("+"):
+        pass
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    else:
+        national = digits.lstrip("0")   # drop a trunk prefix ("098765...")
+        if expected is None:
+            # Unknown plan: any number short enough to lack a country code gets it
+            if digits.startswith("0") or len(digits) <= 10:
+                digits = country_code + national
+        elif len(national) == expected:
+            digits = country_code + national
+        elif digits.startswith("0") or len(digits) <= expected:
+            # Too short or too long for a local number: a typo or a short code
+            return None
+    if expected is not None and digits.startswith(country_code) and len(digits) != len(country_code) + expected:
+        return None
+    if not 8 <= len(digits) <= 15 or digits.startswith("0"):
+        return None
+    return "+" + digits
+
+
+def _open_connection() -> sqlite3.Connection:
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        cached_statements=STATEMENT_CACHE_SIZE,
+    )
+    conn.row_factory = sqlite3.Row
+    conn.create_function("normalize_name", 1, normalize_name, deterministic=True)
+    conn.create_function("normalize_phone", 1, normalize_phone, deterministic=True)
+    for pragma in _PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def get_connection() -> sqlite3.Connection:
+    """This thread's persistent connection (opened on first use)"""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _open_connection()
+        _local.conn = conn
+    return conn
+
+
+def close_thread_connection() -> None:
+    """Close this thread's pooled connection, e.g. before a worker thread exits"""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        _local.conn = None
+        conn.close()
+
+
+@contextmanager
+def read() -> Iterator[sqlite3.Connection]:
+    """Connection for queries; WAL readers see the last committed state without locking"""
+    yield get_connection()
+
+
+@contextmanager
+def write() -> Iterator[sqlite3.Connection]:
+    """Connection for one write transaction, serialized with every other writer.
+
+    Nested write() blocks join the outermost transaction, which alone commits.
+    """
+    with _lock:
+        conn = get_connection()
+        depth = getattr(_local, "write_depth", 0)
+        _local.write_depth = depth + 1
+        try:
+            yield conn
+            if depth == 0:
+                conn.commit()
+        except BaseException:
+            if depth == 0:
+                conn.rollback()
+            raise
+        finally:
+            _local.write_depth = depth
+
+
+class _PooledConnection:
+    """Legacy handle: behaves like a connection, but close() keeps it pooled"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self) -> None:
+        # Anything the caller didn't commit is discarded, as a real close would
+        if self._conn.in_transaction:
+            self._conn.rollback()
+
+
+def _connect() -> _PooledConnection:
+    return _PooledConnection(get_connection())
+
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for target, description, steps in _MIGRATIONS:
+        if target <= version:
+            continue
+        for step in steps:
+            if callable(step):
+                step(conn)
+            else:
+                conn.execute(step)
+        conn.execute(f"PRAGMA user_version = {int(target)}")
+        conn.commit()
+        logger.info(f"Database migrated to v{target}: {description}")
+
+
+def init_db() -> None:
+    """Switch the file to WAL and apply pending migrations (once per process)"""
+    global _initialized
+    if _initialized:
+        return
+    with _init_lock:
+        if _initialized:
+            return
+        with write() as conn:
+            # Takes effect only on a new, still empty file, and only before the switch to WAL
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+            if str(mode).lower() != "wal":
+                logger.warning(f"SQLite WAL unavailable, journal_mode={mode}")
+            _migrate(conn)
+        _initialized = True
+
+
+# ----------------------------------------------------------------- profiles
+
+def get_profile(user_id: str) -> Dict[str, Any]:
+    init_db()
+    with read() as conn:
+        row = conn.execute("SELECT * FROM profiles WHERE user_id = ?", (user_id,)).fetchone()
+    if row is None:
+        return {}
+    data = dict(row)
+    nicknames = data.pop("nicknames_json", None)
+    try:
+        data["nicknames"] = json.loads(nicknames) if nicknames else {}
+    except json.JSONDecodeError:
+        data["nicknames"] = {}
+    if data.get("always_confirm_actions") is not None:
+        data["always_confirm_actions"] = bool(data["always_confirm_actions"])
+    return data
+
+
+def upsert_profile(user_id: str, data: Dict[str, Any]) -> None:
+    """Insert or update the given profile fields; fields not in `data` are left alone"""
+    init_db()
+    values: Dict[str, Any] = {k: data[k] for k in _PROFILE_COLUMNS if k in data}
+    if "always_confirm_actions" in values and values["always_confirm_actions"] is not None:
+        values["always_confirm_actions"] = int(bool(values["always_confirm_actions"]))
+    if "nicknames" in data:
+        values["nicknames_json"] = json.dumps(data["nicknames"] or {}, ensure_ascii=False)
+    columns = ["user_id"] + list(values)
+    updates = ", ".join(f"{c} = excluded.{c}" for c in values) or "user_id = excluded.user_id"
+    with write() as conn:
+        conn.execute(
+            f"INSERT INTO profiles ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT(user_id) DO UPDATE SET {updates}",
+            [user_id, *values.values()]
+        )
+
+
+# ------------------------------------------------------------ conversations
+
+def start_conversation(user_id: str) -> int:
+    init_db()
+    with write() as conn:
+        cur = conn.execute("INSERT INTO conversations (user_id) VALUES (?)", (user_id,))
+        return cur.lastrowid
+
+
+def add_message(conversation_id: int, role: str, content: str) -> int:
+    init_db()
+    with write() as conn:
+        cur = conn.execute(
+            "INSERT INTO messages (conversation_id, role, content) VALUES (?, ?, ?)",
+            (conversation_id, role, content)
+        )
+        return cur.lastrowid
+
+
+def add_messages(conversation_id: int, messages: Iterable[Tuple[str, str]]) -> int:
+    """Insert (role, content) pairs in one transaction; returns the row count"""
+    rows = [(conversation_id, role, content) for role, content in messages]
+    if not rows:
+        return 0
+    init_db()
+    with write() as conn:
+        conn.executemany(
+            "INSERT INTO messages (conversation_id, role, content) VALUES (?, ?, ?)",
+            rows
+        )
+    return len(rows)
+
+
+# -------------------------------------------------------------- tool events
+
+def log_tool_event(user_id: str, tool_name: str, args: Optional[Dict] = None,
+                   success: bool = True, result_snippet: str = "") -> int:
+    init_db()
+    with write() as conn:
+        cur = conn.execute(
+            "INSERT INTO tool_events (user_id, tool_name, args_json, success, result_snippet) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (user_id, tool_name, json.dumps(args or {}, ensure_ascii=False, default=str),
+             int(bool(success)), result_snippet)
+        )
+        return cur.lastrowid
+
+
+# ----------------------------------------------------------------- contacts
+
+def add_contact(name: str, mobile_no: str, email: Optional[str] = None) -> int:
+    init_db()
+    with write() as conn:
+        cur = conn.execute(
+            "INSERT INTO contacts (name, mobile_no, email, name_norm, mobile_e164) VALUES (?, ?, ?, ?, ?)",
+            (name, mobile_no, email, normalize_name(name), normalize_phone(mobile_no))
+        )
+        return cur.lastrowid
+
+
+def upsert_contact(name: str, mobile_no: str, email: Optional[str] = None) -> int:
+    """Update the contact saved under this number (same E.164 form), or add it"""
+    e164 = normalize_phone(mobile_no)
+    init_db()
+    with write() as conn:
+        row = None
+        if e164:
+            row = conn.execute(
+                "SELECT id FROM contacts WHERE mobile_e164 = ? ORDER BY id LIMIT 1", (e164,)
+            ).fetchone()
+        if row is None:
+            return add_contact(name, mobile_no, email)
+        conn.execute(
+            "UPDATE contacts SET name = ?, name_norm = ?, email = COALESCE(?, email) WHERE id = ?",
+            (name, normalize_name(name), email, row["id"])
+        )
+        return row["id"]
+
+
+def delete_contact(mobile_no: str) -> int:
+    """Delete every contact saved under this number; returns the row count"""
+    e164 = normalize_phone(mobile_no)
+    init_db()
+    with write() as conn:
+        if e164:
+            return conn.execute("DELETE FROM contacts WHERE mobile_e164 = ?", (e164,)).rowcount
+        return conn.execute("DELETE FROM contacts WHERE mobile_no = ?", (mobile_no,)).rowcount
+
+
+def find_contact_by_name(query: str) -> Optional[Tuple[str, str]]:
+    """Best (name, mobile_no) match: exact, then prefix (both indexed), then substring"""
+    query = normalize_name(query)
+    if not query:
+        return None
+    init_db()
+    with read() as conn:
+        row = conn.execute(
+            "SELECT name, mobile_no FROM contacts WHERE name_norm = ? ORDER BY id LIMIT 1",
+            (query,)
+        ).fetchone()
+        if row is None:
+            row = conn.execute(
+                "SELECT name, mobile_no FROM contacts WHERE name_norm >= ? AND name_norm < ? "
+                "ORDER BY name_norm, id LIMIT 1",
+                (query, query + "\U0010ffff")
+            ).fetchone()
+        if row is None:
+            row = conn.execute(
+                "SELECT name, mobile_no FROM contacts WHERE instr(name_norm, ?) > 0 ORDER BY id LIMIT 1",
+                (query,)
+            ).fetchone()
+    return (row["name"], row["mobile_no"]) if row else None
@@ -0,0 +1,135 @@
+"""
+Async facade over the SQLite stores so tools never block the event loop.
+
+    rows = await db_async.read(fetch_stats, "7d")     # query on a reader thread
+    new_id = await db_async.write(add_contact, name, mobile)
+    db_async.submit(log_tool_event, ...)              # fire-and-forget write
+
+Reads run on a small pool of reader threads (WAL lets them proceed while a
+write is in flight). Writes run on one FIFO writer thread, matching db's
+single serialized writer. Each thread keeps its pooled connection, so no
+call opens a connection on the event loop.
+
+Both queues are bounded. Awaited calls wait for a free slot when a queue is
+full. Fire-and-forget writes (event logs, metrics) are dropped and counted
+instead, so a stalled disk can't grow memory without limit.
+"""
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDB:
+    def __init__(self, read_workers: int = 2, max_pending_reads: int = 32,
+                 max_pending_writes: int = 256):
+        self.max_pending_reads = max_pending_reads
+        self.max_pending_writes = max_pending_writes
+        self._read_executor = ThreadPoolExecutor(max_workers=read_workers, thread_name_prefix="db-read")
+        self._write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-write")
+        self._lock = threading.Lock()
+        self._pending_writes = 0
+        self._slots_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._read_slots: Optional[asyncio.Semaphore] = None
+        self._write_slots: Optional[asyncio.Semaphore] = None
+        self.stats = {
+            'reads': 0,
+            'writes': 0,
+            'submitted': 0,
+            'dropped_writes': 0,
+            'failed_writes': 0,
+        }
+
+    def _slots(self):
+        """Queue-bound semaphores for the running loop (recreated if the loop changes)"""
+        loop = asyncio.get_running_loop()
+        if self._slots_loop is not loop:
+            self._slots_loop = loop
+            self._read_slots = asyncio.Semaphore(self.max_pending_reads)
+            self._write_slots = asyncio.Semaphore(self.max_pending_writes)
+        return loop, self._read_slots, self._write_slots
+
+    async def read(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run a query function on a reader thread and return its result"""
+        loop, read_slots, _ = self._slots()
+        async with read_slots:
+            self.stats['reads'] += 1
+            return await loop.run_in_executor(self._read_executor, functools.partial(fn, *args, **kwargs))
+
+    async def write(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run a write function on the writer thread and return its result"""
+        loop, _, write_slots = self._slots()
+        async with write_slots:
+            with self._lock:
+                self._pending_writes += 1
+            try:
+                self.stats['writes'] += 1
+                return await loop.run_in_executor(self._write_executor, functools.partial(fn, *args, **kwargs))
+            finally:
+                with self._lock:
+                    self._pending_writes -= 1
+
+    def submit(self, fn: Callable, *args, **kwargs) -> bool:
+        """Queue a write without waiting for it; returns False if it was dropped"""
+        with self._lock:
+            if self._pending_writes >= self.max_pending_writes:
+                self.stats['dropped_writes'] += 1
+                dropped = self.stats['dropped_writes']
+            else:
+                self._pending_writes += 1
+                self.stats['submitted'] += 1
+                dropped = 0
+        if dropped:
+            if dropped == 1 or dropped % 100 == 0:
+                logger.warning(f"DB write queue full; dropped {dropped} write(s) so far")
+            return False
+        future = self._write_executor.submit(fn, *args, **kwargs)
+        future.add_done_callback(self._submitted_done)
+        return True
+
+    def _submitted_done(self, future: Future) -> None:
+        with self._lock:
+            self._pending_writes -= 1
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            with self._lock:
+                self.stats['failed_writes'] += 1
+            logger.warning(f"Background DB write failed: {error}")
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self.stats, 'pending_writes': self._pending_writes}
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._read_executor.shutdown(wait=wait)
+        self._write_executor.shutdown(wait=wait)
+
+
+_facade: Optional[AsyncDB] = None
+_facade_lock = threading.Lock()
+
+
+def get_async_db() -> AsyncDB:
+    global _facade
+    with _facade_lock:
+        if _facade is None:
+            _facade = AsyncDB()
+        return _facade
+
+
+async def read(fn: Callable, *args, **kwargs) -> Any:
+    return await get_async_db().read(fn, *args, **kwargs)
+
+
+async def write(fn: Callable, *args, **kwargs) -> Any:
+    return await get_async_db().write(fn, *args, **kwargs)
+
+
+def submit(fn: Callable, *args, **kwargs) -> bool:
+    return get_async_db().submit(fn, *args, **kwargs)
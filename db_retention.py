@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Retention for the append-only telemetry tables in jarvis.db
+Usage: python db_retention.py [--raw-days 14] [--hourly-days 90] [--vacuum]
+
+tool_events, analytics and performance_logs gain a row per command or per
+monitoring tick. Rows older than the raw window are rolled into hourly and
+daily aggregates (*_rollups tables, see db's migration 6) and then deleted.
+Hourly rollups are dropped again after a longer window; daily rollups are
+kept. Freed pages are returned with incremental vacuum and the WAL is
+truncated, so the file stops growing with uptime.
+
+Incremental vacuum needs a one-time full VACUUM on files created before
+migration 6. The background job does it for files up to
+db.AUTO_VACUUM_MAX_BYTES; `--vacuum` forces it for larger ones.
+
+Work goes one UTC day at a time, each day in its own write transaction, so
+other writers only ever wait for one slice. Rollups merge into existing
+buckets, so rows that show up late only add to the totals.
+
+`start_retention_jobs()` runs the job hourly in the background.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from db import AUTO_VACUUM_MAX_BYTES, enable_incremental_vacuum, init_db, read, write
+
+logger = logging.getLogger(__name__)
+
+RAW_RETENTION_DAYS = int(os.environ.get("JARVIS_RAW_RETENTION_DAYS", "14"))
+HOURLY_RETENTION_DAYS = int(os.environ.get("JARVIS_HOURLY_RETENTION_DAYS", "90"))
+RETENTION_INTERVAL_S = 3600
+VACUUM_PAGES_PER_STEP = 2000
+
+_PERIODS = (("hour", "%Y-%m-%d %H:00"), ("day", "%Y-%m-%d"))
+
+
+@dataclass(frozen=True)
+class RollupSpec:
+    source: str
+    time_column: str
+    target: str
+    keys: Tuple[Tuple[str, str], ...]             # (rollup column, expression over source)
+    measures: Tuple[Tuple[str, str, str], ...]    # (rollup column, aggregate, merge: sum|min|max)
+
+
+ROLLUPS = (
+    RollupSpec(
+        source="tool_events", time_column="created_at", target="tool_event_rollups",
+        keys=(("tool_name", "COALESCE(tool_name, '')"),),
+        measures=(
+            ("calls", "COUNT(*)", "sum"),
+            ("failures", "SUM(success = 0)", "sum"),
+        ),
+    ),
+    RollupSpec(
+        source="analytics", time_column="timestamp", target="analytics_rollups",
+        keys=(
+            ("metric_type", "COALESCE(metric_type, '')"),
+            ("tool", "COALESCE(json_extract(metadata, '$.tool'), '')"),
+        ),
+        measures=(
+            ("samples", "COUNT(*)", "sum"),
+            ("total", "SUM(value)", "sum"),
+            ("min_value", "MIN(value)", "min"),
+            ("max_value", "MAX(value)", "max"),
+            ("failures", "COALESCE(SUM(json_extract(metadata, '$.success') = 0), 0)", "sum"),
+        ),
+    ),
+    RollupSpec(
+        source="performance_logs", time_column="timestamp", target="performance_rollups",
+        keys=(),
+        measures=(
+            ("samples", "COUNT(*)", "sum"),
+            ("cpu_sum", "SUM(cpu_percent)", "sum"),
+            ("cpu_max", "MAX(cpu_percent)", "max"),
+            ("memory_sum", "SUM(memory_mb)", "sum"),
+            ("memory_max", "MAX(memory_mb)", "max"),
+            ("response_time_sum", "SUM(response_time_ms)", "sum"),
+        ),
+    ),
+)
+
+_MERGE = {
+    "sum": "COALESCE({c}, 0) + COALESCE(excluded.{c}, 0)",
+    "min": "COALESCE(min({c}, excluded.{c}), {c}, excluded.{c})",
+    "max": "COALESCE(max({c}, excluded.{c}), {c}, excluded.{c})",
+}
+
+
+def _rollup_sql(spec: RollupSpec, bucket_format: str) -> str:
+    key_cols = [col for col, _ in spec.keys]
+    key_exprs = [expr for _, expr in spec.keys]
+    columns = ["period", "bucket", *key_cols, *(col for col, _, _ in spec.measures)]
+    merges = ", ".join(f"{col} = {_MERGE[how].format(c=col)}" for col, _, how in spec.measures)
+    group_by = ", ".join(str(i) for i in range(2, 3 + len(key_cols)))
+    return (
+        f"INSERT INTO {spec.target} ({', '.join(columns)}) "
+        f"SELECT ?, strftime('{bucket_format}', {spec.time_column}), "
+        f"{', '.join([*key_exprs, *(agg for _, agg, _ in spec.measures)])} "
+        f"FROM {spec.source} WHERE {spec.time_column} >= ? AND {spec.time_column} < ? "
+        f"GROUP BY {group_by} "
+        f"ON CONFLICT(period, bucket{''.join(', ' + c for c in key_cols)}) DO UPDATE SET {merges}"
+    )
+
+
+def _cutoff(days: int) -> str:
+    """Start of the UTC hour `days` ago, in the tables' CURRENT_TIMESTAMP format"""
+    with read() as conn:
+        return conn.execute(
+            "SELECT strftime('%Y-%m-%d %H:00:00', 'now', ?)", (f"-{int(days)} days",)
+        ).fetchone()[0]
+
+
+def roll_up(spec: RollupSpec, cutoff: str) -> Dict[str, int]:
+    """Aggregate and delete `spec.source` rows older than `cutoff`, one day per transaction"""
+    statements = [(period, _rollup_sql(spec, fmt)) for period, fmt in _PERIODS]
+    stats = {"rows_deleted": 0, "days": 0}
+    while True:
+        with read() as conn:
+            oldest = conn.execute(
+                f"SELECT MIN({spec.time_column}) FROM {spec.source} WHERE {spec.time_column} < ?",
+                (cutoff,)
+            ).fetchone()[0]
+        if oldest is None:
+            return stats
+        with write() as conn:
+            next_day = conn.execute("SELECT date(?, '+1 day')", (oldest,)).fetchone()[0]
+            if next_day is None:
+                # Unparseable timestamp: no bucket to roll it into
+                deleted = conn.execute(
+                    f"DELETE FROM {spec.source} WHERE {spec.time_column} = ?", (oldest,)
+                ).rowcount
+            else:
+                end = min(next_day + " 00:00:00", cutoff)
+                for period, sql in statements:
+                    conn.execute(sql, (period, oldest, end))
+                deleted = conn.execute(
+                    f"DELETE FROM {spec.source} WHERE {spec.time_column} < ?", (end,)
+                ).rowcount
+        stats["rows_deleted"] += deleted
+        stats["days"] += 1
+
+
+def prune_hourly(cutoff: str) -> int:
+    """Drop hourly rollups older than `cutoff`; the daily rollups cover that range"""
+    deleted = 0
+    with write() as conn:
+        for spec in ROLLUPS:
+            deleted += conn.execute(
+                f"DELETE FROM {spec.target} WHERE period = 'hour' AND bucket < ?", (cutoff[:13] + ":00",)
+            ).rowcount
+    return deleted
+
+
+def reclaim_space(max_steps: Optional[int] = None) -> int:
+    """Return free pages to the filesystem in short steps; returns pages freed"""
+    freed = 0
+    steps = 0
+    while max_steps is None or steps < max_steps:
+        with read() as conn:
+            free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if not free:
+            break
+        with write() as conn:
+            # executescript steps the pragma to completion; execute() frees one page
+            conn.executescript(f"PRAGMA incremental_vacuum({VACUUM_PAGES_PER_STEP});")
+            left = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if left >= free:
+            break
+        freed += free - left
+        steps += 1
+    with write() as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        conn.execute("PRAGMA optimize")
+    return freed
+
+
+def run_retention(raw_days: int = RAW_RETENTION_DAYS,
+                  hourly_days: int = HOURLY_RETENTION_DAYS,
+                  force_vacuum: bool = False) -> Dict[str, Any]:
+    """One full pass: roll up and delete old raw rows, prune hourly rollups, vacuum"""
+    init_db()
+    start = time.perf_counter()
+    raw_cutoff = _cutoff(raw_days)
+    report: Dict[str, Any] = {"raw_cutoff": raw_cutoff, "tables": {}}
+    for spec in ROLLUPS:
+        report["tables"][spec.source] = roll_up(spec, raw_cutoff)
+    report["hourly_rollups_pruned"] = prune_hourly(_cutoff(hourly_days))
+    report["incremental_vacuum"] = enable_incremental_vacuum(None if force_vacuum else AUTO_VACUUM_MAX_BYTES)
+    report["pages_freed"] = reclaim_space()
+    report["seconds"] = round(time.perf_counter() - start, 3)
+    deleted = sum(t["rows_deleted"] for t in report["tables"].values())
+    if deleted or report["pages_freed"]:
+        logger.info(f"Retention: rolled up {deleted} raw row(s), freed {report['pages_freed']} page(s) "
+                    f"in {report['seconds']}s")
+    return report
+
+
+async def start_retention_jobs(interval_s: float = RETENTION_INTERVAL_S):
+    """Background task: run retention now and then every `interval_s` seconds"""
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            # Own thread: each day slice takes the writer lock briefly, so the
+            # DB writer thread keeps serving tool and metric writes in between
+            await loop.run_in_executor(None, run_retention)
+        except Exception as e:
+            logger.error(f"Retention job error: {e}")
+        await asyncio.sleep(interval_s)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Roll up and prune old telemetry in jarvis.db")
+    parser.add_argument("--raw-days", type=int, default=RAW_RETENTION_DAYS,
+                        help="keep raw rows this many days")
+    parser.add_argument("--hourly-days", type=int, default=HOURLY_RETENTION_DAYS,
+                        help="keep hourly rollups this many days (daily rollups are kept)")
+    parser.add_argument("--vacuum", action="store_true",
+                        help="run the one-time full VACUUM for incremental auto_vacuum whatever the file size")
+    args = parser.parse_args()
+    print(json.dumps(run_retention(args.raw_days, args.hourly_days, args.vacuum), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,48 @@
 #!/usr/bin/env python3
 """
 Quick database update script
-Usage: python db_update.py
+Usage: python db_update.py                      (interactive menu)
+       python db_update.py apply changes.json   (bulk profile/contact changes)
+       python db_update.py events --tool whatsapp_message --failed --limit 20
+       python db_update.py export tool_events --since 2026-01-01 > events.jsonl
+
+Batch mode is non-interactive. `apply` validates every change first, then
+applies them all in one transaction (all or nothing). Changes are JSON (a
+list of objects, or {"profiles": [...], "contacts": [...]}) or CSV with a
+`kind` column. Each change is a profile update (user_id plus fields) or a
+contact upsert/delete keyed by phone number:
+
+    {"kind": "profile", "user_id": "Protik_22", "preferred_browser": "firefox"}
+    {"kind": "contact", "name": "Rahul", "mobile_no": "98300 12345"}
+    {"kind": "contact", "op": "delete", "mobile_no": "+919830012345"}
+
+`events` pages through tool_events newest first. It uses keyset pagination on
+(created_at, id), read in order from the (created_at, id) index (migration 8)
+with no sort step; pass the printed --before cursor to get the next page. `export` streams a table,
+filtered tool_events or a read-only --sql query as JSONL.
 """
-from db import *
+import argparse
+import csv
+import json
+import sqlite3
+import sys
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
+
+from db import (
+    init_db, get_profile, upsert_profile, add_contact, upsert_contact, delete_contact,
+    read, write,
+)
+
+PROFILE_FIELDS = {
+    'preferred_language': str,
+    'preferred_browser': str,
+    'greeting_style': str,
+    'always_confirm_actions': bool,
+    'proactive_idle_seconds': int,
+    'nicknames': dict,
+}
+CONTACT_OPS = ('upsert', 'delete')
+EXPORT_PAGE_SIZE = 500
 
 def quick_update():
     """Interactive database update"""
@@ -59,18 +98,10 @@ def quick_update():
         
         elif choice == '3':
             print("\nRecent Tool Events:")
-            init_db()
-            with _lock:
-                conn = _connect()
-                try:
-                    cur = conn.cursor()
-                    cur.execute("SELECT * FROM tool_events ORDER BY created_at DESC LIMIT 5")
-                    rows = cur.fetchall()
-                    for row in rows:
-                        status = "✓" if row['success'] else "✗"
-                        print(f"  {status} {row['tool_name']} - {row['created_at']}")
-                finally:
-                    conn.close()
+            rows, _ = fetch_events_page(limit=5)
+            for row in rows:
+                status = "✓" if row['success'] else "✗"
+                print(f"  {status} {row['tool_name']} - {row['created_at']}")
         
         elif choice == '4':
             print("Goodbye!")
@@ -79,5 +110,279 @@ def quick_update():
         else:
             print("Invalid choice!")
 
+# ------------------------------------------------------------ bulk changes
+
+def _coerce(field: str, value: Any) -> Any:
+    kind = PROFILE_FIELDS[field]
+    if kind is bool and isinstance(value, str):
+        if value.strip().lower() in ('1', 'true', 'yes', 'y', 'on'):
+            return True
+        if value.strip().lower() in ('0', 'false', 'no', 'n', 'off'):
+            return False
+        raise ValueError(f"{field}: expected true/false, got {value!r}")
+    if kind is dict and isinstance(value, str):
+        value = json.loads(value)
+    if kind is int:
+        try:
+            return int(value)
+        except ValueError:
+            raise ValueError(f"{field}: expected a whole number, got {value!r}") from None
+    if not isinstance(value, kind):
+        raise ValueError(f"{field}: expected {kind.__name__}, got {value!r}")
+    return value
+
+
+def load_changes(path: str, fmt: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Change records from a JSON or CSV file (empty CSV cells are dropped)"""
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'json')
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        if fmt == 'csv':
+            return [{k: v for k, v in row.items() if k and v not in (None, '')}
+                    for row in csv.DictReader(f)]
+        data = json.load(f)
+    if isinstance(data, dict):
+        return ([{'kind': 'profile', **p} for p in data.get('profiles', [])]
+                + [{'kind': 'contact', **c} for c in data.get('contacts', [])])
+    return list(data)
+
+
+def validate_changes(records: List[Dict[str, Any]]) -> Tuple[List[Tuple[str, Dict[str, Any]]], List[str]]:
+    """Normalized (action, args) pairs, and one message per invalid record"""
+    actions: List[Tuple[str, Dict[str, Any]]] = []
+    errors: List[str] = []
+    for i, record in enumerate(records, 1):
+        try:
+            kind = str(record.get('kind', '')).strip().lower()
+            if kind == 'profile':
+                user_id = str(record.get('user_id', '')).strip()
+                if not user_id:
+                    raise ValueError("user_id is required")
+                unknown = set(record) - set(PROFILE_FIELDS) - {'kind', 'user_id'}
+                if unknown:
+                    raise ValueError(f"unknown profile field(s): {', '.join(sorted(unknown))}")
+                fields = {k: _coerce(k, v) for k, v in record.items() if k in PROFILE_FIELDS}
+                if not fields:
+                    raise ValueError("no profile fields to update")
+                actions.append(('profile', {'user_id': user_id, 'data': fields}))
+            elif kind == 'contact':
+                op = str(record.get('op', 'upsert')).strip().lower()
+                if op not in CONTACT_OPS:
+                    raise ValueError(f"op must be one of {', '.join(CONTACT_OPS)}")
+                mobile = str(record.get('mobile_no', '')).strip()
+                name = str(record.get('name', '')).strip()
+                if not mobile or (op == 'upsert' and not name):
+                    raise ValueError("name and mobile_no are required" if op == 'upsert'
+                                     else "mobile_no is required")
+                args = {'mobile_no': mobile}
+                if op == 'upsert':
+                    args.update(name=name, email=(str(record['email']).strip() or None) if record.get('email') else None)
+                actions.append((f'contact_{op}', args))
+            else:
+                raise ValueError("kind must be 'profile' or 'contact'")
+        except (ValueError, TypeError) as e:
+            errors.append(f"#{i}: {e}")
+    return actions, errors
+
+
+def apply_changes(actions: List[Tuple[str, Dict[str, Any]]]) -> Dict[str, int]:
+    """Apply validated changes in one transaction; any failure rolls back all of them"""
+    counts = {'profiles_updated': 0, 'contacts_upserted': 0, 'contacts_deleted': 0}
+    init_db()
+    with write():
+        for action, args in actions:
+            if action == 'profile':
+                upsert_profile(args['user_id'], args['data'])
+                counts['profiles_updated'] += 1
+            elif action == 'contact_upsert':
+                upsert_contact(args['name'], args['mobile_no'], args['email'])
+                counts['contacts_upserted'] += 1
+            else:
+                counts['contacts_deleted'] += delete_contact(args['mobile_no'])
+    if counts['contacts_upserted'] or counts['contacts_deleted']:
+        from contact_index import get_contact_index
+        get_contact_index().invalidate()
+    return counts
+
+
+# ------------------------------------------------------------- tool events
+
+def _event_filters(tool: Optional[str] = None, success: Optional[bool] = None,
+                   since: Optional[str] = None, until: Optional[str] = None) -> Tuple[List[str], List[Any]]:
+    where: List[str] = []
+    params: List[Any] = []
+    if since:
+        where.append("created_at >= ?")
+        params.append(since)
+    if until:
+        where.append("created_at < ?")
+        params.append(until)
+    if tool:
+        where.append("tool_name = ?")
+        params.append(tool)
+    if success is not None:
+        where.append("success = ?")
+        params.append(int(success))
+    return where, params
+
+
+def _parse_cursor(cursor: str) -> Tuple[str, int]:
+    created_at, _, row_id = cursor.rpartition('|')
+    if not created_at or not row_id.isdigit():
+        raise ValueError(f"bad cursor {cursor!r}; expected '<created_at>|<id>'")
+    return created_at, int(row_id)
+
+
+def fetch_events_page(limit: int = 50, before: Optional[str] = None,
+                      **filters) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """One page of tool_events, newest first, and the cursor for the next page (None at the end)"""
+    where, params = _event_filters(**filters)
+    if before:
+        where.append("(created_at, id) < (?, ?)")
+        params.extend(_parse_cursor(before))
+    sql = "SELECT * FROM tool_events"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY created_at DESC, id DESC LIMIT ?"
+    init_db()
+    with read() as conn:
+        rows = [dict(r) for r in conn.execute(sql, [*params, limit])]
+    cursor = f"{rows[-1]['created_at']}|{rows[-1]['id']}" if len(rows) == limit else None
+    return rows, cursor
+
+
+def iter_events(page_size: int = EXPORT_PAGE_SIZE, **filters) -> Iterator[Dict[str, Any]]:
+    """Every matching tool event, newest first, fetched one keyset page at a time"""
+    cursor = None
+    while True:
+        rows, cursor = fetch_events_page(limit=page_size, before=cursor, **filters)
+        yield from rows
+        if cursor is None:
+            return
+
+
+def iter_query(sql: str, params: Tuple = ()) -> Iterator[Dict[str, Any]]:
+    """Rows of a read-only query (writes are refused by query_only), streamed"""
+    init_db()
+    with read() as conn:
+        conn.execute("PRAGMA query_only = ON")
+        try:
+            cur = conn.execute(sql, params)
+            while True:
+                rows = cur.fetchmany(EXPORT_PAGE_SIZE)
+                if not rows:
+                    return
+                for row in rows:
+                    yield dict(row)
+        finally:
+            conn.execute("PRAGMA query_only = OFF")
+
+
+def iter_table(table: str) -> Iterator[Dict[str, Any]]:
+    init_db()
+    with read() as conn:
+        known = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if table not in known:
+        raise ValueError(f"unknown table {table!r}")
+    return iter_query(f'SELECT * FROM "{table}"')
+
+
+def write_jsonl(rows: Iterator[Dict[str, Any]], out: TextIO) -> int:
+    count = 0
+    for row in rows:
+        out.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+        count += 1
+    return count
+
+
+# -------------------------------------------------------------------- CLI
+
+def _add_event_filters(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--tool", help="only this tool_name")
+    status = parser.add_mutually_exclusive_group()
+    status.add_argument("--failed", dest="success", action="store_false", default=None)
+    status.add_argument("--succeeded", dest="success", action="store_true", default=None)
+    parser.add_argument("--since", help="created_at >= this (e.g. '2026-01-01' or '2026-01-01 10:00:00')")
+    parser.add_argument("--until", help="created_at < this")
+
+
+def _filters(args: argparse.Namespace) -> Dict[str, Any]:
+    return {'tool': args.tool, 'success': args.success, 'since': args.since, 'until': args.until}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Jarvis database maintenance")
+    sub = parser.add_subparsers(dest="command")
+
+    apply_p = sub.add_parser("apply", help="apply bulk profile/contact changes in one transaction")
+    apply_p.add_argument("path", help="changes file (.json or .csv)")
+    apply_p.add_argument("--format", choices=("json", "csv"), help="override detection by extension")
+    apply_p.add_argument("--dry-run", action="store_true", help="validate only")
+
+    events_p = sub.add_parser("events", help="page through tool_events, newest first")
+    _add_event_filters(events_p)
+    events_p.add_argument("--limit", type=int, default=50)
+    events_p.add_argument("--before", help="cursor printed by the previous page")
+    events_p.add_argument("--jsonl", action="store_true", help="print rows as JSONL")
+
+    export_p = sub.add_parser("export", help="stream rows as JSONL")
+    export_p.add_argument("table", nargs="?", default="tool_events",
+                          help="table to export (tool_events honours the filters)")
+    export_p.add_argument("--sql", help="read-only query to export instead of a table")
+    export_p.add_argument("--output", help="write to this file instead of stdout")
+    _add_event_filters(export_p)
+
+    args = parser.parse_args(argv)
+    if args.command is None:
+        quick_update()
+        return 0
+    try:
+        return _run(args)
+    except (ValueError, OSError, sqlite3.Error) as e:
+        print(f"✗ {e}", file=sys.stderr)
+        return 1
+
+
+def _run(args: argparse.Namespace) -> int:
+    if args.command == "apply":
+        actions, errors = validate_changes(load_changes(args.path, args.format))
+        for error in errors:
+            print(f"✗ {error}", file=sys.stderr)
+        if errors:
+            print(f"No changes applied ({len(errors)} invalid record(s)).", file=sys.stderr)
+            return 1
+        if args.dry_run:
+            print(f"✓ {len(actions)} change(s) valid (dry run, nothing applied)")
+            return 0
+        counts = apply_changes(actions)
+        print("✓ " + ", ".join(f"{k}: {v}" for k, v in counts.items()))
+        return 0
+
+    if args.command == "events":
+        rows, cursor = fetch_events_page(limit=args.limit, before=args.before, **_filters(args))
+        if args.jsonl:
+            write_jsonl(iter(rows), sys.stdout)
+        else:
+            for row in rows:
+                status = "✓" if row['success'] else "✗"
+                print(f"  {status} {row['tool_name']} - {row['created_at']} (#{row['id']})")
+        if cursor:
+            print(f"next page: --before '{cursor}'", file=sys.stderr)
+        return 0
+
+    if args.sql:
+        rows = iter_query(args.sql)
+    elif args.table == "tool_events":
+        rows = iter_events(**_filters(args))
+    else:
+        rows = iter_table(args.table)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as out:
+            count = write_jsonl(rows, out)
+    else:
+        count = write_jsonl(rows, sys.stdout)
+    print(f"✓ exported {count} row(s)", file=sys.stderr)
+    return 0
+
+
 if __name__ == '__main__':
-    quick_update()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -13,8 +13,11 @@ logger = logging.getLogger(__name__)
 
 def _log_event(tool_name: str, args: dict, success: bool, result: str):
     try:
+        import db_async
         from db import log_tool_event
-        log_tool_event(user_id="Protik_22", tool_name=tool_name, args=args, success=success, result_snippet=(result or "")[:200])
+        # Logged on the DB writer thread; the tool returns without waiting for SQLite
+        db_async.submit(log_tool_event, user_id="Protik_22", tool_name=tool_name, args=args,
+                        success=success, result_snippet=(result or "")[:200])
     except Exception:
         pass
 
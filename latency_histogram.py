@@ -0,0 +1,117 @@
+"""
+Streaming latency histogram with log-spaced buckets (HDR-histogram style).
+
+    hist = LatencyHistogram()
+    hist.record(412.0)                       # milliseconds
+    hist.quantile(0.95), hist.quantiles()    # p50/p95/p99
+    blob = hist.to_bytes()                   # compact, for SQLite
+    hist = LatencyHistogram.from_bytes(blob)
+
+Each bucket is 2% wider than the one below it, so every quantile is within
+about 1% of the true value from 0.1 ms up to hours. Only non-empty buckets
+are stored. A tool's whole history is a few hundred buckets at most, about
+8 bytes each when serialized. Histograms merge by adding counts, so
+persisted history and the current session combine exactly.
+"""
+import math
+import struct
+import sys
+from array import array
+from typing import Dict, Optional
+
+MIN_MS = 0.1
+GROWTH = 1.02
+_LOG_GROWTH = math.log(GROWTH)
+_FORMAT_VERSION = 1
+_HEADER = struct.Struct("<BQdddI")   # version, count, sum, min, max, bucket count
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.sum_ms = 0.0
+        self.min_ms = math.inf
+        self.max_ms = 0.0
+
+    @staticmethod
+    def _index(ms: float) -> int:
+        if ms <= MIN_MS:
+            return 0
+        return math.ceil(math.log(ms / MIN_MS) / _LOG_GROWTH)
+
+    @staticmethod
+    def _value(index: int) -> float:
+        """Representative (geometric middle) value of a bucket"""
+        return MIN_MS * GROWTH ** (index - 0.5) if index else MIN_MS
+
+    def record(self, ms: float) -> None:
+        ms = max(0.0, float(ms))
+        index = self._index(ms)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.sum_ms += ms
+        if ms < self.min_ms:
+            self.min_ms = ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        for index, n in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + n
+        self.count += other.count
+        self.sum_ms += other.sum_ms
+        self.min_ms = min(self.min_ms, other.min_ms)
+        self.max_ms = max(self.max_ms, other.max_ms)
+
+    def mean(self) -> float:
+        return self.sum_ms / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """Value at quantile q (0..1) in ms, within one bucket of the exact answer"""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(max(self._value(index), self.min_ms), self.max_ms)
+        return self.max_ms
+
+    def quantiles(self) -> Dict[str, float]:
+        return {
+            "p50": round(self.quantile(0.50), 1),
+            "p95": round(self.quantile(0.95), 1),
+            "p99": round(self.quantile(0.99), 1),
+        }
+
+    def to_bytes(self) -> bytes:
+        indexes = array("I", sorted(self.buckets))
+        counts = array("I", (self.buckets[i] for i in indexes))
+        if sys.byteorder == "big":
+            indexes.byteswap()
+            counts.byteswap()
+        min_ms = self.min_ms if self.count else 0.0
+        header = _HEADER.pack(_FORMAT_VERSION, self.count, self.sum_ms, min_ms, self.max_ms, len(indexes))
+        return header + indexes.tobytes() + counts.tobytes()
+
+    @classmethod
+    def from_bytes(cls, blob: Optional[bytes]) -> "LatencyHistogram":
+        hist = cls()
+        if not blob:
+            return hist
+        version, count, sum_ms, min_ms, max_ms, n = _HEADER.unpack_from(blob)
+        if version != _FORMAT_VERSION:
+            raise ValueError(f"unsupported histogram format v{version}")
+        indexes, counts = array("I"), array("I")
+        offset = _HEADER.size
+        indexes.frombytes(blob[offset:offset + 4 * n])
+        counts.frombytes(blob[offset + 4 * n:offset + 8 * n])
+        if sys.byteorder == "big":
+            indexes.byteswap()
+            counts.byteswap()
+        hist.buckets = dict(zip(indexes, counts))
+        hist.count, hist.sum_ms, hist.max_ms = count, sum_ms, max_ms
+        hist.min_ms = min_ms if count else math.inf
+        return hist
@@ -0,0 +1,240 @@
+"""
+Cold tier for the conversation journal: zstd-compressed, month-partitioned
+segments plus a small manifest.
+
+    archive/manifest.json
+    archive/2025-08-0001.jsonl.zst
+    archive/2025-09-0002.jsonl.zst
+
+Each manifest entry records the compacted journal seq it was written with.
+An entry only counts once the journal's compacted file has reached that seq,
+so a crash between writing the archive and swapping the compacted file can't
+make conversations show up twice.
+
+Every compaction adds one part per month it touches. Once a month has
+`MAX_PARTS_PER_MONTH` consecutive live parts, `consolidate()` merges them
+into a single part, so the segment count stays bounded by the number of
+months rather than growing with uptime.
+"""
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+MAX_PARTS_PER_MONTH = 4
+
+
+def conversation_time(conversation: Dict) -> Optional[datetime]:
+    """Best-effort timestamp of a conversation wrapper (epoch float or ISO string)"""
+    ts = conversation.get("timestamp")
+    try:
+        if isinstance(ts, (int, float)):
+            return datetime.fromtimestamp(ts)
+        if isinstance(ts, str) and ts:
+            return datetime.fromisoformat(ts)
+    except (ValueError, OverflowError, OSError):
+        pass
+    return None
+
+
+class ColdArchive:
+    def __init__(self, archive_dir: str, level: int = 10):
+        if zstandard is None:
+            raise ImportError("zstandard is required for the conversation archive")
+        self.archive_dir = archive_dir
+        self.level = level
+        self._lock = threading.RLock()
+        os.makedirs(archive_dir, exist_ok=True)
+        self._manifest = self._load_manifest()
+
+    # --------------------------------------------------------------- manifest
+
+    @property
+    def manifest_file(self) -> str:
+        return os.path.join(self.archive_dir, MANIFEST_NAME)
+
+    def _load_manifest(self) -> Dict:
+        if os.path.exists(self.manifest_file):
+            try:
+                with open(self.manifest_file, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except (json.JSONDecodeError, OSError) as e:
+                logger.error(f"Could not read archive manifest: {e}")
+        return {"segments": [], "next_part": 1, "reset_at": None}
+
+    def _save_manifest(self) -> None:
+        tmp_path = self.manifest_file + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_file)
+
+    def live_segments(self, compacted_seq: int) -> List[Dict]:
+        """Manifest entries that are visible for the given compacted journal seq"""
+        with self._lock:
+            reset_at = self._manifest.get("reset_at")
+            live = []
+            for entry in self._manifest["segments"]:
+                if entry["compacted_seq"] > compacted_seq:
+                    continue  # written by a compaction that never completed
+                if reset_at is not None and compacted_seq >= reset_at and entry["compacted_seq"] < reset_at:
+                    continue  # superseded by a full journal rewrite
+                live.append(entry)
+            return live
+
+    # ----------------------------------------------------------------- writes
+
+    def write(self, conversations: List[Dict], compacted_seq: int) -> int:
+        """Append conversations as new month-partitioned segments; returns bytes written"""
+        if not conversations:
+            return 0
+        # Split into consecutive runs per month so replay order is preserved
+        runs: List[List[Dict]] = []
+        months: List[str] = []
+        for conversation in conversations:
+            when = conversation_time(conversation)
+            month = when.strftime("%Y-%m") if when else "undated"
+            if not months or months[-1] != month:
+                months.append(month)
+                runs.append([])
+            runs[-1].append(conversation)
+
+        written = 0
+        with self._lock:
+            for month, run in zip(months, runs):
+                entry = self._write_segment(month, run, compacted_seq)
+                written += entry["bytes"]
+                self._manifest["segments"].append(entry)
+            self._save_manifest()
+        logger.info(f"Archived {len(conversations)} conversations into {len(runs)} cold segment(s)")
+        return written
+
+    def _write_segment(self, month: str, run: List[Dict], compacted_seq: int) -> Dict:
+        """Write one compressed part file; returns its manifest entry (not yet saved)"""
+        part = self._manifest["next_part"]
+        self._manifest["next_part"] = part + 1
+        name = f"{month}-{part:04d}.jsonl.zst"
+        payload = "".join(
+            json.dumps(c, ensure_ascii=False, separators=(",", ":")) + "\n" for c in run
+        ).encode("utf-8")
+        data = zstandard.ZstdCompressor(level=self.level).compress(payload)
+        path = os.path.join(self.archive_dir, name)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        return {
+            "file": name,
+            "month": month,
+            "count": len(run),
+            "first_ts": run[0].get("timestamp"),
+            "last_ts": run[-1].get("timestamp"),
+            "raw_bytes": len(payload),
+            "bytes": len(data),
+            "compacted_seq": compacted_seq,
+        }
+
+    def consolidate(self, compacted_seq: int, max_parts: int = MAX_PARTS_PER_MONTH) -> int:
+        """
+        Merge each run of `max_parts` or more adjacent, committed parts of one
+        month into a single part; returns the number of parts merged away.
+        Pass the journal's live compacted seq. Merging only adjacent entries
+        keeps replay order. The merged part is saved before the old files are
+        removed, so a crash leaves at worst an unreferenced file.
+        """
+        with self._lock:
+            if self._manifest.get("reset_at") is not None:
+                return 0
+            runs: List[List[Dict]] = []
+            for entry in self._manifest["segments"]:
+                committed = entry["compacted_seq"] <= compacted_seq
+                last = runs[-1] if runs else None
+                if (committed and last and last[0]["compacted_seq"] <= compacted_seq
+                        and last[0]["month"] == entry["month"]):
+                    last.append(entry)
+                else:
+                    runs.append([entry])
+
+            segments: List[Dict] = []
+            removed: List[Dict] = []
+            for run in runs:
+                if len(run) < max(2, max_parts) or run[0]["compacted_seq"] > compacted_seq:
+                    segments.extend(run)
+                    continue
+                conversations = [c for entry in run for c in self.read_segment(entry)]
+                segments.append(self._write_segment(
+                    run[0]["month"], conversations, max(e["compacted_seq"] for e in run)))
+                removed.extend(run)
+            if not removed:
+                return 0
+            self._manifest["segments"] = segments
+            self._save_manifest()
+            for entry in removed:
+                try:
+                    os.remove(os.path.join(self.archive_dir, entry["file"]))
+                except OSError:
+                    pass
+        logger.info(f"Consolidated {len(removed)} cold segment(s)")
+        return len(removed)
+
+    def begin_reset(self, compacted_seq: int) -> None:
+        """Mark every current segment as superseded once `compacted_seq` is live"""
+        with self._lock:
+            self._manifest["reset_at"] = compacted_seq
+            self._save_manifest()
+
+    def finish_reset(self) -> None:
+        """Drop segments superseded by a completed reset"""
+        with self._lock:
+            reset_at = self._manifest.get("reset_at")
+            if reset_at is None:
+                return
+            keep = []
+            for entry in self._manifest["segments"]:
+                if entry["compacted_seq"] < reset_at:
+                    try:
+                        os.remove(os.path.join(self.archive_dir, entry["file"]))
+                    except OSError:
+                        pass
+                else:
+                    keep.append(entry)
+            self._manifest["segments"] = keep
+            self._manifest["reset_at"] = None
+            self._save_manifest()
+
+    # ------------------------------------------------------------------ reads
+
+    def read_segment(self, entry: Dict) -> List[Dict]:
+        path = os.path.join(self.archive_dir, entry["file"])
+        with open(path, "rb") as f:
+            payload = zstandard.ZstdDecompressor().decompress(f.read(), max_output_size=entry.get("raw_bytes") or 0)
+        return [json.loads(line) for line in payload.decode("utf-8").splitlines() if line.strip()]
+
+    def iter_conversations(self, compacted_seq: int) -> Iterator[Dict]:
+        for entry in self.live_segments(compacted_seq):
+            yield from self.read_segment(entry)
+
+    def iter_reverse(self, compacted_seq: int) -> Iterator[Dict]:
+        for entry in reversed(self.live_segments(compacted_seq)):
+            yield from reversed(self.read_segment(entry))
+
+    def stats(self, compacted_seq: int) -> Dict[str, int]:
+        live = self.live_segments(compacted_seq)
+        return {
+            "segments": len(live),
+            "conversations": sum(e["count"] for e in live),
+            "bytes": sum(e["bytes"] for e in live),
+            "raw_bytes": sum(e.get("raw_bytes", 0) for e in live),
+        }
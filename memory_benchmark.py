@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Conversation memory benchmark
+Usage: python memory_benchmark.py [--sizes 1000,100000,1000000] [--output results.json]
+
+Builds synthetic Bangla/Hindi/English histories in a temporary directory and
+drives ConversationMemory and MemoryExtractor against them. Each history size
+runs in its own subprocess so peak RSS is measured per size. Results are
+printed as JSON (and optionally written to --output) so they can be diffed
+between releases.
+
+Each subprocess runs in its own temporary directory with JARVIS_DB_PATH
+pointing there, so jarvis.db is never touched.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+DEFAULT_SIZES = [1_000, 100_000, 1_000_000]
+SEED = 42
+
+PHRASES = {
+    "bn": [
+        "আমি কাল বাজারে গিয়েছিলাম", "আজকে আবহাওয়া কেমন?", "আমার জন্য একটা গান চালাও",
+        "মাকে একটা মেসেজ পাঠাও", "কালকের মিটিং কখন?", "ধন্যবাদ, খুব ভালো হয়েছে",
+    ],
+    "hi": [
+        "मुझे कल सुबह याद दिलाना", "आज मौसम कैसा है?", "यूट्यूब पर गाना चलाओ",
+        "भाई को व्हाट्सएप मैसेज भेजो", "मेरी मीटिंग कब है?", "बहुत बढ़िया, धन्यवाद",
+    ],
+    "en": [
+        "open chrome and search for laptops", "what's the weather like today?",
+        "remind me to call the bank tomorrow", "play some lofi music",
+        "send a message to Rahul", "summarize the last meeting notes",
+    ],
+}
+
+
+def _synthetic_text(rng: random.Random) -> str:
+    lang = rng.choice(("bn", "hi", "en"))
+    words = rng.randint(1, 3)
+    return " ".join(rng.choice(PHRASES[lang]) for _ in range(words)) + f" #{rng.randint(0, 10**6)}"
+
+
+def _synthetic_conversations(count: int, rng: random.Random, start_ts: float, span_s: float) -> List[Dict]:
+    """One message per conversation wrapper, the same shape MemoryExtractor writes"""
+    step = span_s / max(1, count)
+    return [
+        {
+            "messages": [{
+                "id": f"item_{i:08d}",
+                "type": "message",
+                "role": "user" if i % 2 == 0 else "assistant",
+                "content": [_synthetic_text(rng)],
+            }],
+            "timestamp": start_ts + i * step,
+        }
+        for i in range(count)
+    ]
+
+
+def _percentiles(samples_ms: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples_ms)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 4)
+
+    return {
+        "p50_ms": pick(0.50),
+        "p99_ms": pick(0.99),
+        "mean_ms": round(statistics.fmean(ordered), 4),
+        "samples": len(ordered),
+    }
+
+
+def _timed(fn, *args) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+def _disk_usage(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _peak_rss_mb() -> float:
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KB, macOS reports bytes
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    except ImportError:
+        import psutil
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / (1024 * 1024), 1)
+
+
+class _NullProfile:
+    """Profile extraction has its own benchmark; keep it out of these numbers"""
+
+    def update_from_text(self, text: str) -> bool:
+        return False
+
+
+def run_single(size: int, samples: int) -> Dict:
+    workdir = tempfile.mkdtemp(prefix="memory_bench_")
+    # Before db is imported: ConversationMemory migrates and writes to the central DB
+    os.environ["JARVIS_DB_PATH"] = os.path.join(workdir, "jarvis.db")
+    from memory_store import ConversationMemory
+    from memory_loop import MemoryExtractor
+    from memory_writer import WriteBehindQueue
+    from pydantic import BaseModel
+
+    class BenchMessage(BaseModel):
+        id: str
+        type: str = "message"
+        role: str
+        content: List[str]
+
+    rng = random.Random(SEED)
+    result: Dict = {"size": size}
+    try:
+        memory = ConversationMemory("bench", storage_path=workdir)
+        memory.db_conversation_id = None
+
+        # Seed: 90 days of history written in bulk, then indexed
+        now = time.time()
+        history = _synthetic_conversations(size, rng, now - 90 * 86400, 90 * 86400 - 3600)
+        start = time.perf_counter()
+        memory.journal.rewrite(history)
+        memory.dedup_index.rebuild(history)
+        if memory.vector_index is not None:
+            memory._index_vectors(memory._extract_fields(history))
+        result["seed_s"] = round(time.perf_counter() - start, 2)
+        del history
+
+        # Single saves through ConversationMemory
+        fresh = _synthetic_conversations(samples, rng, now, 60)
+        for i, conversation in enumerate(fresh):
+            conversation["messages"][0]["id"] = f"new_{i:08d}"
+        result["save"] = _percentiles([_timed(memory.save_conversation, c) for c in fresh])
+
+        # Batched saves through MemoryExtractor + WriteBehindQueue
+        async def drive_extractor() -> Dict:
+            extractor = MemoryExtractor(memory)
+            writer = WriteBehindQueue(memory)
+            task = asyncio.create_task(writer.run())
+            messages = [
+                BenchMessage(id=f"ext_{i:08d}", role="user" if i % 2 == 0 else "assistant",
+                             content=[_synthetic_text(rng)])
+                for i in range(samples)
+            ]
+            enqueue_ms = []
+            start_all = time.perf_counter()
+            for message in messages:
+                start_one = time.perf_counter()
+                await extractor._save_message(writer, _NullProfile(), message)
+                enqueue_ms.append((time.perf_counter() - start_one) * 1000)
+                # Yield like real event delivery so the size/time triggers can fire
+                await asyncio.sleep(0)
+            await writer.close()
+            await task
+            total_s = time.perf_counter() - start_all
+            metrics = writer.get_metrics()
+            return {
+                "enqueue": _percentiles(enqueue_ms),
+                "messages_per_s": round(samples / total_s, 1),
+                "avg_flush_ms": metrics["avg_flush_ms"],
+                "max_flush_ms": round(metrics["max_flush_ms"], 4),
+                "flushes": metrics["flushes"],
+            }
+
+        result["extractor"] = asyncio.run(drive_extractor())
+
+        # get_recent_context: cold (tail read) and warm (cached)
+        def cold_recent():
+            memory._cache = None
+            memory.get_recent_context(30)
+
+        result["recent_context_cold"] = _percentiles([_timed(cold_recent) for _ in range(min(samples, 200))])
+        memory.load_memory()
+        result["recent_context_warm"] = _percentiles(
+            [_timed(memory.get_recent_context, 30) for _ in range(samples)]
+        )
+
+        # Duplicate checks: misses for unseen messages, hits for the ones saved above
+        probe = _synthetic_conversations(samples, rng, now + 3600, 60)
+        for i, conversation in enumerate(probe):
+            conversation["messages"][0]["id"] = f"probe_{i:08d}"
+        result["dedup_check_miss"] = _percentiles([_timed(memory._conversation_exists, c) for c in probe])
+        result["dedup_check_hit"] = _percentiles([_timed(memory._conversation_exists, c) for c in fresh])
+
+        result["disk_bytes"] = _disk_usage(workdir)
+        result["peak_rss_mb"] = _peak_rss_mb()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the conversation memory stack")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="comma-separated history sizes (messages)")
+    parser.add_argument("--samples", type=int, default=500, help="operations timed per metric")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+
+    if args.single is not None:
+        print(json.dumps(run_single(args.single, args.samples)))
+        return
+
+    report = {
+        "benchmark": "conversation_memory",
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": SEED,
+        "samples": args.samples,
+        "results": [],
+    }
+    for size in (int(s) for s in args.sizes.split(",") if s.strip()):
+        print(f"Running size={size} ...", file=sys.stderr)
+        rundir = tempfile.mkdtemp(prefix="memory_bench_run_")
+        try:
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--single", str(size), "--samples", str(args.samples)],
+                capture_output=True, text=True, cwd=rundir,
+                env={**os.environ, "JARVIS_DB_PATH": os.path.join(rundir, "jarvis.db")},
+            )
+        finally:
+            shutil.rmtree(rundir, ignore_errors=True)
+        if proc.returncode != 0:
+            report["results"].append({"size": size, "error": proc.stderr.strip()[-500:]})
+            continue
+        report["results"].append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Persistent content-hash index used to deduplicate conversation memory.
+
+Every saved conversation contributes one or two keys:
+    id:<message ids>            when the messages carry ids (livekit ChatMessage)
+    c:<sha1 of content+time>    normalized role/content digest plus timestamp
+
+A conversation is a duplicate when any of its keys is already known. Keys live
+in a set (O(1) lookups) and are appended to `<user>_dedup.idx` next to the
+memory journal so they survive restarts without rescanning history.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import unicodedata
+from typing import Dict, Iterable, List, Set
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize_text(value) -> str:
+    if isinstance(value, list):
+        value = " ".join(str(v) for v in value)
+    text = unicodedata.normalize("NFC", str(value or ""))
+    return " ".join(text.casefold().split())
+
+
+def conversation_keys(conversation: Dict) -> List[str]:
+    """Return the dedup keys for a conversation wrapper"""
+    messages = conversation.get("messages", []) or []
+    keys = []
+
+    ids = [str(m.get("id")) for m in messages if isinstance(m, dict) and m.get("id")]
+    if ids and len(ids) == len(messages):
+        keys.append("id:" + ",".join(ids))
+
+    canonical = json.dumps(
+        {
+            "timestamp": conversation.get("timestamp"),
+            "messages": [
+                [_normalize_text(m.get("role")), _normalize_text(m.get("content"))]
+                if isinstance(m, dict) else _normalize_text(m)
+                for m in messages
+            ],
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    keys.append("c:" + hashlib.sha1(canonical.encode("utf-8")).hexdigest())
+    return keys
+
+
+class ContentHashIndex:
+    """Set of conversation keys persisted as an append-only key file"""
+
+    def __init__(self, index_file: str):
+        self.index_file = index_file
+        self._keys: Set[str] = set()
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.index_file):
+            return
+        with open(self.index_file, "r", encoding="utf-8") as f:
+            self._keys.update(line.strip() for line in f if line.strip())
+        logger.info(f"Loaded {len(self._keys)} dedup keys from {self.index_file}")
+
+    def exists(self) -> bool:
+        return os.path.exists(self.index_file)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def contains(self, conversation: Dict) -> bool:
+        return any(key in self._keys for key in conversation_keys(conversation))
+
+    def add(self, conversation: Dict) -> None:
+        self.add_many([conversation])
+
+    def add_many(self, conversations: Iterable[Dict]) -> None:
+        """Record the keys of `conversations` with a single append to the key file"""
+        new_keys = []
+        for conversation in conversations:
+            new_keys.extend(k for k in conversation_keys(conversation) if k not in self._keys)
+        if not new_keys:
+            return
+        with self._lock:
+            self._keys.update(new_keys)
+            with open(self.index_file, "a", encoding="utf-8") as f:
+                f.write("\n".join(new_keys) + "\n")
+
+    def rebuild(self, conversations: Iterable[Dict]) -> None:
+        """Replace the index with the keys of `conversations`"""
+        keys: Set[str] = set()
+        for conversation in conversations:
+            keys.update(conversation_keys(conversation))
+        with self._lock:
+            tmp_path = self.index_file + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for key in keys:
+                    f.write(key + "\n")
+            os.replace(tmp_path, self.index_file)
+            self._keys = keys
+        logger.info(f"Rebuilt dedup index with {len(keys)} keys")
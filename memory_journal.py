@@ -0,0 +1,410 @@
+"""
+Append-only JSONL journal for conversation memory.
+
+Each save appends a single line to the active segment file, so the cost of a
+save no longer depends on how much history the user already has. Segments are
+sealed once they reach a size limit and a background thread periodically folds
+the sealed segments into one compacted segment. When a cold archive is
+attached, compaction also moves conversations older than `hot_days` out of the
+compacted segment into zstd-compressed segments (see memory_archive).
+
+Layout of a journal directory:
+    compacted-000007.jsonl   folded state of every segment with seq <= 7
+    segment-000008.jsonl     sealed segment
+    segment-000009.jsonl     active segment (appends go here)
+    archive/                 cold tier, older than the compacted file's contents
+"""
+import json
+import logging
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_MAX_BYTES = 4 * 1024 * 1024   # roll the active segment at ~4 MB
+COMPACT_MIN_SEGMENTS = 4              # fold once this many sealed segments exist
+HOT_DAYS = 14                         # conversations newer than this stay uncompressed
+
+_SEGMENT_RE = re.compile(r"^segment-(\d{6})\.jsonl$")
+_COMPACTED_RE = re.compile(r"^compacted-(\d{6})\.jsonl$")
+
+OP_APPEND = "append"
+OP_REPLACE_LAST = "replace_last"
+
+
+def _encode(record: Dict) -> str:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+def _apply(conversations: List[Dict], record: Dict) -> None:
+    """Apply a single journal record to an in-memory conversation list"""
+    conversation = record.get("conversation")
+    if conversation is None:
+        return
+    if record.get("op") == OP_REPLACE_LAST and conversations:
+        conversations[-1] = conversation
+    else:
+        conversations.append(conversation)
+
+
+def _reverse_records(path: str, chunk_size: int = 64 * 1024) -> Iterator[Dict]:
+    """Yield the records of a journal file newest-first by seeking from the end"""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        remainder = b""
+        while position > 0:
+            read_size = min(chunk_size, position)
+            position -= read_size
+            f.seek(position)
+            lines = (f.read(read_size) + remainder).split(b"\n")
+            # The first piece may be a partial line; keep it for the next chunk
+            remainder = lines.pop(0)
+            for raw in reversed(lines):
+                record = _decode_line(raw, path)
+                if record is not None:
+                    yield record
+        record = _decode_line(remainder, path)
+        if record is not None:
+            yield record
+
+
+def _decode_line(raw: bytes, path: str) -> Optional[Dict]:
+    raw = raw.strip()
+    if not raw:
+        return None
+    try:
+        return json.loads(raw.decode("utf-8"))
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        logger.warning(f"Skipping corrupt journal line in {path}")
+        return None
+
+
+def _read_records(path: str) -> List[Dict]:
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                # A torn final line from a crash mid-append is expected; skip it
+                logger.warning(f"Skipping corrupt journal line {line_no} in {path}")
+    return records
+
+
+class ConversationJournal:
+    """Append-only segment journal with background compaction"""
+
+    def __init__(self, journal_dir: str,
+                 segment_max_bytes: int = SEGMENT_MAX_BYTES,
+                 compact_min_segments: int = COMPACT_MIN_SEGMENTS,
+                 archive=None, hot_days: int = HOT_DAYS):
+        self.journal_dir = journal_dir
+        self.segment_max_bytes = segment_max_bytes
+        self.compact_min_segments = compact_min_segments
+        # Optional cold tier (memory_archive.ColdArchive) fed by compaction
+        self.archive = archive
+        self.hot_days = hot_days
+        self._lock = threading.RLock()
+        self._compact_thread: Optional[threading.Thread] = None
+        # Bumped on every logical change made through this instance
+        self.generation = 0
+        os.makedirs(journal_dir, exist_ok=True)
+
+        compacted_seq, segments = self._scan()
+        if segments:
+            self._active_seq = segments[-1][0]
+        else:
+            self._active_seq = compacted_seq + 1
+        self._active_path = self._segment_path(self._active_seq)
+
+    # ------------------------------------------------------------------ layout
+
+    def _segment_path(self, seq: int) -> str:
+        return os.path.join(self.journal_dir, f"segment-{seq:06d}.jsonl")
+
+    def _compacted_path(self, seq: int) -> str:
+        return os.path.join(self.journal_dir, f"compacted-{seq:06d}.jsonl")
+
+    def _scan(self) -> Tuple[int, List[Tuple[int, str]]]:
+        """Return (latest compacted seq, live segments newer than it)"""
+        compacted_seq = 0
+        segments = []
+        for name in os.listdir(self.journal_dir):
+            m = _COMPACTED_RE.match(name)
+            if m:
+                compacted_seq = max(compacted_seq, int(m.group(1)))
+                continue
+            m = _SEGMENT_RE.match(name)
+            if m:
+                segments.append((int(m.group(1)), os.path.join(self.journal_dir, name)))
+        segments = sorted(s for s in segments if s[0] > compacted_seq)
+        return compacted_seq, segments
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            compacted_seq, segments = self._scan()
+            if compacted_seq:
+                return False
+            if self.archive is not None and self.archive.live_segments(compacted_seq):
+                return False
+            return not any(os.path.getsize(path) for _, path in segments)
+
+    # ----------------------------------------------------------------- writes
+
+    def append(self, conversation: Dict, replace_last: bool = False) -> None:
+        """Append a conversation (or a replacement of the last one) to the journal"""
+        self.append_many([(conversation, replace_last)])
+
+    def append_many(self, entries: List[Tuple[Dict, bool]]) -> None:
+        """Append a batch of (conversation, replace_last) entries with a single write"""
+        if not entries:
+            return
+        data = "".join(
+            _encode({
+                "op": OP_REPLACE_LAST if replace_last else OP_APPEND,
+                "conversation": conversation,
+            })
+            for conversation, replace_last in entries
+        )
+        with self._lock:
+            with open(self._active_path, "a", encoding="utf-8") as f:
+                f.write(data)
+                rolled = f.tell() >= self.segment_max_bytes
+            self.generation += 1
+            if rolled:
+                self._roll()
+        # Sealed segments only appear on a roll, so only then is compaction due
+        if rolled:
+            self.maybe_compact()
+
+    def _roll(self) -> None:
+        self._active_seq += 1
+        self._active_path = self._segment_path(self._active_seq)
+        logger.info(f"Journal rolled to segment {self._active_seq} in {self.journal_dir}")
+
+    def rewrite(self, conversations: List[Dict]) -> None:
+        """Atomically replace the whole journal contents with `conversations`"""
+        with self._lock:
+            seq = self._active_seq
+            if self.archive is not None:
+                self.archive.begin_reset(seq)
+            self._write_compacted(seq, conversations)
+            self.generation += 1
+            self._active_seq = seq + 1
+            self._active_path = self._segment_path(self._active_seq)
+            self._cleanup(seq)
+            if self.archive is not None:
+                self.archive.finish_reset()
+
+    def _write_compacted(self, seq: int, conversations: List[Dict]) -> None:
+        path = self._compacted_path(seq)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for conversation in conversations:
+                f.write(_encode({"op": OP_APPEND, "conversation": conversation}))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _cleanup(self, compacted_seq: int) -> None:
+        """Delete segments and older compacted files superseded by `compacted_seq`"""
+        for name in os.listdir(self.journal_dir):
+            m = _SEGMENT_RE.match(name) or _COMPACTED_RE.match(name)
+            if not m or int(m.group(1)) > compacted_seq:
+                continue
+            if name == os.path.basename(self._compacted_path(compacted_seq)):
+                continue
+            try:
+                os.remove(os.path.join(self.journal_dir, name))
+            except OSError as e:
+                logger.warning(f"Could not remove superseded journal file {name}: {e}")
+
+    # ------------------------------------------------------------- compaction
+
+    def maybe_compact(self) -> None:
+        """Start a background compaction if enough sealed segments piled up"""
+        with self._lock:
+            if self._compact_thread and self._compact_thread.is_alive():
+                return
+            _, segments = self._scan()
+            sealed = [s for s in segments if s[0] < self._active_seq]
+            if len(sealed) < self.compact_min_segments:
+                return
+            self._compact_thread = threading.Thread(
+                target=self.compact, name="journal-compactor", daemon=True
+            )
+            self._compact_thread.start()
+
+    def compact(self) -> None:
+        """Fold the compacted file and all sealed segments into a new compacted file"""
+        try:
+            with self._lock:
+                compacted_seq, segments = self._scan()
+                sealed = [s for s in segments if s[0] < self._active_seq]
+            if not sealed:
+                return
+
+            # Sealed segments are immutable, so folding happens outside the lock
+            conversations: List[Dict] = []
+            if compacted_seq:
+                for record in _read_records(self._compacted_path(compacted_seq)):
+                    _apply(conversations, record)
+            for _, path in sealed:
+                for record in _read_records(path):
+                    _apply(conversations, record)
+
+            target_seq = sealed[-1][0]
+            with self._lock:
+                # A concurrent rewrite() may already have superseded these segments
+                if self._scan()[0] >= target_seq:
+                    return
+                cold, conversations = self._split_cold(conversations)
+                if cold:
+                    # Only becomes visible once compacted-<target_seq> exists
+                    self.archive.write(cold, target_seq)
+                self._write_compacted(target_seq, conversations)
+                self._cleanup(target_seq)
+                if cold:
+                    self.archive.consolidate(target_seq)
+            logger.info(f"Compacted {len(sealed)} journal segments into {len(conversations)} hot conversations")
+        except Exception as e:
+            logger.error(f"Journal compaction failed: {e}")
+
+    def _split_cold(self, conversations: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+        """Split off the leading run of conversations older than the hot window"""
+        if self.archive is None:
+            return [], conversations
+        from memory_archive import conversation_time
+        cutoff = datetime.now() - timedelta(days=self.hot_days)
+        split = 0
+        # Keep at least one hot conversation for replace_last records to target
+        while split < len(conversations) - 1:
+            when = conversation_time(conversations[split])
+            if when is None or when >= cutoff:
+                break
+            split += 1
+        return conversations[:split], conversations[split:]
+
+    # ------------------------------------------------------------------ reads
+
+    def signature(self) -> Tuple:
+        """
+        Cheap change marker for read caches: the in-process generation plus the
+        mtime of the journal directory and the size/mtime of the active segment,
+        so writes from other processes are noticed without parsing anything.
+        """
+        with self._lock:
+            try:
+                dir_mtime = os.stat(self.journal_dir).st_mtime_ns
+            except OSError:
+                dir_mtime = None
+            try:
+                st = os.stat(self._active_path)
+                active = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                active = None
+            return (self.generation, dir_mtime, active)
+
+    def replay(self) -> List[Dict]:
+        """Rebuild the full conversation list from the journal"""
+        conversations: List[Dict] = []
+        with self._lock:
+            compacted_seq, segments = self._scan()
+            if self.archive is not None:
+                # Cold segments decompress transparently ahead of the hot files
+                conversations.extend(self.archive.iter_conversations(compacted_seq))
+            paths = [path for _, path in segments]
+            if compacted_seq:
+                paths.insert(0, self._compacted_path(compacted_seq))
+            for path in paths:
+                for record in _read_records(path):
+                    _apply(conversations, record)
+        return conversations
+
+    def _reverse_stream(self, compacted_seq: int, segments: List[Tuple[int, str]]) -> Iterator[Dict]:
+        """Journal records newest-first: hot files, then the cold archive"""
+        paths = [path for _, path in reversed(segments)]
+        if compacted_seq:
+            paths.append(self._compacted_path(compacted_seq))
+        for path in paths:
+            yield from _reverse_records(path)
+        if self.archive is not None:
+            for conversation in self.archive.iter_reverse(compacted_seq):
+                yield {"op": OP_APPEND, "conversation": conversation}
+
+    def tail(self, max_messages: Optional[int] = None,
+             max_conversations: Optional[int] = None) -> List[Dict]:
+        """
+        Return the newest conversations (oldest-first) without replaying the
+        whole journal: files are read backwards from the active segment and
+        reading stops once `max_messages` messages or `max_conversations`
+        conversations have been collected.
+        """
+        newest_first: List[Dict] = []
+        message_count = 0
+        # Each replace_last record hides the record written just before it
+        skip = 0
+        with self._lock:
+            compacted_seq, segments = self._scan()
+            for record in self._reverse_stream(compacted_seq, segments):
+                conversation = record.get("conversation")
+                if conversation is None:
+                    continue
+                replaces = record.get("op") == OP_REPLACE_LAST
+                if skip:
+                    # A hidden replace_last record also hides its predecessor
+                    skip = 1 if replaces else 0
+                    continue
+                skip = 1 if replaces else 0
+                newest_first.append(conversation)
+                message_count += len(conversation.get("messages", []) or [])
+                if max_conversations is not None and len(newest_first) >= max_conversations:
+                    return list(reversed(newest_first))
+                if max_messages is not None and message_count >= max_messages:
+                    return list(reversed(newest_first))
+        return list(reversed(newest_first))
+
+    # -------------------------------------------------------------- migration
+
+    def migrate_json_file(self, legacy_file: str) -> int:
+        """
+        One-time import of a legacy `<user>_memory.json` file.
+        The legacy file is renamed to `<name>.migrated` once imported.
+        Returns the number of conversations imported.
+        """
+        if not os.path.exists(legacy_file):
+            return 0
+        with self._lock:
+            if not self.is_empty():
+                logger.warning(f"Journal already has data, not migrating {legacy_file}")
+                return 0
+            try:
+                with open(legacy_file, "r", encoding="utf-8") as f:
+                    conversations = json.load(f)
+            except (json.JSONDecodeError, OSError) as e:
+                logger.error(f"Could not read legacy memory file {legacy_file}: {e}")
+                return 0
+            if not isinstance(conversations, list):
+                conversations = []
+            self.rewrite(conversations)
+            os.replace(legacy_file, legacy_file + ".migrated")
+        logger.info(f"Migrated {len(conversations)} conversations from {legacy_file}")
+        return len(conversations)
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    user_id = sys.argv[1] if len(sys.argv) > 1 else "Protik_22"
+    storage_path = sys.argv[2] if len(sys.argv) > 2 else "conversations"
+    journal = ConversationJournal(os.path.join(storage_path, f"{user_id}_journal"))
+    count = journal.migrate_json_file(os.path.join(storage_path, f"{user_id}_memory.json"))
+    print(f"Migrated {count} conversations for {user_id}")
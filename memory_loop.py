@@ -3,7 +3,10 @@ import hashlib
 import json
 import time
 import logging
-from memory_store import ConversationMemory
+from collections import OrderedDict
+from dataclasses import dataclass
+from memory_store import ConversationMemory, message_fields
+from memory_writer import WriteBehindQueue
 from pydantic import BaseModel
 
 # Configure logging
@@ -12,18 +15,40 @@ logging.basicConfig(
     format="%(asctime)s [%(levelname)s] %(message)s"
 )
 
+SERIALIZATION_CACHE_SIZE = 1024
+SAVED_IDS_CACHE_SIZE = 1024
+
+
+@dataclass
+class SerializedMessage:
+    """A chat item converted once and shared by the journal, DB writer and profile extractor"""
+    key: str
+    record: dict
+    role: str
+    text: str
+
+
 class MemoryExtractor:
-    def __init__(self):
-        # last_conversation_hash is no longer needed with the new logic
-        self.saved_message_count = 0  # Tracks how many messages have been saved.
+    def __init__(self, memory: ConversationMemory = None):
+        self.memory = memory
+        # Message ids that have already been persisted, most recently seen last.
+        # Tracking by id (not list position) keeps truncated or rewritten
+        # histories from losing or duplicating saves. Bounded like the
+        # serialization cache; an id that ages out and comes back is still
+        # caught by the store's own duplicate check.
+        self.saved_message_ids: "OrderedDict[str, None]" = OrderedDict()
+        self.writer = None
+        # message key -> SerializedMessage, most recently used last
+        self._serialized: "OrderedDict[str, SerializedMessage]" = OrderedDict()
 
     def _serialize_for_hash(self, obj):
         """
         Recursively converts Pydantic objects or nested data into serializable dicts.
-        This is necessary for consistency.
+        Models are dumped in JSON mode without unset/None fields, which gives a
+        compact, canonical record.
         """
         if isinstance(obj, BaseModel):
-            return obj.model_dump()
+            return obj.model_dump(mode="json", exclude_none=True)
         elif isinstance(obj, dict):
             return {k: self._serialize_for_hash(v) for k, v in obj.items()}
         elif isinstance(obj, list):
@@ -31,56 +56,106 @@ class MemoryExtractor:
         else:
             return obj  # primitive types
 
+    def _message_key(self, message, serialized_message) -> str:
+        message_id = getattr(message, "id", None)
+        if message_id is None and isinstance(serialized_message, dict):
+            message_id = serialized_message.get("id")
+        if message_id:
+            return str(message_id)
+        # Items without an id fall back to a content digest
+        payload = json.dumps(serialized_message, sort_keys=True, default=str)
+        return "sha1:" + hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def _serialize_message(self, message) -> SerializedMessage:
+        """Serialize a chat item once; later lookups by id reuse the cached record"""
+        message_id = getattr(message, "id", None)
+        if message_id and str(message_id) in self._serialized:
+            self._serialized.move_to_end(str(message_id))
+            return self._serialized[str(message_id)]
+
+        record = self._serialize_for_hash(message)
+        key = self._message_key(message, record)
+        role, text = message_fields(record)
+        serialized = SerializedMessage(key=key, record=record, role=role, text=text)
+        self._serialized[key] = serialized
+        if len(self._serialized) > SERIALIZATION_CACHE_SIZE:
+            self._serialized.popitem(last=False)
+        return serialized
+
+    def _forget_saved(self, batch) -> None:
+        """Writer gave up on `batch`: let those messages be queued again if they reappear"""
+        for conversation in batch:
+            for record in conversation.get("messages", []):
+                self.saved_message_ids.pop(self._message_key(None, record), None)
+
+    def _mark_saved(self, key: str) -> None:
+        self.saved_message_ids[key] = None
+        if len(self.saved_message_ids) > SAVED_IDS_CACHE_SIZE:
+            self.saved_message_ids.popitem(last=False)
+
+    async def _save_message(self, writer, profile, message) -> None:
+        serialized = self._serialize_message(message)
+        key = serialized.key
+        if key in self.saved_message_ids:
+            self.saved_message_ids.move_to_end(key)
+            return
+
+        conversation_wrapper = {
+            "messages": [serialized.record],
+            "timestamp": time.time()
+        }
+        # Marked first: put() may flush inline, and a dropped batch un-marks its ids
+        self._mark_saved(key)
+        # Queued for the next batched flush (one file append + one DB transaction)
+        await writer.put(conversation_wrapper)
+        logging.info(f"Queued new message with ID: {getattr(message, 'id', 'unknown')}")
+
+        # Preference extraction: only from USER messages if available
+        try:
+            if serialized.role.lower() in ["user", "client"] and serialized.text:
+                if profile.update_from_text(serialized.text):
+                    logging.info("Updated user profile from new message.")
+        except Exception as e:
+            logging.error(f"Profile update error: {e}")
+
     async def run(self, session):
         """
-        The main loop that checks for and saves new conversations.
+        Saves conversation items as the AgentSession emits them.
+        Nothing runs while the conversation is idle.
         """
-        memory = ConversationMemory("Protik_22")
-        from user_profile import UserProfile
-        profile = UserProfile("Protik_22")
-
-        while True:
-            # Check for new messages every 1 second
-            await asyncio.sleep(1)
-
-            # Assuming the conversation history is a list of message objects
-            # within the session object. Adjust 'session.chat_history' if needed.
-            current_chat_history = session
-            
-            # This is the core logic: Compare the current count with the saved count.
-            if len(current_chat_history) > self.saved_message_count:
-                logging.info(f"{len(current_chat_history) - self.saved_message_count} new message(s) detected. Saving...")
-                
-                # Get a "slice" of the new messages that haven't been saved yet.
-                new_messages = current_chat_history[self.saved_message_count:]
-                
-                for message in new_messages:
-                    # Serialize the single message for saving
-                    serialized_message = self._serialize_for_hash(message)
-                    conversation_wrapper = {
-                        "messages": [serialized_message],
-                        "timestamp": time.time()
-                    }
-                    
-                    success = memory.save_conversation(conversation_wrapper)
-                    
-                    # Preference extraction: only from USER messages if available
-                    try:
-                        role = getattr(message, "role", None) or serialized_message.get("role")
-                        content = getattr(message, "content", None) or serialized_message.get("content") or ""
-                        if role and str(role).lower() in ["user", "client"] and isinstance(content, str):
-                            if profile.update_from_text(content):
-                                logging.info("Updated user profile from new message.")
-                    except Exception as e:
-                        logging.error(f"Profile update error: {e}")
-                    
-                    if success:
-                        logging.info(f"Saved new message with ID: {getattr(message, 'id', 'unknown')}")
-                    else:
-                        logging.error(f"Failed to save message with ID: {getattr(message, 'id', 'unknown')}")
-                
-                # After successfully saving all new messages, update the counter.
-                self.saved_message_count = len(current_chat_history)
-            
-            else:
-                logging.info("No new messages to save. Skipping.")
+        loop = asyncio.get_running_loop()
+        # Opening the store may migrate/replay files; keep that off the event loop
+        memory = self.memory
+        if memory is None:
+            memory = await loop.run_in_executor(None, ConversationMemory, "Protik_22")
+        try:
+            # Triggers on `messages` keep the recall index current as batches land
+            from memory_search import ensure_fts_index
+            await loop.run_in_executor(None, ensure_fts_index)
+        except Exception as e:
+            logging.warning(f"Full-text index unavailable: {e}")
+        from user_profile import get_user_profile
+        profile = get_user_profile("Protik_22")
+
+        self.writer = WriteBehindQueue(memory, on_drop=self._forget_saved)
+        writer_task = asyncio.create_task(self.writer.run())
+        pending: asyncio.Queue = asyncio.Queue()
+
+        def _on_item_added(event):
+            pending.put_nowait(event.item)
+
+        session.on("conversation_item_added", _on_item_added)
+        try:
+            # Items that arrived before we subscribed
+            for message in list(session.history.items):
+                await self._save_message(self.writer, profile, message)
+
+            while True:
+                message = await pending.get()
+                await self._save_message(self.writer, profile, message)
+        finally:
+            session.off("conversation_item_added", _on_item_added)
+            # Forced flush so nothing queued is lost on shutdown
+            await self.writer.close()
+            await writer_task
+            await loop.run_in_executor(None, profile.flush)
@@ -0,0 +1,121 @@
+"""
+Full-text recall over past conversation messages (SQLite FTS5).
+
+`messages_fts` is an external-content FTS5 index over the `messages` table in
+jarvis.db. Triggers keep it in sync, so every batch MemoryExtractor writes is
+indexed incrementally in the same transaction.
+"""
+import asyncio
+import logging
+import re
+from typing import Dict, List
+
+from livekit.agents import function_tool
+
+logger = logging.getLogger(__name__)
+
+_fts_ready = False
+_TERM_SPLIT_RE = re.compile(r"[\s\"'`.,;:!?()\[\]{}*^+\-/\\|<>=~@#$%&।॥]+")
+
+# unicode61 without diacritic folding keeps Bangla/Hindi vowel signs intact
+_FTS_SCHEMA = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+        content,
+        role UNINDEXED,
+        content='messages',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 0'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts(rowid, content, role) VALUES (new.id, new.content, new.role);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content, role)
+        VALUES ('delete', old.id, old.content, old.role);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content, role)
+        VALUES ('delete', old.id, old.content, old.role);
+        INSERT INTO messages_fts(rowid, content, role) VALUES (new.id, new.content, new.role);
+    END
+    """,
+]
+
+
+def ensure_fts_index() -> None:
+    """Create the FTS index and triggers once; backfills existing messages on first creation"""
+    global _fts_ready
+    if _fts_ready:
+        return
+    from db import init_db, write
+    init_db()
+    with write() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='messages_fts'")
+        existed = cur.fetchone() is not None
+        for statement in _FTS_SCHEMA:
+            cur.execute(statement)
+        if not existed:
+            cur.execute("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
+            logger.info("Built full-text index over existing messages")
+    _fts_ready = True
+
+
+def _to_match_query(query: str) -> str:
+    """Turn free text into a safe FTS5 query: any term, prefix-matched"""
+    # Split on whitespace/punctuation only: \w would break Indic vowel signs apart
+    terms = [t for t in _TERM_SPLIT_RE.split(query or "") if t]
+    return " OR ".join('"' + t.replace('"', '""') + '"*' for t in terms)
+
+
+def search_messages(query: str, limit: int = 5) -> List[Dict]:
+    """Return the best-ranked past messages matching `query`"""
+    match = _to_match_query(query)
+    if not match:
+        return []
+    ensure_fts_index()
+    from db import read
+    with read() as conn:
+        rows = conn.execute(
+            """
+            SELECT m.role, m.content, m.created_at
+            FROM messages_fts
+            JOIN messages m ON m.id = messages_fts.rowid
+            WHERE messages_fts MATCH ?
+            ORDER BY bm25(messages_fts)
+            LIMIT ?
+            """,
+            (match, limit)
+        ).fetchall()
+    return [{"role": r[0], "content": r[1], "created_at": r[2]} for r in rows]
+
+
+@function_tool()
+async def recall_memory(query: str) -> str:
+    """
+    Searches past conversations for what the user said about a topic.
+
+    Use when user asks: "গত সপ্তাহে X নিয়ে কী বলেছিলাম?", "What did I say about X?", "X ke baare me kya bola tha?"
+
+    Args:
+        query: Keywords describing what to look for
+    """
+    try:
+        results = await asyncio.to_thread(search_messages, query, 5)
+        if not results:
+            return f"🔍 '{query}' নিয়ে আগের কোনো কথা খুঁজে পাইনি।"
+        lines = [f"🧠 **Past conversation about '{query}'**:"]
+        for r in results:
+            content = " ".join(str(r["content"]).split())[:200]
+            lines.append(f"- [{r['created_at']}] {r['role']}: {content}")
+        return "\n".join(lines)
+    except Exception as e:
+        logger.error(f"recall_memory failed: {e}")
+        return f"❌ Memory search failed: {str(e)[:100]}"
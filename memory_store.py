@@ -1,13 +1,25 @@
-import json
 import os
 from datetime import datetime
-from typing import List, Dict, Union
+from typing import List, Dict, Optional, Tuple, Union
 import logging
+from memory_journal import ConversationJournal
+from memory_dedup import ContentHashIndex, conversation_keys
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def message_fields(msg) -> Tuple[str, str]:
+    """(role, plain text) of a stored message; list content is joined text parts"""
+    if isinstance(msg, dict):
+        role, content = msg.get('role'), msg.get('content')
+    else:
+        role, content = getattr(msg, 'role', ''), getattr(msg, 'content', '')
+    if isinstance(content, list):
+        content = " ".join(c for c in content if isinstance(c, str))
+    return str(role or ''), str(content or '')
+
+
 class ConversationMemory:
     """Handles persistent conversation memory for users"""
     
@@ -15,11 +27,39 @@ class ConversationMemory:
         self.user_id = user_id
         self.storage_path = storage_path
         self.memory_file = os.path.join(storage_path, f"{user_id}_memory.json")
+        self.journal_dir = os.path.join(storage_path, f"{user_id}_journal")
         
         # Create storage directory if it doesn't exist
         os.makedirs(storage_path, exist_ok=True)
+        # Older conversations roll into zstd-compressed cold segments
+        try:
+            from memory_archive import ColdArchive
+            archive = ColdArchive(os.path.join(self.journal_dir, "archive"))
+        except ImportError as e:
+            logger.warning(f"Cold archive unavailable, keeping all history hot: {e}")
+            archive = None
+        self.journal = ConversationJournal(self.journal_dir, archive=archive)
+        # One-time import of the legacy single-file JSON memory
+        self.journal.migrate_json_file(self.memory_file)
+        self.dedup_index = ContentHashIndex(os.path.join(storage_path, f"{user_id}_dedup.idx"))
+        if not self.dedup_index.exists() and not self.journal.is_empty():
+            self.dedup_index.rebuild(self.journal.replay())
+        # In-process view of the journal, invalidated via journal.signature()
+        self._cache: Optional[List[Dict]] = None
+        self._cache_signature = None
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Semantic recall over past turns (needs numpy)
+        try:
+            from memory_vectors import VectorIndex
+            self.vector_index = VectorIndex(os.path.join(storage_path, user_id))
+            if len(self.vector_index) == 0 and not self.journal.is_empty():
+                self._index_vectors(self._extract_fields(self.journal.replay()))
+        except ImportError as e:
+            logger.warning(f"Vector index unavailable: {e}")
+            self.vector_index = None
         logger.info(f"ConversationMemory initialized for user: {user_id}")
-        logger.info(f"Memory file path: {os.path.abspath(self.memory_file)}")   
+        logger.info(f"Memory journal path: {os.path.abspath(self.journal_dir)}")
         # DB setup
         try:
             from db import init_db, start_conversation
@@ -30,89 +70,155 @@ class ConversationMemory:
             self.db_conversation_id = None
     
     def load_memory(self) -> List[Dict]:
-        """Load all past conversations for this user"""
-        if os.path.exists(self.memory_file):
-            try:
-                with open(self.memory_file, 'r', encoding="utf-8") as f:
-                    data = json.load(f)
-                    logger.info(f"Loaded {len(data)} conversations from memory for user {self.user_id}")
-                    return data
-            except (json.JSONDecodeError, FileNotFoundError) as e:
-                logger.error(f"Error loading memory file: {e}")
-                return []
-        else:
-            logger.info(f"No existing memory file found for user {self.user_id}")
+        """Load all past conversations for this user (served from cache when unchanged)"""
+        signature = self.journal.signature()
+        if self._cache is not None and signature == self._cache_signature:
+            self.cache_hits += 1
+            return list(self._cache)
+        
+        self.cache_misses += 1
+        try:
+            data = self.journal.replay()
+        except OSError as e:
+            logger.error(f"Error loading memory journal: {e}")
             return []
+        self._cache = data
+        self._cache_signature = signature
+        logger.info(f"Loaded {len(data)} conversations from memory for user {self.user_id}")
+        return list(data)
     
-    def _conversation_exists(self, new_conversation: Dict, existing_conversations: List[Dict]) -> bool:
-        """Check if a conversation already exists in memory"""
-        new_conv_data = new_conversation.get('model_dump', lambda: new_conversation)()
-        new_timestamp = new_conv_data.get('timestamp')
-        new_messages = new_conv_data.get('messages', [])
-        
-        for existing_conv in existing_conversations:
-            existing_timestamp = existing_conv.get('timestamp')
-            existing_messages = existing_conv.get('messages', [])
-            
-            # Compare by timestamp and message count
-            if (existing_timestamp == new_timestamp and 
-                len(existing_messages) == len(new_messages)):
-                return True
-        
-        return False
+    def _cache_is_fresh(self) -> bool:
+        return self._cache is not None and self.journal.signature() == self._cache_signature
+    
+    def _update_cache(self, entries: List[Tuple[Dict, bool]], signature_before) -> None:
+        """Apply our own appends to the cached view instead of re-reading the journal"""
+        if self._cache is None or self._cache_signature != signature_before:
+            return
+        for conversation, replace_last in entries:
+            if replace_last and self._cache:
+                self._cache[-1] = conversation
+            else:
+                self._cache.append(conversation)
+        self._cache_signature = self.journal.signature()
+    
+    def cache_stats(self) -> Dict[str, int]:
+        """Hit/miss counters for the in-process memory cache"""
+        return {"hits": self.cache_hits, "misses": self.cache_misses}
+    
+    def _conversation_exists(self, new_conversation: Dict) -> bool:
+        """Check if a conversation already exists in memory (O(1) hash lookup)"""
+        return self.dedup_index.contains(new_conversation)
     
     def save_conversation(self, conversation: Union[Dict, object]) -> bool:
         """Save a conversation to memory - returns True if successful"""
         logger.info(f"save_conversation called for user {self.user_id}")
-        
+        return self.save_conversations([conversation]) is not None
+    
+    def save_conversations(self, conversations: List[Union[Dict, object]]) -> Optional[int]:
+        """
+        Save a batch of conversations with one journal append and one DB
+        transaction. Returns the number of new conversations written, or None
+        if the batch could not be saved.
+        """
         try:
-            memory = self.load_memory()
+            entries: List[Tuple[Dict, bool]] = []
+            batch_keys = set()
+            last_conversation = self._last_conversation()
             
-            # Convert conversation to dict if it's an object with model_dump method
-            if hasattr(conversation, 'model_dump'):
-                conversation_dict = conversation.model_dump()
-            else:
-                conversation_dict = conversation
+            for conversation in conversations:
+                # Convert conversation to dict if it's an object with model_dump method
+                if hasattr(conversation, 'model_dump'):
+                    conversation_dict = conversation.model_dump()
+                else:
+                    conversation_dict = conversation
+                
+                # Add timestamp if not present
+                if 'timestamp' not in conversation_dict:
+                    conversation_dict['timestamp'] = datetime.now().isoformat()
+                
+                # Check if this conversation already exists
+                keys = conversation_keys(conversation_dict)
+                if self._conversation_exists(conversation_dict) or batch_keys.intersection(keys):
+                    logger.info("Conversation already exists in memory, skipping save")
+                    continue
+                
+                # If this is an update to the last conversation, replace it instead of adding
+                replace_last = last_conversation is not None and self._is_conversation_update(conversation_dict, last_conversation)
+                if replace_last:
+                    logger.info("Updating last conversation instead of adding new one")
+                entries.append((conversation_dict, replace_last))
+                batch_keys.update(keys)
+                last_conversation = conversation_dict
             
-            # Add timestamp if not present
-            if 'timestamp' not in conversation_dict:
-                conversation_dict['timestamp'] = datetime.now().isoformat()
+            if not entries:
+                return 0
             
-            # Check if this conversation already exists
-            if self._conversation_exists(conversation_dict, memory):
-                logger.info("Conversation already exists in memory, skipping save")
-                return True
+            # Append to the journal (one write, independent of history size)
+            signature_before = self.journal.signature()
+            self.journal.append_many(entries)
+            self._update_cache(entries, signature_before)
+            self.dedup_index.add_many(conversation for conversation, _ in entries)
             
-            # If this is an update to the last conversation, replace it instead of adding
-            if memory and self._is_conversation_update(conversation_dict, memory[-1]):
-                logger.info("Updating last conversation instead of adding new one")
-                memory[-1] = conversation_dict
-            else:
-                # Add new conversation
-                memory.append(conversation_dict)
+            saved = [conversation for conversation, _ in entries]
+            # Role/text are extracted once and shared by the DB and vector writers
+            fields = self._extract_fields(saved)
+            self._save_to_db(fields)
+            self._index_vectors(fields)
             
-            # Save to file
-            with open(self.memory_file, 'w', encoding='utf-8') as f:
-                json.dump(memory, f, indent=2, ensure_ascii=False)
-            
-            # Save to DB messages (best-effort)
-            try:
-                from db import add_message
-                for msg in conversation_dict.get('messages', []):
-                    role = (msg.get('role') if isinstance(msg, dict) else getattr(msg, 'role', '')) or ''
-                    content = (msg.get('content') if isinstance(msg, dict) else getattr(msg, 'content', '')) or ''
-                    if self.db_conversation_id and (role or content):
-                        add_message(self.db_conversation_id, str(role), str(content))
-            except Exception as e:
-                logger.warning(f"DB log message failed: {e}")
-            
-            logger.info(f"Successfully saved conversation for user {self.user_id}")
-            logger.info(f"File saved at: {os.path.abspath(self.memory_file)}")
-            return True
+            logger.info(f"Successfully saved {len(entries)} conversation(s) for user {self.user_id}")
+            return len(entries)
             
         except Exception as e:
             logger.error(f"Error saving conversation: {e}")
-            return False
+            return None
+    
+    @staticmethod
+    def _extract_fields(conversations: List[Dict]) -> List[Tuple[Dict, int, Dict, str, str]]:
+        """(conversation, index, message, role, text) for every stored message"""
+        fields = []
+        for conversation_dict in conversations:
+            for i, msg in enumerate(conversation_dict.get('messages', [])):
+                role, text = message_fields(msg)
+                fields.append((conversation_dict, i, msg, role, text))
+        return fields
+    
+    def _save_to_db(self, fields: List[Tuple[Dict, int, Dict, str, str]]) -> None:
+        """Mirror messages into the DB in a single transaction (best-effort)"""
+        if not self.db_conversation_id:
+            return
+        rows = [(role, text) for _, _, _, role, text in fields if role or text]
+        if not rows:
+            return
+        try:
+            from db import add_messages
+            add_messages(self.db_conversation_id, rows)
+        except Exception as e:
+            logger.warning(f"DB log message failed: {e}")
+    
+    def _index_vectors(self, fields: List[Tuple[Dict, int, Dict, str, str]]) -> None:
+        """Embed user/assistant turns into the semantic index (best-effort)"""
+        if self.vector_index is None:
+            return
+        items = []
+        for conversation_dict, i, msg, role, text in fields:
+            if role.lower() not in ('user', 'assistant') or not text.strip():
+                continue
+            items.append({
+                "id": (msg.get('id') if isinstance(msg, dict) else None) or f"{conversation_dict.get('timestamp')}:{i}",
+                "role": role,
+                "text": text[:1000],
+                "timestamp": conversation_dict.get('timestamp'),
+            })
+        try:
+            self.vector_index.add(items)
+        except Exception as e:
+            logger.warning(f"Vector index update failed: {e}")
+    
+    def get_relevant_context(self, query: str, k: int = 3) -> List[Dict]:
+        """Past turns most similar to `query` (cosine over the local vector index)"""
+        if self.vector_index is None or not (query or "").strip():
+            return []
+        return self.vector_index.search(query, k)
     
     def _is_conversation_update(self, new_conv: Dict, last_conv: Dict) -> bool:
         """Check if new conversation is an update to the last one"""
@@ -131,18 +237,30 @@ class ConversationMemory:
         except Exception:
             return False
     
+    def _last_conversation(self) -> Optional[Dict]:
+        """Most recent conversation, from the cache or a tail read of the journal"""
+        if self._cache_is_fresh():
+            return self._cache[-1] if self._cache else None
+        tail = self.journal.tail(max_conversations=1)
+        return tail[-1] if tail else None
+    
     def get_recent_context(self, max_messages: int = 30) -> List[Dict]:
         """Get recent conversation context for the agent"""
-        memory = self.load_memory()
-        all_messages = []
-        
-        # Flatten all conversations into a single message list
-        for conversation in memory:
-            if "messages" in conversation:
-                all_messages.extend(conversation["messages"])
+        if max_messages <= 0:
+            return []
+        if self._cache_is_fresh():
+            conversations = self._cache
+        else:
+            # Tail read: only the newest journal records are decoded
+            conversations = self.journal.tail(max_messages=max_messages)
         
-        # Return the most recent messages
-        recent_messages = all_messages[-max_messages:] if all_messages else []
+        # Walk backwards until enough messages are collected
+        recent_messages = []
+        for conversation in reversed(conversations):
+            messages = conversation.get("messages") or []
+            recent_messages[:0] = messages[-(max_messages - len(recent_messages)):]
+            if len(recent_messages) >= max_messages:
+                break
         logger.info(f"Retrieved {len(recent_messages)} recent messages for user {self.user_id}")
         return recent_messages
     
@@ -155,17 +273,21 @@ class ConversationMemory:
         """Remove duplicate conversations and return count of removed duplicates"""
         memory = self.load_memory()
         unique_conversations = []
+        seen_keys = set()
         removed_count = 0
         
         for conv in memory:
-            if not self._conversation_exists(conv, unique_conversations):
+            keys = conversation_keys(conv)
+            if not any(key in seen_keys for key in keys):
                 unique_conversations.append(conv)
+                seen_keys.update(keys)
             else:
                 removed_count += 1
         
         if removed_count > 0:
-            with open(self.memory_file, 'w', encoding='utf-8') as f:
-                json.dump(unique_conversations, f, indent=2, ensure_ascii=False)
+            self.journal.rewrite(unique_conversations)
+            self._cache = None
+            self.dedup_index.rebuild(unique_conversations)
             logger.info(f"Removed {removed_count} duplicate conversations")
         
         return removed_count
\ No newline at end of file
@@ -0,0 +1,169 @@
+"""
+Local vector index for semantic recall of past conversation turns.
+
+Embeddings are stored as a float16 matrix in `<user>_vectors.f16` (appended
+row by row and read back through a memory map) with one JSON metadata line per
+row in `<user>_vectors.jsonl`. Rows are L2-normalized, so cosine similarity is
+a plain dot product computed in chunks over the memory map.
+
+The embedder is pluggable: anything with `dim` and `embed(texts) -> ndarray`
+works. The default HashingEmbedder needs no model download and runs offline.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import zlib
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"[^\s\"'`.,;:!?()\[\]{}*^+\-/\\|<>=~@#$%&।॥]+")
+
+
+class HashingEmbedder:
+    """Signed feature-hashing of words and character trigrams (script-agnostic)"""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def _features(self, text: str) -> List[str]:
+        features = []
+        for token in _TOKEN_RE.findall(text.casefold()):
+            features.append("w:" + token)
+            padded = f"<{token}>"
+            features.extend("c:" + padded[i:i + 3] for i in range(len(padded) - 2))
+        return features
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text or ""):
+                h = zlib.crc32(feature.encode("utf-8"))
+                matrix[row, h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+
+class VectorIndex:
+    """Append-only float16 embedding matrix with batched cosine top-k search"""
+
+    SEARCH_CHUNK_ROWS = 65536
+
+    def __init__(self, path_prefix: str, embedder=None):
+        self.embedder = embedder or HashingEmbedder()
+        self.dim = self.embedder.dim
+        self.vectors_file = path_prefix + "_vectors.f16"
+        self.meta_file = path_prefix + "_vectors.jsonl"
+        self._lock = threading.Lock()
+        self._matrix: Optional[np.memmap] = None
+        self._meta: List[Dict] = []
+        self._meta_all: List[Dict] = []
+        self._meta_offset = 0
+        self._loaded_bytes = -1
+        self._row_bytes = self.dim * np.dtype(np.float16).itemsize
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._meta)
+
+    def _refresh(self) -> None:
+        """Pick up rows appended since the last look, e.g. by another instance"""
+        try:
+            size = os.path.getsize(self.vectors_file)
+        except OSError:
+            size = 0
+        if size == self._loaded_bytes:
+            return
+        try:
+            meta_size = os.path.getsize(self.meta_file)
+        except OSError:
+            meta_size = 0
+        if size < self._loaded_bytes or meta_size < self._meta_offset:
+            # Files were rewritten underneath us; start over
+            self._meta_all, self._meta_offset = [], 0
+        if meta_size > self._meta_offset:
+            with open(self.meta_file, "rb") as f:
+                f.seek(self._meta_offset)
+                for raw in f:
+                    if not raw.endswith(b"\n"):
+                        break
+                    try:
+                        self._meta_all.append(json.loads(raw) if raw.strip() else {})
+                    except json.JSONDecodeError:
+                        break
+                    self._meta_offset += len(raw)
+        # A crash between the two appends can leave them out of step; trust the shorter
+        rows = min(size // self._row_bytes, len(self._meta_all))
+        self._meta = self._meta_all[:rows]
+        self._matrix = (
+            np.memmap(self.vectors_file, dtype=np.float16, mode="r", shape=(rows, self.dim))
+            if rows else None
+        )
+        self._loaded_bytes = size
+
+    def add(self, items: List[Dict]) -> int:
+        """Embed and append items of the form {"id", "role", "text", ...}"""
+        items = [item for item in items if (item.get("text") or "").strip()]
+        if not items:
+            return 0
+        vectors = self.embedder.embed([item["text"] for item in items]).astype(np.float16)
+        with self._lock:
+            self._refresh()
+            rows = len(self._meta)
+            if len(self._meta_all) != rows:
+                # Realign the metadata file with the vector rows before appending
+                with open(self.meta_file, "wb") as f:
+                    for item in self._meta:
+                        f.write((json.dumps(item, ensure_ascii=False) + "\n").encode("utf-8"))
+                self._meta_all, self._meta_offset = list(self._meta), os.path.getsize(self.meta_file)
+            with open(self.vectors_file, "r+b" if os.path.exists(self.vectors_file) else "wb") as f:
+                # Drop any torn tail so rows stay aligned with the metadata
+                f.truncate(rows * self._row_bytes)
+                f.seek(0, os.SEEK_END)
+                f.write(vectors.tobytes())
+            with open(self.meta_file, "ab") as f:
+                for item in items:
+                    f.write((json.dumps(item, ensure_ascii=False) + "\n").encode("utf-8"))
+        return len(items)
+
+    def search(self, query: str, k: int = 5) -> List[Dict]:
+        return self.search_many([query], k)[0]
+
+    def search_many(self, queries: Sequence[str], k: int = 5,
+                    min_score: float = 0.1) -> List[List[Dict]]:
+        """Cosine top-k for a batch of queries, scanning the memory map in chunks"""
+        with self._lock:
+            self._refresh()
+            matrix, meta = self._matrix, self._meta
+        if matrix is None or not queries:
+            return [[] for _ in queries]
+
+        q = self.embedder.embed(list(queries)).T  # (dim, n_queries)
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        for start in range(0, matrix.shape[0], self.SEARCH_CHUNK_ROWS):
+            chunk = np.asarray(matrix[start:start + self.SEARCH_CHUNK_ROWS], dtype=np.float32)
+            scores = (chunk @ q).T  # (n_queries, chunk_rows)
+            rows = np.broadcast_to(np.arange(start, start + chunk.shape[0]), scores.shape)
+            scores = np.concatenate([best_scores, scores], axis=1)
+            rows = np.concatenate([best_rows, rows], axis=1)
+            if scores.shape[1] > k:
+                keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, keep, axis=1)
+                rows = np.take_along_axis(rows, keep, axis=1)
+            best_scores, best_rows = scores, rows
+
+        results = []
+        for scores, rows in zip(best_scores, best_rows):
+            order = np.argsort(-scores)
+            results.append([
+                {**meta[int(rows[i])], "score": round(float(scores[i]), 4)}
+                for i in order if scores[i] >= min_score
+            ])
+        return results
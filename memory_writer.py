@@ -0,0 +1,209 @@
+"""
+Write-behind queue for conversation persistence.
+
+Messages are queued as they arrive and flushed to ConversationMemory in
+batches: one journal append and one DB transaction per batch. A flush is
+triggered inline by `put()` when the queue reaches `max_batch` items, or by
+the background task once the oldest queued item has waited `max_delay`
+seconds. Flushes never overlap. `close()` waits for one in flight and then
+drains the queue.
+
+All disk and SQLite work runs on a dedicated single-thread persistence worker,
+so the realtime session's event loop never waits on file rewrites or fsyncs.
+When the worker falls behind, `put()` applies backpressure once `max_pending`
+items are queued.
+
+A batch that fails to save goes back to the front of the queue and is retried
+after a backoff (doubling from `retry_delay`). Retrying is safe because
+save_conversations skips anything already stored. After `max_retries` failed
+attempts the batch is dropped and handed to `on_drop`, so the caller can
+forget those messages were saved.
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindQueue:
+    def __init__(self, memory, max_batch: int = 20, max_delay: float = 0.5,
+                 max_pending: int = 1000, max_retries: int = 3, retry_delay: float = 1.0,
+                 on_drop: Optional[Callable[[List[Dict]], None]] = None):
+        self.memory = memory
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.on_drop = on_drop
+        self._pending: List[Dict] = []
+        self._oldest_at: Optional[float] = None
+        self._failed_attempts = 0          # consecutive failures of the batch at the front
+        self._retry_at: Optional[float] = None
+        self._wakeup = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._flush_lock = asyncio.Lock()
+        self._closed = False
+        # Single worker: batches are written strictly in the order they were queued
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-writer")
+        self.metrics = {
+            'flushes': 0,
+            'flushed_items': 0,
+            'failed_flushes': 0,
+            'retried_items': 0,
+            'dropped_items': 0,
+            'backpressure_waits': 0,
+            'last_flush_ms': 0.0,
+            'max_flush_ms': 0.0,
+            'total_flush_ms': 0.0,
+        }
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    async def put(self, conversation: Dict) -> None:
+        """Queue a conversation wrapper for the next batch, waiting if the worker is behind"""
+        while len(self._pending) >= self.max_pending and not self._closed:
+            self.metrics['backpressure_waits'] += 1
+            self._drained.clear()
+            self._wakeup.set()
+            await self._drained.wait()
+
+        if not self._pending:
+            self._oldest_at = time.monotonic()
+            # Let the background task arm its max_delay timer
+            self._wakeup.set()
+        self._pending.append(conversation)
+        if len(self._pending) >= self.max_batch and self._flush_due():
+            # Flush here: in a burst the background task wouldn't run until it ends
+            await self.flush()
+
+    def _flush_due(self) -> bool:
+        if not self._pending:
+            return False
+        if self._closed:
+            return True
+        if self._retry_at is not None:
+            return time.monotonic() >= self._retry_at
+        if len(self._pending) >= self.max_batch:
+            return True
+        return time.monotonic() - self._oldest_at >= self.max_delay
+
+    def _next_deadline(self) -> Optional[float]:
+        if self._retry_at is not None:
+            return self._retry_at
+        if self._oldest_at is None:
+            return None
+        return self._oldest_at + self.max_delay
+
+    def _write_batch(self, batch: List[Dict]) -> Optional[int]:
+        """Runs on the persistence worker thread"""
+        start = time.perf_counter()
+        saved = self.memory.save_conversations(batch)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        self.metrics['last_flush_ms'] = elapsed_ms
+        self.metrics['max_flush_ms'] = max(self.metrics['max_flush_ms'], elapsed_ms)
+        self.metrics['total_flush_ms'] += elapsed_ms
+        return saved
+
+    async def flush(self) -> int:
+        """Write everything queued so far; returns the number of items flushed"""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, []
+            self._oldest_at = None
+            self._drained.set()
+
+            loop = asyncio.get_running_loop()
+            try:
+                saved = await loop.run_in_executor(self._executor, self._write_batch, batch)
+            except Exception as e:
+                logger.error(f"Write-behind flush raised: {e}")
+                saved = None
+            if saved is None:
+                self._flush_failed(batch)
+                return 0
+            self._failed_attempts = 0
+            self._retry_at = None
+            self.metrics['flushes'] += 1
+            self.metrics['flushed_items'] += len(batch)
+            logger.debug(f"Flushed {len(batch)} item(s) in {self.metrics['last_flush_ms']:.1f} ms")
+            return len(batch)
+
+    def _flush_failed(self, batch: List[Dict]) -> None:
+        """Requeue a failed batch at the front, or drop it once retries are used up"""
+        self.metrics['failed_flushes'] += 1
+        self._failed_attempts += 1
+        if self._failed_attempts > self.max_retries:
+            logger.error(f"Write-behind flush of {len(batch)} item(s) failed "
+                         f"{self._failed_attempts} times, dropping it")
+            self.metrics['dropped_items'] += len(batch)
+            self._failed_attempts = 0
+            self._retry_at = None
+            if self.on_drop is not None:
+                try:
+                    self.on_drop(batch)
+                except Exception as e:
+                    logger.error(f"Write-behind on_drop callback error: {e}")
+            return
+
+        delay = self.retry_delay * 2 ** (self._failed_attempts - 1)
+        logger.warning(f"Write-behind flush of {len(batch)} item(s) failed, "
+                       f"retry {self._failed_attempts}/{self.max_retries} in {delay:.1f}s")
+        self.metrics['retried_items'] += len(batch)
+        self._pending = batch + self._pending
+        self._oldest_at = time.monotonic()
+        self._retry_at = self._oldest_at + delay
+
+    def get_metrics(self) -> Dict[str, float]:
+        flushes = max(1, self.metrics['flushes'] + self.metrics['failed_flushes'])
+        return {
+            **self.metrics,
+            'queue_depth': self.queue_depth,
+            'avg_flush_ms': round(self.metrics['total_flush_ms'] / flushes, 3),
+        }
+
+    async def run(self) -> None:
+        """Background task: flush once max_delay elapses or a retry backoff ends"""
+        while not self._closed:
+            deadline = self._next_deadline()
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                if self._flush_due():
+                    await self.flush()
+            except Exception as e:
+                # Keep the task alive; the queued items are still in _pending
+                logger.error(f"Write-behind flush loop error: {e}")
+
+    async def close(self) -> None:
+        """Stop the background task, drain the queue and stop the worker"""
+        self._closed = True
+        self._wakeup.set()
+        self._drained.set()
+        try:
+            # The first flush waits for one already in flight (from run() or
+            # put()); a batch that one requeued is drained by the loop
+            await self.flush()
+            while self._pending:
+                await self.flush()
+        finally:
+            # Nothing is queued on the worker unless close() itself was interrupted
+            self._executor.shutdown(wait=True)
+            if self._pending:
+                batch, self._pending = self._pending, []
+                logger.error(f"Write-behind queue closed with {len(batch)} unsaved item(s)")
+                self.metrics['dropped_items'] += len(batch)
+                if self.on_drop is not None:
+                    self.on_drop(batch)
@@ -0,0 +1,124 @@
+"""
+Buffered metric writer for AnalyticsEngine.
+
+    sink = MetricSink()
+    sink.add("INSERT INTO analytics (metric_type, value, metadata) VALUES (?, ?, ?)", row)
+
+add() only appends to an in-memory buffer under a lock, so a tool call pays
+about a microsecond instead of a queued SQLite commit. A daemon thread
+flushes the buffer every `flush_interval_s` seconds, or sooner once
+`flush_batch` rows are waiting. Each flush writes everything in one
+transaction (executemany per statement).
+
+The buffer is bounded. When it is full (the disk is stalled or locked), new
+samples are dropped and counted rather than held. A flush that fails is
+dropped and counted too, so memory never grows with a broken database.
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from db import write
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL_S = 2.0
+FLUSH_BATCH = 500
+MAX_BUFFERED = 10_000
+
+
+class MetricSink:
+    def __init__(self, flush_interval_s: float = FLUSH_INTERVAL_S, flush_batch: int = FLUSH_BATCH,
+                 max_buffered: int = MAX_BUFFERED):
+        self.flush_interval_s = flush_interval_s
+        self.flush_batch = flush_batch
+        self.max_buffered = max_buffered
+        self._buffer: Dict[str, List[Sequence[Any]]] = {}
+        self._buffered = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {
+            'added': 0,
+            'written': 0,
+            'dropped': 0,
+            'flushes': 0,
+            'failed_flushes': 0,
+            'last_flush_ms': 0.0,
+        }
+
+    def add(self, sql: str, params: Sequence[Any]) -> bool:
+        """Buffer one row for `sql`; returns False if it was dropped"""
+        with self._lock:
+            if self._closed or self._buffered >= self.max_buffered:
+                self.stats['dropped'] += 1
+                dropped = self.stats['dropped']
+            else:
+                rows = self._buffer.get(sql)
+                if rows is None:
+                    rows = self._buffer[sql] = []
+                rows.append(params)
+                self._buffered += 1
+                self.stats['added'] += 1
+                dropped = 0
+                if self._thread is None:
+                    self._start()
+                if self._buffered >= self.flush_batch:
+                    self._wake.set()
+        if dropped:
+            if dropped == 1 or dropped % 1000 == 0:
+                logger.warning(f"Metric buffer full; dropped {dropped} sample(s) so far")
+            return False
+        return True
+
+    def _start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="metric-sink", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._closed:
+            self._wake.wait(self.flush_interval_s)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """Write everything buffered in one transaction; returns rows written"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, {}
+                count, self._buffered = self._buffered, 0
+            if not count:
+                return 0
+            start = time.perf_counter()
+            try:
+                with write() as conn:
+                    for sql, rows in batch.items():
+                        conn.executemany(sql, rows)
+            except Exception as e:
+                with self._lock:
+                    self.stats['failed_flushes'] += 1
+                    self.stats['dropped'] += count
+                logger.warning(f"Metric flush failed, dropped {count} sample(s): {e}")
+                return 0
+            with self._lock:
+                self.stats['written'] += count
+                self.stats['flushes'] += 1
+                self.stats['last_flush_ms'] = round((time.perf_counter() - start) * 1000, 3)
+            return count
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, 'buffered': self._buffered}
+
+    def close(self) -> None:
+        """Stop the flush thread and write what is left"""
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        self._wake.set()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=5)
+        self.flush()
@@ -0,0 +1,147 @@
+"""
+Compiled preference extraction for UserProfile.update_from_text.
+
+Every keyword the profile rules care about (Bangla/Hindi/English phrasing)
+is compiled once into an Aho-Corasick automaton. One pass over the lowered
+message reports every keyword it contains. The remaining regexes (browser
+phrasing, nickname, idle timing) are precompiled and only run when the scan
+found a keyword that can make them match.
+
+The rules and their precedence are exactly those of the original
+update_from_text; profile_benchmark.py checks the two agree.
+"""
+import re
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+LANGUAGE_BANGLA = ("bangla", "bengali")
+LANGUAGE_HINGLISH = ("hinglish", "hingl", "mix hindi english")
+BROWSERS = ("chrome", "edge", "firefox", "brave")
+CONFIRM_ON = ("always confirm", "ask before", "first confirm", "pehle pucho", "agey jiggesh")
+CONFIRM_OFF = ("dont ask", "no confirmation", "without asking", "seedha karo", "direct kor")
+# Any of these must be present for the nickname pattern to be able to match
+NICKNAME_TRIGGERS = ("call", "name", "naam", "nam")
+
+_BROWSER_PATTERNS = [
+    (b, re.compile(rf"\buse\s+{b}\b|\bprefer\s+{b}\b|\bdefault\s+browser\b.*{b}|{b}\s+use\b"))
+    for b in BROWSERS
+]
+_NICKNAME_RE = re.compile(r"\b(call\s+me|my\s+name\s+is|mera\s+naam|amar\s+nam)\s+([\w\-\. ]{2,40})")
+_IDLE_RE = re.compile(r"(\d{1,3})\s*(s|sec|secs|second|seconds|সেকেন্ড)?")
+
+
+class KeywordAutomaton:
+    """Aho-Corasick matcher compiled to a full transition table (no failure walks at scan time)"""
+
+    def __init__(self, keywords: Iterable[str]):
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[Tuple[str, ...]] = [()]
+        for keyword in dict.fromkeys(keywords):
+            state = 0
+            for ch in keyword:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    goto.append({})
+                    outputs.append(())
+                    nxt = goto[state][ch] = len(goto) - 1
+                state = nxt
+            outputs[state] += (keyword,)
+
+        # Breadth-first: failure links, then fold them into a dense transition table
+        fail = [0] * len(goto)
+        self._delta: List[Dict[str, int]] = [dict(goto[0])] + [{} for _ in goto[1:]]
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            outputs[state] += outputs[fail[state]]
+            delta = dict(self._delta[fail[state]])
+            delta.update(goto[state])
+            self._delta[state] = delta
+            for ch, nxt in goto[state].items():
+                fail[nxt] = self._delta[fail[state]].get(ch, 0)
+                queue.append(nxt)
+        self._outputs: List[Optional[Tuple[str, ...]]] = [out or None for out in outputs]
+
+    def scan(self, text: str) -> Set[str]:
+        """All keywords occurring anywhere in `text`, overlapping matches included"""
+        delta, outputs = self._delta, self._outputs
+        state = 0
+        found: List[str] = []
+        for ch in text:
+            state = delta[state].get(ch, 0)
+            if outputs[state]:
+                found.extend(outputs[state])
+        return set(found)
+
+
+class PreferenceExtractor:
+    def __init__(self):
+        self.automaton = KeywordAutomaton(
+            LANGUAGE_BANGLA + LANGUAGE_HINGLISH + ("hindi", "english")
+            + BROWSERS + ("formal", "informal", "casual")
+            + CONFIRM_ON + CONFIRM_OFF + NICKNAME_TRIGGERS
+        )
+
+    def extract(self, text_l: str, has_language: bool = True) -> List[Tuple[str, Any]]:
+        """Preference updates found in lowered text, as ordered (field, value) pairs.
+
+        The nickname is reported under the pseudo-field "nickname".
+        """
+        found = self.automaton.scan(text_l)
+        updates: List[Tuple[str, Any]] = []
+
+        # Language preference - default to bangla
+        if not has_language or not found.isdisjoint(LANGUAGE_BANGLA):
+            updates.append(("preferred_language", "bangla"))
+        elif not found.isdisjoint(LANGUAGE_HINGLISH):
+            updates.append(("preferred_language", "hinglish"))
+        elif "hindi" in found and "english" not in found:
+            updates.append(("preferred_language", "hindi"))
+        elif "english" in found and "hindi" not in found:
+            updates.append(("preferred_language", "english"))
+
+        # Browser preference: first browser (in BROWSERS order) whose phrasing matches
+        for browser, pattern in _BROWSER_PATTERNS:
+            if browser in found and pattern.search(text_l):
+                updates.append(("preferred_browser", browser))
+                break
+
+        # Greeting style ("informal" contains "formal", which wins, as before)
+        if "formal" in found:
+            updates.append(("greeting_style", "formal"))
+        elif "informal" in found or "casual" in found:
+            updates.append(("greeting_style", "informal"))
+
+        # Confirmation policy: an explicit opt-out overrides an opt-in in the same message
+        if not found.isdisjoint(CONFIRM_ON):
+            updates.append(("always_confirm_actions", True))
+        if not found.isdisjoint(CONFIRM_OFF):
+            updates.append(("always_confirm_actions", False))
+
+        if not found.isdisjoint(NICKNAME_TRIGGERS):
+            m = _NICKNAME_RE.search(text_l)
+            if m:
+                name = m.group(2).strip().title()
+                if name:
+                    updates.append(("nickname", name))
+
+        # Proactive idle timing (e.g., "15s", "45 sec", "30 seconds", "৩০ সেকেন্ড")
+        tm = _IDLE_RE.search(text_l)
+        if tm:
+            try:
+                val = int(tm.group(1))
+                if 5 <= val <= 600:
+                    updates.append(("proactive_idle_seconds", val))
+            except ValueError:
+                pass
+        return updates
+
+
+_extractor: Optional[PreferenceExtractor] = None
+
+
+def get_extractor() -> PreferenceExtractor:
+    global _extractor
+    if _extractor is None:
+        _extractor = PreferenceExtractor()
+    return _extractor
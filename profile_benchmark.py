@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Preference extraction micro-benchmark
+Usage: python profile_benchmark.py [--messages 100000] [--output results.json]
+
+Replays a synthetic Bangla/Hindi/English chat log through the compiled
+PreferenceExtractor and through the original regex cascade it replaced,
+checks both produce the same updates for every message and reports the
+per-message cost of each as JSON.
+"""
+import argparse
+import json
+import platform
+import random
+import re
+import statistics
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from memory_benchmark import PHRASES, SEED, _percentiles
+from preference_extractor import PreferenceExtractor, get_extractor
+
+# Messages that actually carry preferences, mixed into the log at a low rate
+PREFERENCE_PHRASES = [
+    "please use chrome from now on", "I prefer firefox", "default browser should be brave",
+    "edge use karo", "be formal with me", "keep it casual yaar", "informal chalega",
+    "always confirm before sending", "pehle pucho phir karo", "dont ask, seedha karo",
+    "no confirmation needed", "call me Rocky", "my name is Protik", "mera naam Rahul hai",
+    "amar nam Protik", "talk in hinglish", "mix hindi english please", "hindi me bolo",
+    "reply in english only", "বাংলায় কথা বলো, bangla please", "wait 45 seconds before pinging",
+    "৩০ সেকেন্ড পরে মনে করিয়ে দিও", "ping me after 15s",
+]
+
+
+def legacy_extract(text_l: str, has_language: bool = True) -> List[Tuple[str, Any]]:
+    """The update_from_text rules as they were before compilation (reference and baseline)"""
+    updates: List[Tuple[str, Any]] = []
+    if "bangla" in text_l or "bengali" in text_l or not has_language:
+        updates.append(("preferred_language", "bangla"))
+    elif any(k in text_l for k in ["hinglish", "hingl", "mix hindi english"]):
+        updates.append(("preferred_language", "hinglish"))
+    elif "hindi" in text_l and "english" not in text_l:
+        updates.append(("preferred_language", "hindi"))
+    elif "english" in text_l and "hindi" not in text_l:
+        updates.append(("preferred_language", "english"))
+
+    for b in ["chrome", "edge", "firefox", "brave"]:
+        if re.search(rf"\buse\s+{b}\b|\bprefer\s+{b}\b|\bdefault\s+browser\b.*{b}|{b}\s+use\b", text_l):
+            updates.append(("preferred_browser", b))
+            break
+
+    if "formal" in text_l:
+        updates.append(("greeting_style", "formal"))
+    elif "informal" in text_l or "casual" in text_l:
+        updates.append(("greeting_style", "informal"))
+
+    if any(p in text_l for p in ["always confirm", "ask before", "first confirm", "pehle pucho", "agey jiggesh"]):
+        updates.append(("always_confirm_actions", True))
+    if any(p in text_l for p in ["dont ask", "no confirmation", "without asking", "seedha karo", "direct kor"]):
+        updates.append(("always_confirm_actions", False))
+
+    m = re.search(r"\b(call\s+me|my\s+name\s+is|mera\s+naam|amar\s+nam)\s+([\w\-\. ]{2,40})", text_l)
+    if m:
+        name = m.group(2).strip().title()
+        if name:
+            updates.append(("nickname", name))
+
+    tm = re.search(r"(\d{1,3})\s*(s|sec|secs|second|seconds|সেকেন্ড)?", text_l)
+    if tm:
+        try:
+            val = int(tm.group(1))
+            if 5 <= val <= 600:
+                updates.append(("proactive_idle_seconds", val))
+        except Exception:
+            pass
+    return updates
+
+
+def _chat_log(count: int, preference_rate: float, rng: random.Random) -> List[str]:
+    log = []
+    for _ in range(count):
+        if rng.random() < preference_rate:
+            log.append(rng.choice(PREFERENCE_PHRASES))
+        else:
+            lang = rng.choice(("bn", "hi", "en"))
+            log.append(" ".join(rng.choice(PHRASES[lang]) for _ in range(rng.randint(1, 3))))
+    return log
+
+
+def _time_per_message(fn: Callable[[str, bool], Any], log: List[str], rounds: int) -> Dict[str, float]:
+    """Per-message cost in microseconds, one sample per round over the whole log"""
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for text in log:
+            fn(text.lower(), True)
+        samples.append((time.perf_counter() - start) * 1e6 / len(log))
+    return {
+        "per_message_us": round(min(samples), 3),
+        "mean_us": round(statistics.fmean(samples), 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark UserProfile preference extraction")
+    parser.add_argument("--messages", type=int, default=100_000, help="chat log size")
+    parser.add_argument("--preference-rate", type=float, default=0.02,
+                        help="share of messages that state a preference")
+    parser.add_argument("--rounds", type=int, default=5, help="timed passes over the log")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(SEED)
+    log = _chat_log(args.messages, args.preference_rate, rng)
+    extractor = get_extractor()
+
+    # Same answers first, otherwise the timings mean nothing
+    mismatches = [
+        text for text in log[:10_000] + PREFERENCE_PHRASES
+        for has_language in (True, False)
+        if extractor.extract(text.lower(), has_language) != legacy_extract(text.lower(), has_language)
+    ]
+    if mismatches:
+        raise SystemExit(f"Compiled extractor disagrees with the original rules on: {mismatches[:5]}")
+
+    start = time.perf_counter()
+    PreferenceExtractor()
+    build_ms = (time.perf_counter() - start) * 1000
+
+    compiled = _time_per_message(extractor.extract, log, args.rounds)
+    legacy = _time_per_message(legacy_extract, log, args.rounds)
+
+    single = []
+    for text in log[:5000]:
+        text_l = text.lower()
+        start = time.perf_counter()
+        extractor.extract(text_l, True)
+        single.append((time.perf_counter() - start) * 1000)
+
+    report = {
+        "benchmark": "preference_extraction",
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": SEED,
+        "messages": args.messages,
+        "preference_rate": args.preference_rate,
+        "automaton_build_ms": round(build_ms, 3),
+        "compiled": {**compiled, "single_message": _percentiles(single)},
+        "legacy": legacy,
+        "speedup": round(legacy["per_message_us"] / compiled["per_message_us"], 2),
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
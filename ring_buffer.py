@@ -0,0 +1,98 @@
+"""
+Fixed-capacity numeric ring buffer with O(1) rolling statistics.
+
+    times = RingBuffer(1000)
+    times.append(0.42)
+    times.mean(), times.min(), times.max(), times.recent_mean(10)
+
+Samples live in a preallocated array('d'), so memory is fixed at 8 bytes per
+slot however long the session runs. The running sum is updated on every
+append. It is recomputed from the array once per lap to cancel float drift,
+which is still O(1) amortized. Min and max come from monotonic deques: each
+sample enters and leaves each deque at most once.
+"""
+from array import array
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+
+class RingBuffer:
+    def __init__(self, capacity: int):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self._data = array('d', bytes(8 * capacity))
+        self._next = 0          # slot the next sample goes into
+        self._size = 0
+        self._appended = 0      # samples ever appended (sequence number of the next one)
+        self._sum = 0.0
+        self._min: Deque[Tuple[int, float]] = deque()   # (sequence, value), values increasing
+        self._max: Deque[Tuple[int, float]] = deque()   # (sequence, value), values decreasing
+
+    def append(self, value: float) -> None:
+        value = float(value)
+        if self._size == self.capacity:
+            self._sum -= self._data[self._next]
+        else:
+            self._size += 1
+        self._data[self._next] = value
+        self._sum += value
+        self._next = (self._next + 1) % self.capacity
+        if self._next == 0:
+            self._sum = sum(self._data[:self._size])
+
+        seq = self._appended
+        self._appended += 1
+        oldest = self._appended - self._size
+        while self._min and self._min[-1][1] >= value:
+            self._min.pop()
+        self._min.append((seq, value))
+        while self._min[0][0] < oldest:
+            self._min.popleft()
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._max.append((seq, value))
+        while self._max[0][0] < oldest:
+            self._max.popleft()
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def total_appended(self) -> int:
+        return self._appended
+
+    @property
+    def sum(self) -> float:
+        return self._sum
+
+    def mean(self, default: float = 0.0) -> float:
+        return self._sum / self._size if self._size else default
+
+    def min(self, default: float = 0.0) -> float:
+        return self._min[0][1] if self._size else default
+
+    def max(self, default: float = 0.0) -> float:
+        return self._max[0][1] if self._size else default
+
+    def last(self, default: Optional[float] = None) -> Optional[float]:
+        return self._data[self._next - 1] if self._size else default
+
+    def tail(self, n: int) -> List[float]:
+        """The last `n` samples, oldest first"""
+        n = min(n, self._size)
+        start = (self._next - n) % self.capacity
+        if start + n <= self.capacity:
+            return self._data[start:start + n].tolist()
+        return (self._data[start:] + self._data[:self._next]).tolist()
+
+    def recent_mean(self, n: int, default: float = 0.0) -> float:
+        """Mean of the last `n` samples (O(n); meant for small n)"""
+        values = self.tail(n)
+        return sum(values) / len(values) if values else default
+
+    def clear(self) -> None:
+        self._next = self._size = 0
+        self._sum = 0.0
+        self._min.clear()
+        self._max.clear()
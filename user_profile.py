@@ -1,12 +1,54 @@
+import atexit
 import json
+import logging
 import os
-import re
-from typing import Dict, Any
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from preference_extractor import get_extractor
+
+logger = logging.getLogger(__name__)
+
+# Observer signature: callback(key, old_value, new_value)
+ProfileListener = Callable[[str, Any, Any], None]
+
+_registry: Dict[Tuple[str, str], "UserProfile"] = {}
+_registry_lock = threading.Lock()
+
+
+def get_user_profile(user_id: str, storage_path: str = "conversations") -> "UserProfile":
+    """Shared per-user profile: loaded from disk/DB once per process, then reused"""
+    key = (user_id, os.path.abspath(storage_path))
+    with _registry_lock:
+        profile = _registry.get(key)
+        if profile is None:
+            profile = UserProfile(user_id, storage_path)
+            _registry[key] = profile
+        return profile
+
+
+def flush_all_profiles() -> None:
+    """Write out every profile with unsaved changes (runs at interpreter exit too)"""
+    with _registry_lock:
+        profiles = list(_registry.values())
+    for profile in profiles:
+        profile.flush()
+
+
+atexit.register(flush_all_profiles)
 
 
 class UserProfile:
+    # Changes are coalesced and written at most once per interval
+    SAVE_INTERVAL_S = 2.0
+
     def __init__(self, user_id: str, storage_path: str = "conversations"):
         self.user_id = user_id
+        self._listeners: List[ProfileListener] = []
+        self._dirty = False
+        self._save_timer: Optional[threading.Timer] = None
+        self._state_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
         self.storage_path = storage_path
         os.makedirs(storage_path, exist_ok=True)
         self.profile_file = os.path.join(storage_path, f"{user_id}_profile.json")
@@ -40,15 +82,45 @@ class UserProfile:
                 pass
 
     def save(self) -> None:
-        # Save to JSON (legacy)
-        with open(self.profile_file, "w", encoding="utf-8") as f:
-            json.dump(self.data, f, indent=2, ensure_ascii=False)
-        # Upsert to DB
-        try:
-            from db import upsert_profile
-            upsert_profile(self.user_id, self.data)
-        except Exception:
-            pass
+        """Mark the profile dirty; the write happens on a timer, off the caller's thread"""
+        with self._state_lock:
+            self._dirty = True
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(self.SAVE_INTERVAL_S, self.flush)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+
+    def flush(self) -> bool:
+        """Persist pending changes now; returns True if anything was written"""
+        with self._flush_lock:
+            with self._state_lock:
+                if self._save_timer is not None:
+                    self._save_timer.cancel()
+                    self._save_timer = None
+                if not self._dirty:
+                    return False
+                self._dirty = False
+                snapshot = json.loads(json.dumps(self.data))
+            try:
+                # Save to JSON (legacy): temp file + rename so a crash never leaves it half-written
+                tmp_path = self.profile_file + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(snapshot, f, indent=2, ensure_ascii=False)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.profile_file)
+            except OSError as e:
+                logger.error(f"Could not write profile {self.user_id}: {e}")
+                with self._state_lock:
+                    self._dirty = True
+                return False
+            # Upsert to DB
+            try:
+                from db import upsert_profile
+                upsert_profile(self.user_id, snapshot)
+            except Exception:
+                pass
+            return True
 
     def update_from_text(self, text: str) -> bool:
         if not text or not isinstance(text, str):
@@ -56,59 +128,42 @@ class UserProfile:
         text_l = text.lower()
         updated = False
 
-        # Language preference - default to bangla
-        if "bangla" in text_l or "bengali" in text_l or not self.data.get("preferred_language"):
-            updated |= self._set("preferred_language", "bangla")
-        elif any(k in text_l for k in ["hinglish", "hingl", "mix hindi english"]):
-            updated |= self._set("preferred_language", "hinglish")
-        elif "hindi" in text_l and "english" not in text_l:
-            updated |= self._set("preferred_language", "hindi")
-        elif "english" in text_l and "hindi" not in text_l:
-            updated |= self._set("preferred_language", "english")
-
-        # Browser preference
-        for b in ["chrome", "edge", "firefox", "brave"]:
-            if re.search(rf"\buse\s+{b}\b|\bprefer\s+{b}\b|\bdefault\s+browser\b.*{b}|{b}\s+use\b", text_l):
-                updated |= self._set("preferred_browser", b)
-                break
-
-        # Greeting style
-        if "formal" in text_l:
-            updated |= self._set("greeting_style", "formal")
-        elif "informal" in text_l or "casual" in text_l:
-            updated |= self._set("greeting_style", "informal")
-
-        # Confirmation policy
-        if any(p in text_l for p in ["always confirm", "ask before", "first confirm", "pehle pucho", "agey jiggesh"]):
-            updated |= self._set("always_confirm_actions", True)
-        if any(p in text_l for p in ["dont ask", "no confirmation", "without asking", "seedha karo", "direct kor"]):
-            updated |= self._set("always_confirm_actions", False)
-
-        # Nickname extraction: "call me X" or "mera naam X" or "my name is X"
-        m = re.search(r"\b(call\s+me|my\s+name\s+is|mera\s+naam|amar\s+nam)\s+([\w\-\. ]{2,40})", text_l)
-        if m:
-            name = m.group(2).strip().title()
-            if name:
-                self.data["nicknames"]["self"] = name
-                updated = True
-
-        # Proactive idle timing (e.g., "15s", "45 sec", "30 seconds", "৩০ সেকেন্ড")
-        tm = re.search(r"(\d{1,3})\s*(s|sec|secs|second|seconds|সেকেন্ড)?", text_l)
-        if tm:
-            try:
-                val = int(tm.group(1))
-                if 5 <= val <= 600:
-                    updated |= self._set("proactive_idle_seconds", val)
-            except Exception:
-                pass
+        for key, value in get_extractor().extract(text_l, bool(self.data.get("preferred_language"))):
+            if key == "nickname":
+                nicknames = self.data.get("nicknames") or {}
+                if nicknames.get("self") != value:
+                    updated |= self._set("nicknames", {**nicknames, "self": value})
+            else:
+                updated |= self._set(key, value)
 
         if updated:
             self.save()
         return updated
 
+    def subscribe(self, listener: ProfileListener) -> None:
+        """Call `listener(key, old, new)` whenever a profile field changes"""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener: ProfileListener) -> None:
+        try:
+            self._listeners.remove(listener)
+        except ValueError:
+            pass
+
+    def _notify(self, key: str, old: Any, new: Any) -> None:
+        for listener in list(self._listeners):
+            try:
+                listener(key, old, new)
+            except Exception as e:
+                logger.error(f"Profile listener failed for {key}: {e}")
+
     def _set(self, key: str, value: Any) -> bool:
-        if self.data.get(key) != value:
-            self.data[key] = value
+        old = self.data.get(key)
+        if old != value:
+            with self._state_lock:
+                self.data[key] = value
+            self._notify(key, old, value)
             return True
         return False
 
@@ -621,47 +621,24 @@ class TaskExecutor:
 
 
 class PersistenceManager:
-    def __init__(self):
-        self.conn = None
+    """Session/error log, stored in the central DB (automation_sessions / automation_errors)"""
 
     def initialize(self):
-        import sqlite3 as _sqlite3
-        self.conn = _sqlite3.connect('robot_agent.db')
-        self._create_tables()
-
-    def _create_tables(self):
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS sessions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                task_name TEXT,
-                status TEXT,
-                result TEXT
-            )
-        ''')
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS errors (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                error_type TEXT,
-                message TEXT,
-                stack_trace TEXT
-            )
-        ''')
-        self.conn.commit()
+        from db import init_db
+        init_db()
 
     def log_session(self, task_name: str, status: str, result: str):
-        cursor = self.conn.cursor()
-        cursor.execute('INSERT INTO sessions (task_name, status, result) VALUES (?, ?, ?)', (task_name, status, result))
-        self.conn.commit()
+        from db import write
+        with write() as conn:
+            conn.execute('INSERT INTO automation_sessions (task_name, status, result) VALUES (?, ?, ?)',
+                         (task_name, status, result))
 
     def log_error(self, error_info: Dict[str, Any]):
-        cursor = self.conn.cursor()
-        cursor.execute('INSERT INTO errors (error_type, message, stack_trace) VALUES (?, ?, ?)', (
-            error_info.get('error_type', ''), error_info.get('message', ''), error_info.get('stack_trace', '')
-        ))
-        self.conn.commit()
+        from db import write
+        with write() as conn:
+            conn.execute('INSERT INTO automation_errors (error_type, message, stack_trace) VALUES (?, ?, ?)', (
+                error_info.get('error_type', ''), error_info.get('message', ''), error_info.get('stack_trace', '')
+            ))
 
 
 class VoiceInterface:
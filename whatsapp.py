@@ -1,5 +1,3 @@
-import sqlite3
-import csv
 import subprocess
 import time
 import pyautogui
@@ -16,6 +14,9 @@ import requests
 from PIL import Image
 import io
 import base64
+import db_async
+from contact_index import get_contact_index
+from db import normalize_phone, read, write
 
 logger = logging.getLogger(__name__)
 ASSISTANT_NAME = 'vai'
@@ -139,90 +140,50 @@ class WhatsAppAI:
         
         return None
 
-# Database setup (legacy file + new centralized DB)
+# Database setup: contacts and whatsapp_* tables live in the central store (jarvis.db)
 def init_contacts_db():
-    try:
-        from db import init_db
-        init_db()
-    except Exception:
-        pass
-    con = sqlite3.connect('contacts.db')
-    cursor = con.cursor()
-    cursor.execute('''CREATE TABLE IF NOT EXISTS contacts 
-                     (id integer primary key, name VARCHAR(200), mobile_no VARCHAR(255), email VARCHAR(255) NULL)''')
-    
-    # Add new tables for advanced features
-    cursor.execute('''CREATE TABLE IF NOT EXISTS whatsapp_messages 
-                     (id integer primary key, contact_name VARCHAR(200), message TEXT, 
-                      timestamp DATETIME DEFAULT CURRENT_TIMESTAMP, message_type VARCHAR(50),
-                      ai_analysis TEXT, auto_reply_sent BOOLEAN DEFAULT FALSE)''')
-    
-    cursor.execute('''CREATE TABLE IF NOT EXISTS whatsapp_groups 
-                     (id integer primary key, group_name VARCHAR(200), group_id VARCHAR(255),
-                      member_count INTEGER, created_at DATETIME DEFAULT CURRENT_TIMESTAMP)''')
-    
-    cursor.execute('''CREATE TABLE IF NOT EXISTS whatsapp_media 
-                     (id integer primary key, contact_name VARCHAR(200), media_type VARCHAR(50),
-                      file_path TEXT, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)''')
-    
-    con.commit()
-    return con, cursor
+    from db import init_db, _connect
+    init_db()
+    con = _connect()
+    return con, con.cursor()
 
-# Prefer centralized DB for reads
 def import_contacts_csv(csv_file='contacts.csv'):
-    con, cursor = init_contacts_db()
-    desired_columns_indices = [0, 30]
-    
+    """Import a phone contacts export (CSV or vCard); see contact_import"""
+    from contact_import import import_contacts
     try:
-        with open(csv_file, 'r', encoding='utf-8') as csvfile:
-            csvreader = csv.reader(csvfile)
-            for row in csvreader:
-                if len(row) > max(desired_columns_indices):
-                    selected_data = [row[i] for i in desired_columns_indices]
-                    cursor.execute("INSERT INTO contacts (id, 'name', 'mobile_no') VALUES (null, ?, ?)", tuple(selected_data))
-        con.commit()
+        return import_contacts(csv_file)
     except Exception as e:
         logger.error(f"Error importing contacts: {e}")
-    finally:
-        con.close()
 
 def remove_words(input_string, words_to_remove):
     words = input_string.split()
     filtered_words = [word for word in words if word.lower() not in words_to_remove]
     return ' '.join(filtered_words)
 
-def findContact(query):
+def _contact_query(query):
     words_to_remove = [ASSISTANT_NAME, 'make', 'a', 'to', 'phone', 'call', 'send', 'message', 'whatsapp', 'video']
-    query = remove_words(query, words_to_remove)
-    
-    # Central DB lookup first
-    try:
-        from db import find_contact_by_name
-        res = find_contact_by_name(query)
-        if res:
-            name, mobile_number_str = res
-            if not str(mobile_number_str).startswith('+91'):
-                mobile_number_str = '+91' + str(mobile_number_str)
-            return mobile_number_str, name
-    except Exception:
-        pass
-    
-    # Fallback to legacy sqlite file
-    con, cursor = init_contacts_db()
-    try:
-        query = query.strip().lower()
-        cursor.execute("SELECT mobile_no FROM contacts WHERE LOWER(name) LIKE ? OR LOWER(name) LIKE ?", 
-                      ('%' + query + '%', query + '%'))
-        results = cursor.fetchall()
-        print(results[0][0])
-        mobile_number_str = str(results[0][0])
-        if not mobile_number_str.startswith('+91'):
-            mobile_number_str = '+91' + mobile_number_str
-        return mobile_number_str, query
-    except:
+    return remove_words(query, words_to_remove)
+
+def resolve_contact(query):
+    """Ranked contact matches for a spoken name; pass them to both helpers below"""
+    return get_contact_index().resolve(_contact_query(query))
+
+def findContact(query, matches=None):
+    if matches is None:
+        matches = resolve_contact(query)
+    if not matches:
         return 0, 0
-    finally:
-        con.close()
+    best = matches[0]
+    return normalize_phone(best.mobile_no) or str(best.mobile_no), best.name
+
+def ambiguous_contact_prompt(query, matches=None):
+    """Question to ask the user when several contacts match equally well, else empty"""
+    if matches is None:
+        matches = resolve_contact(query)
+    if not get_contact_index().is_ambiguous(matches):
+        return ""
+    options = "\n".join(f"{i}. {m.name} ({m.mobile_no})" for i, m in enumerate(matches, 1))
+    return f"🤔 '{query}' নামে একাধিক contact পাওয়া গেছে:\n{options}\nকোনটা?"
 
 def whatsApp(mobile_no, message, flag, name):
     if flag == 'message':
@@ -329,7 +290,11 @@ async def whatsapp_message(contact_name: str, message: str = "") -> str:
         message: Message content (optional, will prompt if empty)
     """
     try:
-        contact_no, name = findContact(contact_name)
+        matches = resolve_contact(contact_name)
+        ambiguous = ambiguous_contact_prompt(contact_name, matches)
+        if ambiguous:
+            return ambiguous
+        contact_no, name = findContact(contact_name, matches)
         if contact_no == 0:
             return f"❌ Contact '{contact_name}' not found in database"
         
@@ -351,8 +316,8 @@ async def whatsapp_message(contact_name: str, message: str = "") -> str:
         
         # Optional confirmation via profile
         try:
-            from user_profile import UserProfile
-            profile = UserProfile("Protik_22")
+            from user_profile import get_user_profile
+            profile = get_user_profile("Protik_22")
             if profile.data.get("always_confirm_actions"):
                 return f"🛑 Confirm: send message to {name}? Text: '{message}'. Say 'confirm send' to proceed."
         except Exception:
@@ -360,17 +325,9 @@ async def whatsapp_message(contact_name: str, message: str = "") -> str:
         
         result = whatsApp(contact_no, message, 'message', name)
         
-        # Log message with AI analysis
+        # Log message with AI analysis (fire-and-forget on the DB writer thread)
         if WHATSAPP_CONFIG["ai_analysis_enabled"]:
-            con, cursor = init_contacts_db()
-            try:
-                cursor.execute("INSERT INTO whatsapp_messages (contact_name, message, message_type, ai_analysis) VALUES (?, ?, ?, ?)",
-                             (name, message, 'outgoing', json.dumps(analysis)))
-                con.commit()
-            except Exception as e:
-                logger.error(f"Error logging message: {e}")
-            finally:
-                con.close()
+            db_async.submit(_log_message, name, message, 'outgoing', json.dumps(analysis))
         
         return f"✅ {result}"
     except Exception as e:
@@ -389,14 +346,18 @@ async def whatsapp_call(contact_name: str, call_type: str = "voice") -> str:
         call_type: "voice" for phone call, "video" for video call
     """
     try:
-        contact_no, name = findContact(contact_name)
+        matches = resolve_contact(contact_name)
+        ambiguous = ambiguous_contact_prompt(contact_name, matches)
+        if ambiguous:
+            return ambiguous
+        contact_no, name = findContact(contact_name, matches)
         if contact_no == 0:
             return f"❌ Contact '{contact_name}' not found in database"
         
         # Optional confirmation via profile
         try:
-            from user_profile import UserProfile
-            profile = UserProfile("Protik_22")
+            from user_profile import get_user_profile
+            profile = get_user_profile("Protik_22")
             if profile.data.get("always_confirm_actions"):
                 act = 'video call' if call_type == 'video' else 'call'
                 return f"🛑 Confirm: {act} to {name}? Say 'confirm call' to proceed."
@@ -418,23 +379,13 @@ async def add_contact(name: str, mobile_no: str) -> str:
         name: Contact name
         mobile_no: Mobile number
     """
-    # Write to centralized DB too
     try:
         from db import add_contact as add_contact_db
-        add_contact_db(name, mobile_no)
-    except Exception:
-        pass
-    
-    con, cursor = init_contacts_db()
-    try:
-        query = "INSERT INTO contacts VALUES (null,?, ?)"
-        cursor.execute(query, (name, mobile_no))
-        con.commit()
+        contact_id = await db_async.write(add_contact_db, name, mobile_no)
+        get_contact_index().add(contact_id, name, mobile_no)
         return f"✅ Contact '{name}' added successfully"
     except Exception as e:
         return f"❌ Contact add করতে সমস্যা: {str(e)[:100]}।"
-    finally:
-        con.close()
 
 @function_tool()
 async def whatsapp_automation(query: str, message: str = "", confirm: bool = False) -> str:
@@ -458,15 +409,19 @@ async def whatsapp_automation(query: str, message: str = "", confirm: bool = Fal
         if not action or not contact:
             return "❌ Please specify an action (send message/call/video call) and a contact name."
 
-        contact_no, name = findContact(contact)
+        matches = resolve_contact(contact)
+        ambiguous = ambiguous_contact_prompt(contact, matches)
+        if ambiguous:
+            return ambiguous
+        contact_no, name = findContact(contact, matches)
         if contact_no == 0:
             return "❌ Contact not found in database"
 
         # Check confirmation policy
         must_confirm = False
         try:
-            from user_profile import UserProfile
-            profile = UserProfile("Protik_22")
+            from user_profile import get_user_profile
+            profile = get_user_profile("Protik_22")
             if profile.data.get("always_confirm_actions"):
                 must_confirm = True
         except Exception:
@@ -544,21 +499,16 @@ async def whatsapp_group_management(action: str, group_name: str = "", members:
         if not WHATSAPP_CONFIG["group_management_enabled"]:
             return "❌ Group management is disabled in configuration"
         
-        con, cursor = init_contacts_db()
-        
         if action == "create":
             if not group_name:
                 return "❌ Group name is required for creation"
             
             # This would integrate with WhatsApp Web API in production
-            cursor.execute("INSERT INTO whatsapp_groups (group_name, member_count) VALUES (?, ?)", 
-                         (group_name, len(members) if members else 0))
-            con.commit()
+            await db_async.write(_create_group, group_name, len(members) if members else 0)
             return f"✅ Group '{group_name}' created successfully"
             
         elif action == "list_groups":
-            cursor.execute("SELECT group_name, member_count, created_at FROM whatsapp_groups")
-            groups = cursor.fetchall()
+            groups = await db_async.read(_list_groups)
             if not groups:
                 return "📱 No groups found in database"
             
@@ -579,9 +529,6 @@ async def whatsapp_group_management(action: str, group_name: str = "", members:
             
     except Exception as e:
         return f"❌ Group management এ সমস্যা: {str(e)[:100]}।"
-    finally:
-        if 'con' in locals():
-            con.close()
 
 @function_tool()
 async def whatsapp_media_handler(action: str, contact_name: str = "", media_type: str = "") -> str:
@@ -597,11 +544,8 @@ async def whatsapp_media_handler(action: str, contact_name: str = "", media_type
         if not WHATSAPP_CONFIG["media_handling_enabled"]:
             return "❌ Media handling is disabled in configuration"
         
-        con, cursor = init_contacts_db()
-        
         if action == "list_media":
-            cursor.execute("SELECT contact_name, media_type, timestamp FROM whatsapp_media ORDER BY timestamp DESC LIMIT 10")
-            media_items = cursor.fetchall()
+            media_items = await db_async.read(_recent_media)
             if not media_items:
                 return "📁 No media items found in database"
             
@@ -615,9 +559,7 @@ async def whatsapp_media_handler(action: str, contact_name: str = "", media_type
                 return "❌ Contact name is required for sending media"
             
             # This would integrate with WhatsApp Web API in production
-            cursor.execute("INSERT INTO whatsapp_media (contact_name, media_type) VALUES (?, ?)", 
-                         (contact_name, media_type or action.replace("send_", "")))
-            con.commit()
+            await db_async.write(_log_media, contact_name, media_type or action.replace("send_", ""))
             return f"✅ {action.replace('_', ' ').title()} sent to {contact_name}"
         
         else:
@@ -625,9 +567,58 @@ async def whatsapp_media_handler(action: str, contact_name: str = "", media_type
             
     except Exception as e:
         return f"❌ Media handling এ সমস্যা: {str(e)[:100]}।"
-    finally:
-        if 'con' in locals():
-            con.close()
+
+def _log_message(contact_name, message, message_type, ai_analysis):
+    """Record a message and its AI analysis (runs on the DB writer thread)"""
+    with write() as conn:
+        conn.execute("INSERT INTO whatsapp_messages (contact_name, message, message_type, ai_analysis) VALUES (?, ?, ?, ?)",
+                     (contact_name, message, message_type, ai_analysis))
+
+def _create_group(group_name, member_count):
+    with write() as conn:
+        conn.execute("INSERT INTO whatsapp_groups (group_name, member_count) VALUES (?, ?)",
+                     (group_name, member_count))
+
+def _list_groups():
+    with read() as conn:
+        return conn.execute("SELECT group_name, member_count, created_at FROM whatsapp_groups").fetchall()
+
+def _log_media(contact_name, media_type):
+    with write() as conn:
+        conn.execute("INSERT INTO whatsapp_media (contact_name, media_type) VALUES (?, ?)",
+                     (contact_name, media_type))
+
+def _recent_media():
+    with read() as conn:
+        return conn.execute(
+            "SELECT contact_name, media_type, timestamp FROM whatsapp_media ORDER BY timestamp DESC LIMIT 10"
+        ).fetchall()
+
+def _table_rows(table):
+    """Every row of a table as dicts, for backups (runs on a DB reader thread)"""
+    with read() as conn:
+        cursor = conn.execute(f"SELECT * FROM {table}")
+        columns = [col[0] for col in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def _dump_json(path, rows):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(rows, f, indent=2, ensure_ascii=False)
+
+def _whatsapp_stats(time_filter):
+    """Message/contact/group counts since time_filter (runs on a DB reader thread)"""
+    with read() as conn:
+        # Get message statistics
+        message_stats = conn.execute("SELECT COUNT(*) as total_messages, message_type FROM whatsapp_messages WHERE timestamp >= ? GROUP BY message_type", 
+                                     (time_filter,)).fetchall()
+        
+        # Get contact statistics
+        contact_count = conn.execute("SELECT COUNT(DISTINCT contact_name) as unique_contacts FROM whatsapp_messages WHERE timestamp >= ?", 
+                                     (time_filter,)).fetchone()[0]
+        
+        # Get group statistics
+        group_stats = conn.execute("SELECT COUNT(*) as total_groups, SUM(member_count) as total_members FROM whatsapp_groups").fetchone()
+        return message_stats, contact_count, group_stats
 
 @function_tool()
 async def whatsapp_analytics(time_period: str = "7d") -> str:
@@ -641,8 +632,6 @@ async def whatsapp_analytics(time_period: str = "7d") -> str:
         if not WHATSAPP_CONFIG["analytics_enabled"]:
             return "❌ Analytics is disabled in configuration"
         
-        con, cursor = init_contacts_db()
-        
         # Calculate time filter
         if time_period == "1d":
             time_filter = datetime.now() - timedelta(days=1)
@@ -653,19 +642,7 @@ async def whatsapp_analytics(time_period: str = "7d") -> str:
         else:
             time_filter = datetime.min
         
-        # Get message statistics
-        cursor.execute("SELECT COUNT(*) as total_messages, message_type FROM whatsapp_messages WHERE timestamp >= ? GROUP BY message_type", 
-                     (time_filter,))
-        message_stats = cursor.fetchall()
-        
-        # Get contact statistics
-        cursor.execute("SELECT COUNT(DISTINCT contact_name) as unique_contacts FROM whatsapp_messages WHERE timestamp >= ?", 
-                     (time_filter,))
-        contact_count = cursor.fetchone()[0]
-        
-        # Get group statistics
-        cursor.execute("SELECT COUNT(*) as total_groups, SUM(member_count) as total_members FROM whatsapp_groups")
-        group_stats = cursor.fetchone()
+        message_stats, contact_count, group_stats = await db_async.read(_whatsapp_stats, time_filter)
         
         # Format analytics report
         result = f"📊 WhatsApp Analytics ({time_period}):\n\n"
@@ -685,9 +662,6 @@ async def whatsapp_analytics(time_period: str = "7d") -> str:
         
     except Exception as e:
         return f"❌ Analytics এ সমস্যা: {str(e)[:100]}।"
-    finally:
-        if 'con' in locals():
-            con.close()
 
 @function_tool()
 async def whatsapp_backup(backup_type: str = "full") -> str:
@@ -707,35 +681,22 @@ async def whatsapp_backup(backup_type: str = "full") -> str:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         
         if backup_type == "full":
-            # Backup all data
-            con, cursor = init_contacts_db()
-            
             # Backup contacts
-            cursor.execute("SELECT * FROM contacts")
-            contacts = cursor.fetchall()
+            contacts = await db_async.read(_table_rows, "contacts")
             contacts_file = os.path.join(backup_dir, f"contacts_{timestamp}.json")
-            with open(contacts_file, 'w', encoding='utf-8') as f:
-                json.dump([dict(zip([col[0] for col in cursor.description], row)) for row in contacts], f, indent=2, ensure_ascii=False)
+            await asyncio.to_thread(_dump_json, contacts_file, contacts)
             
             # Backup messages
-            cursor.execute("SELECT * FROM whatsapp_messages")
-            messages = cursor.fetchall()
+            messages = await db_async.read(_table_rows, "whatsapp_messages")
             messages_file = os.path.join(backup_dir, f"messages_{timestamp}.json")
-            with open(messages_file, 'w', encoding='utf-8') as f:
-                json.dump([dict(zip([col[0] for col in cursor.description], row)) for row in messages], f, indent=2, ensure_ascii=False)
-            
-            con.close()
+            await asyncio.to_thread(_dump_json, messages_file, messages)
             
             return f"✅ Full backup completed:\n• Contacts: {contacts_file}\n• Messages: {messages_file}"
             
         elif backup_type == "contacts":
-            con, cursor = init_contacts_db()
-            cursor.execute("SELECT * FROM contacts")
-            contacts = cursor.fetchall()
+            contacts = await db_async.read(_table_rows, "contacts")
             contacts_file = os.path.join(backup_dir, f"contacts_{timestamp}.json")
-            with open(contacts_file, 'w', encoding='utf-8') as f:
-                json.dump([dict(zip([col[0] for col in cursor.description], row)) for row in contacts], f, indent=2, ensure_ascii=False)
-            con.close()
+            await asyncio.to_thread(_dump_json, contacts_file, contacts)
             return f"✅ Contacts backup completed: {contacts_file}"
             
         else:
@@ -744,6 +705,22 @@ async def whatsapp_backup(backup_type: str = "full") -> str:
     except Exception as e:
         return f"❌ Backup এ সমস্যা: {str(e)[:100]}।"
 
+def _security_counts():
+    """Spam, volume and sensitive-keyword counts (runs on a DB reader thread)"""
+    with read() as conn:
+        # Check for suspicious patterns
+        high_spam_count = conn.execute("SELECT COUNT(*) FROM whatsapp_messages WHERE ai_analysis LIKE '%spam_probability%' AND CAST(JSON_EXTRACT(ai_analysis, '$.spam_probability') AS REAL) > 0.8").fetchone()[0]
+        
+        # Check for unusual activity
+        recent_messages = conn.execute("SELECT COUNT(*) FROM whatsapp_messages WHERE timestamp >= datetime('now', '-1 hour')").fetchone()[0]
+        
+        # Check for sensitive keywords
+        sensitive_keywords = ["password", "bank", "credit card", "ssn", "pin"]
+        sensitive_count = 0
+        for keyword in sensitive_keywords:
+            sensitive_count += conn.execute("SELECT COUNT(*) FROM whatsapp_messages WHERE LOWER(message) LIKE ?", (f"%{keyword}%",)).fetchone()[0]
+        return high_spam_count, recent_messages, sensitive_count
+
 @function_tool()
 async def whatsapp_security_check() -> str:
     """
@@ -753,22 +730,7 @@ async def whatsapp_security_check() -> str:
         if not WHATSAPP_CONFIG["security_features_enabled"]:
             return "❌ Security features are disabled in configuration"
         
-        con, cursor = init_contacts_db()
-        
-        # Check for suspicious patterns
-        cursor.execute("SELECT COUNT(*) FROM whatsapp_messages WHERE ai_analysis LIKE '%spam_probability%' AND CAST(JSON_EXTRACT(ai_analysis, '$.spam_probability') AS REAL) > 0.8")
-        high_spam_count = cursor.fetchone()[0]
-        
-        # Check for unusual activity
-        cursor.execute("SELECT COUNT(*) FROM whatsapp_messages WHERE timestamp >= datetime('now', '-1 hour')")
-        recent_messages = cursor.fetchone()[0]
-        
-        # Check for sensitive keywords
-        sensitive_keywords = ["password", "bank", "credit card", "ssn", "pin"]
-        sensitive_count = 0
-        for keyword in sensitive_keywords:
-            cursor.execute("SELECT COUNT(*) FROM whatsapp_messages WHERE LOWER(message) LIKE ?", (f"%{keyword}%",))
-            sensitive_count += cursor.fetchone()[0]
+        high_spam_count, recent_messages, sensitive_count = await db_async.read(_security_counts)
         
         # Generate security report
         result = "🔒 WhatsApp Security Report:\n\n"
@@ -801,9 +763,6 @@ async def whatsapp_security_check() -> str:
         
     except Exception as e:
         return f"❌ Security check এ সমস্যা: {str(e)[:100]}।"
-    finally:
-        if 'con' in locals():
-            con.close()
 
 # Initialize database on import
 init_contacts_db()
\ No newline at end of file